@@ -1,4 +1,12 @@
+import heapq
+import itertools
+import logging
+import math
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from smtplib import SMTP
 from typing import List, Dict, Optional
 import secrets  # pro krátký náhodný suffix
@@ -35,9 +43,11 @@ st.markdown(f"""
 
 
 # --- CZ FONTY (ReportLab) ---
+import struct
 from pathlib import Path
 from reportlab import rl_config
 from reportlab.lib.fonts import addMapping  # ⬅️ důležité
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
 
 FONT_DIR = Path("static/fonts")
 FONT_REG = FONT_DIR / "DejaVuSans.ttf"
@@ -45,10 +55,41 @@ FONT_BLD = FONT_DIR / "DejaVuSans-Bold.ttf"
 FONT_ITA = FONT_DIR / "DejaVuSans-Oblique.ttf"       # volitelné
 FONT_BI  = FONT_DIR / "DejaVuSans-BoldOblique.ttf"   # volitelné
 
+# name ID 13 = plné znění licence (u DejaVu ~14 kB, v každém PDF ~3,7 kB na řez);
+# copyright (0) a odkaz na licenci (14) ve vložené podmnožině zůstávají
+TTF_NAME_DROP = frozenset({13})
+
+def _drop_name_records(table: bytes, drop: frozenset) -> bytes:
+    """Tabulka 'name' (formát 0) bez záznamů s nameID z `drop`; řetězce se přeskládají."""
+    fmt, count, offset = struct.unpack(">HHH", table[:6])
+    if fmt != 0:
+        return table
+    records, strings = [], bytearray()
+    for i in range(count):
+        pid, eid, lid, nid, length, off = struct.unpack(">6H", table[6 + 12 * i:18 + 12 * i])
+        if nid in drop:
+            continue
+        records.append(struct.pack(">6H", pid, eid, lid, nid, length, len(strings)))
+        strings += table[offset + off:offset + off + length]
+    return struct.pack(">HHH", 0, len(records), 6 + 12 * len(records)) + b"".join(records) + bytes(strings)
+
+class _LeanTTFontFace(TTFontFace):
+    """Řez, jehož podmnožina vložená do PDF nenese záznamy TTF_NAME_DROP ('name' čte přes get_table jen makeSubset)."""
+
+    def get_table(self, tag):
+        data = super().get_table(tag)
+        return _drop_name_records(data, TTF_NAME_DROP) if tag == "name" else data
+
+def _pdf_font(name: str, path: Path) -> TTFont:
+    """TTFont, jehož podmnožina v PDF je bez plného znění licence (viz _LeanTTFontFace)."""
+    font = TTFont(name, str(path))
+    font.face.__class__ = _LeanTTFontFace
+    return font
+
 def ensure_czech_fonts() -> None:
     """
     Registruje TTF fonty pro češtinu a nastaví rodinné mapování, aby fungovalo bold/italic.
-    Volat jednou při startu (v main()).
+    Volá se jednou za proces z PdfResources (viz pdf_resources()).
     """
     # ať ReportLab hledá i ve static/fonts
     try:
@@ -71,20 +112,20 @@ def ensure_czech_fonts() -> None:
 
     # registrace základních řezy
     if "DejaVuSans" not in pdfmetrics.getRegisteredFontNames():
-        pdfmetrics.registerFont(TTFont("DejaVuSans", str(FONT_REG)))
+        pdfmetrics.registerFont(_pdf_font("DejaVuSans", FONT_REG))
     if "DejaVuSans-Bold" not in pdfmetrics.getRegisteredFontNames():
-        pdfmetrics.registerFont(TTFont("DejaVuSans-Bold", str(FONT_BLD)))
+        pdfmetrics.registerFont(_pdf_font("DejaVuSans-Bold", FONT_BLD))
 
     # volitelně registruj i italic/bold-italic, pokud tam jsou
     has_ita = False
     has_bi = False
     if FONT_ITA.exists():
         if "DejaVuSans-Oblique" not in pdfmetrics.getRegisteredFontNames():
-            pdfmetrics.registerFont(TTFont("DejaVuSans-Oblique", str(FONT_ITA)))
+            pdfmetrics.registerFont(_pdf_font("DejaVuSans-Oblique", FONT_ITA))
         has_ita = True
     if FONT_BI.exists():
         if "DejaVuSans-BoldOblique" not in pdfmetrics.getRegisteredFontNames():
-            pdfmetrics.registerFont(TTFont("DejaVuSans-BoldOblique", str(FONT_BI)))
+            pdfmetrics.registerFont(_pdf_font("DejaVuSans-BoldOblique", FONT_BI))
         has_bi = True
 
     # >>> KLÍČOVÉ: mapování rodiny (family/bold/italic) <<<
@@ -420,6 +461,8 @@ def booking_form_unified(mode: str = "admin", edit_id: Optional[str] = None):
       - mode="admin":  uloží/přepíše rezervaci do `reservations` + `reservation_rooms`
     """
     assert mode in ("admin", "public")
+    if mode == "admin":
+        _apply_pending_order(edit_id)
     cfg = get_cfg()
     st.header("Rezervace" if mode == "admin" else "Žádost o rezervaci (stejný formulář)")
     # ——— flash zpráva po úspěšném uložení ———
@@ -648,11 +691,254 @@ def booking_form_unified(mode: str = "admin", edit_id: Optional[str] = None):
         st.error(f"Odeslání se nezdařilo: {e}")
 
 
+# --- zámky / souběh zápisů ---
+DB_BUSY_TIMEOUT_S = 5.0     # jak dlouho čeká SQLite na uvolnění zámku (sqlite3 timeout)
+DB_WRITE_RETRIES = 5        # kolikrát zopakovat BEGIN IMMEDIATE, když je DB i tak zamčená
+DB_RETRY_BACKOFF_S = 0.05   # základ exponenciální pauzy mezi pokusy
+DB_POOL_IDLE = 8            # kolik volných spojení na DB lokality držet otevřených
+DB_STATEMENT_CACHE = 256    # cache připravených SQL příkazů na spojení
+
+class SiteConnectionPool:
+    """
+    Sdílená spojení na DB jedné lokality (WAL, synchronous=NORMAL, busy_timeout,
+    foreign_keys=ON). Spojení se vždy půjčuje jen jednomu vláknu najednou
+    (výpůjčka z fronty -> vrácení), takže transakce dvou Streamlit sessions se
+    nikdy nepromíchají na jednom spojení. Proto check_same_thread=False:
+    spojení jen putuje mezi vlákny, souběžně ho nepoužívají.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = DB_POOL_IDLE):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=max_idle)
+        self.capacity_synced: dict[str, float] = {}   # config -> mtime (ensure_room_capacity)
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_S, check_same_thread=False,
+                              cached_statements=DB_STATEMENT_CACHE)
+        # WAL: čtenáři veřejného kalendáře neblokují zápisy adminů (a naopak)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_S * 1000)}")
+        con.execute("PRAGMA foreign_keys=ON")
+        # temp.booking_changes (viz _track_booking_changes) jen v paměti, bez souboru a žurnálu
+        con.execute("PRAGMA temp_store=MEMORY")
+        return con
+
+    @contextmanager
+    def connection(self):
+        """Půjčí spojení; na konci commit (rollback při výjimce) a vrácení do poolu."""
+        try:
+            con = self._idle.get_nowait()
+        except queue.Empty:
+            con = self._connect()
+        try:
+            yield con
+            if con.in_transaction:
+                con.commit()
+        except BaseException:
+            if con.in_transaction:
+                con.rollback()
+            raise
+        finally:
+            try:
+                self._idle.put_nowait(con)
+            except queue.Full:
+                con.close()
+
+    def close_all(self) -> None:
+        """Zavře volná spojení (např. před smazáním/nahrazením souboru DB)."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+@st.cache_resource(show_spinner=False)
+def _conn_pools() -> dict:
+    """{soubor DB -> SiteConnectionPool} pro celý proces (viz _conn_pool)."""
+    return {}
+
+def _conn_pool(db_path: str) -> SiteConnectionPool:
+    """
+    Jeden pool na soubor DB, sdílený všemi sessions v procesu. Slovník místo
+    cache_resource s argumentem: hashování argumentu stálo víc než samotný
+    zápis (volá se u každého get_conn).
+    """
+    pools = _conn_pools()
+    pool = pools.get(db_path)
+    if pool is None:
+        pool = pools.setdefault(db_path, SiteConnectionPool(db_path))
+    return pool
+
 def get_conn():
+    """Spojení na DB aktuální lokality: `with get_conn() as con: ...`"""
+    db_path, _ = current_paths()
+    if not db_path:
+        raise RuntimeError("Lokalita není zvolena.")
+    return _conn_pool(db_path).connection()
+
+# co zápis změnil: TEMP triggery (na spojení) zapisují do temp.booking_changes,
+# write_transaction z toho po bloku určí, které odvozené soubory přegenerovat
+# (účastníci ne – ti jsou jen ve feedech se jmény, viz _participants_changed)
+_CHANGE_TABLES = {"reservation_rooms": "pobyt", "reservations": "hlavicka"}
+
+def _track_booking_changes(con: sqlite3.Connection) -> None:
+    """TEMP tabulka + triggery na spojení; po přestavbě tabulky (migrace) se založí znovu."""
+    n = con.execute("SELECT COUNT(*) FROM temp.sqlite_master WHERE type = 'trigger' "
+                    "AND name LIKE 'trg_chg_%'").fetchone()[0]
+    if n == 3 * len(_CHANGE_TABLES):
+        return
+    con.execute("CREATE TEMP TABLE IF NOT EXISTS booking_changes(kind TEXT NOT NULL, arrival TEXT, departure TEXT)")
+    for table, kind in _CHANGE_TABLES.items():
+        for event, rows in (("INSERT", ("NEW",)), ("DELETE", ("OLD",)), ("UPDATE", ("OLD", "NEW"))):
+            if table == "reservation_rooms":
+                values = " ".join(f"INSERT INTO booking_changes VALUES ('{kind}', {_cz_to_iso_sql(r + '.arrival')}, "
+                                  f"{_cz_to_iso_sql(r + '.departure')});" for r in rows)
+            else:
+                values = f"INSERT INTO booking_changes VALUES ('{kind}', NULL, NULL);"
+            con.execute(f"CREATE TEMP TRIGGER IF NOT EXISTS trg_chg_{table}_{event.lower()} "
+                        f"AFTER {event} ON main.{table} BEGIN {values} END")
+
+def _months_of_stays(arrival: Optional[str], departure: Optional[str]) -> Optional[frozenset]:
+    """Měsíce (rok, měsíc), do kterých padají noci [arrival, departure); None = nelze určit (vše)."""
+    if not arrival or not departure:
+        return None
+    a, last = date.fromisoformat(arrival), date.fromisoformat(departure) - timedelta(days=1)
+    if last < a:
+        return frozenset()
+    return frozenset((i // 12, i % 12 + 1) for i in range(a.year * 12 + a.month - 1, last.year * 12 + last.month))
+
+def _take_booking_changes(con: sqlite3.Connection) -> Optional[tuple]:
+    """
+    Vyzvedne změny zápisu z temp.booking_changes: (ics, months) pro
+    schedule_feed_refresh, None když se pobyty ani rezervace nezměnily.
+    """
+    rows = con.execute("""
+        SELECT kind, MIN(arrival), MAX(departure), SUM(arrival IS NULL OR departure IS NULL)
+        FROM temp.booking_changes GROUP BY kind""").fetchall()
+    if not rows:
+        return None
+    con.execute("DELETE FROM temp.booking_changes")
+    kinds = {kind: (a, d, bad) for kind, a, d, bad in rows}
+    months = frozenset()
+    if "pobyt" in kinds:
+        a, d, bad = kinds["pobyt"]
+        months = None if bad else _months_of_stays(a, d)
+    return True, months
+
+@contextmanager
+def write_transaction():
+    """
+    Zápisová transakce `BEGIN IMMEDIATE`: zámek pro zápis se bere hned na začátku,
+    takže kontrola (SELECT) a zápis uvnitř bloku nemůže proložit jiný admin.
+    Commit na konci bloku, rollback při výjimce. Po commitu zvýší verzi dat
+    lokality (data_version), čímž zneplatní cache odvozené z rezervací, a když
+    se změnily pobyty nebo hlavičky rezervací, naplánuje přegenerování ICS
+    feedů a dotčených měsíců snapshotů (schedule_feed_refresh).
+    Kapacity pokojů (hlídají je triggery) se do room_capacity přenesou jen po
+    změně configu (ensure_room_capacity); přeplnění, které databáze odmítne,
+    hlásí jako ValueError.
+    """
+    db_path, cfg_path = current_paths()
+    if not db_path:
+        raise RuntimeError("Lokalita není zvolena.")
+    pool = _conn_pool(db_path)
+    ensure_room_capacity(db_path, cfg_path, pool)
+    with pool.connection() as con:
+        for attempt in range(DB_WRITE_RETRIES + 1):
+            try:
+                con.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e).lower() or attempt == DB_WRITE_RETRIES:
+                    raise
+                time.sleep(DB_RETRY_BACKOFF_S * (2 ** attempt))
+        _track_booking_changes(con)
+        try:
+            yield con
+            changes = _take_booking_changes(con)
+        except sqlite3.IntegrityError as e:
+            if "room_nights" not in str(e):
+                raise
+            raise ValueError("Kolize termínu: pokoj je v některou z nocí plně obsazený "
+                             "(databáze zápis odmítla).") from e
+    _write_counter().bump(db_path)
+    if changes is not None:
+        schedule_feed_refresh(*changes)
+
+class WriteCounter:
+    """
+    Počítadlo potvrzených zápisů pro každý soubor DB (v rámci procesu).
+    Zvyšuje ho write_transaction po commitu; PRAGMA data_version tu nepomůže,
+    protože je per-spojení a spojení z poolu se střídají.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: dict[str, int] = {}
+
+    def get(self, db_path: str) -> int:
+        with self._lock:
+            return self._counts.get(db_path, 0)
+
+    def bump(self, db_path: str) -> int:
+        with self._lock:
+            self._counts[db_path] = self._counts.get(db_path, 0) + 1
+            return self._counts[db_path]
+
+@st.cache_resource(show_spinner=False)
+def _write_counter() -> WriteCounter:
+    return WriteCounter()
+
+def data_version() -> int:
+    """Verze dat aktuální lokality – mění se s každým potvrzeným zápisem."""
     db_path, _ = current_paths()
     if not db_path:
         raise RuntimeError("Lokalita není zvolena.")
-    return sqlite3.connect(db_path, check_same_thread=False)
+    return _write_counter().get(db_path)
+
+class AvailabilityCache:
+    """
+    Procesní cache měsíční dostupnosti {(db, rok, měsíc) -> DataFrame}, sdílená
+    všemi sessions (stejně se cachují i hotové mřížky, viz _grid_html_cache).
+    Každá položka nese verzi (data_version, mtime configu), ve které vznikla;
+    jiná verze = miss a přepočet. Vrácené hodnoty se nemění.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[tuple, tuple] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, version: tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: tuple, version: tuple, df: pd.DataFrame) -> None:
+        with self._lock:
+            self._entries[key] = (version, df)
+
+    def get_or_compute(self, key: tuple, version: tuple, compute) -> pd.DataFrame:
+        df = self.get(key, version)
+        if df is None:
+            # počítá se mimo zámek; souběžný miss spočítá totéž dvakrát, nic víc
+            df = compute()
+            self.put(key, version, df)
+        return df
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+@st.cache_resource(show_spinner=False)
+def _availability_cache() -> AvailabilityCache:
+    return AvailabilityCache()
 
 from pathlib import Path
 
@@ -682,97 +968,421 @@ def new_booking_id(prefix: str = "RES") -> str:
     suf = secrets.token_hex(2).upper()
     return f"{prefix}-{ts}-{suf}"
 
-def init_db():
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS reservations (
-            id TEXT NOT NULL UNIQUE,
-            guest_name TEXT NOT NULL,
-            global_arrival TEXT,
-            global_departure TEXT,
-            global_nights INTEGER,
-            per_room INTEGER NOT NULL DEFAULT 0
+# --- SCHÉMA DB: verzované migrace (PRAGMA user_version) ---
+# Každý krok je idempotentní (starší DB už mohou mít část schématu z dob,
+# kdy se init_db() pouštěl při každém rerunu) a běží jen jednou.
+
+def _has_column(cur: sqlite3.Cursor, table: str, col: str) -> bool:
+    return any(r[1] == col for r in cur.execute(f"PRAGMA table_info({table})"))
+
+def _add_column(cur: sqlite3.Cursor, table: str, col: str, decl: str) -> None:
+    """ALTER TABLE ADD COLUMN, jen pokud sloupec ještě neexistuje."""
+    if not _has_column(cur, table, col):
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+
+def _m001_base_schema(cur: sqlite3.Cursor) -> None:
+    """Rezervace, pokoje rezervací, žádosti (vč. rooms_json/per_room) a účastníci."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS reservations (
+        id TEXT NOT NULL UNIQUE,
+        guest_name TEXT NOT NULL,
+        global_arrival TEXT,
+        global_departure TEXT,
+        global_nights INTEGER,
+        per_room INTEGER NOT NULL DEFAULT 0
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS reservation_rooms (
+        id TEXT NOT NULL,
+        room_idx INTEGER NOT NULL,
+        room_type TEXT,
+        employees INTEGER,
+        guests INTEGER,
+        arrival TEXT,
+        departure TEXT,
+        nights INTEGER,
+        price REAL
+    )""")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS requests (
+        req_id TEXT PRIMARY KEY,
+        guest_name TEXT NOT NULL,
+        contact TEXT,
+        arrival TEXT,
+        departure TEXT,
+        nights INTEGER,
+        people INTEGER,
+        created_at TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'nová', -- nová | schváleno | zamítnuto | vyřízeno
+        note TEXT
+    )""")
+    _add_column(cur, "requests", "rooms_json", "TEXT DEFAULT NULL")
+    _add_column(cur, "requests", "per_room", "INTEGER NOT NULL DEFAULT 0")
+    # účastníci (per-person)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS participants (
+        id TEXT NOT NULL,               -- booking ID
+        person_idx INTEGER NOT NULL,    -- pořadí (1..N)
+        name TEXT NOT NULL,
+        is_employee INTEGER NOT NULL,   -- 1 = zaměstnanec, 0 = host
+        nights INTEGER NOT NULL,
+        room_type TEXT,                 -- pro výpočet ceny
+        price REAL NOT NULL
+    )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_res_id ON reservations(id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resrooms_id ON reservation_rooms(id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_part_id ON participants(id)")
+
+
+# --- ISO datumy v DB ---
+# České dd.mm.YYYY zůstávají jen pro zobrazení; pro dotazy má každý datum
+# sourozence *_iso (YYYY-MM-DD), který se řadí správně a jde indexovat.
+ISO_DATE_COLUMNS = {
+    "reservation_rooms": ("arrival", "departure"),
+    "reservations": ("global_arrival", "global_departure"),
+    "requests": ("arrival", "departure"),
+}
+
+def _cz_to_iso_sql(col: str) -> str:
+    """SQL výraz dd.mm.YYYY -> YYYY-MM-DD (NULL u prázdné/neplatné hodnoty)."""
+    return (f"CASE WHEN {col} GLOB '[0-3][0-9].[01][0-9].[0-9][0-9][0-9][0-9]' "
+            f"THEN substr({col},7,4) || '-' || substr({col},4,2) || '-' || substr({col},1,2) END")
+
+def _m002_iso_dates(cur: sqlite3.Cursor) -> None:
+    """
+    Přidá sloupce *_iso, dopočítá je u existujících řádků a založí triggery,
+    které je drží v synchronizaci při INSERT/UPDATE.
+    """
+    for table, cols in ISO_DATE_COLUMNS.items():
+        for c in cols:
+            _add_column(cur, table, f"{c}_iso", "TEXT")
+        set_iso = ", ".join(f"{c}_iso = {_cz_to_iso_sql(c)}" for c in cols)
+        # backfill jen tam, kde ISO chybí a český datum je vyplněný
+        missing = " OR ".join(f"({c}_iso IS NULL AND {c} IS NOT NULL AND {c} <> '')" for c in cols)
+        cur.execute(f"UPDATE {table} SET {set_iso} WHERE {missing}")
+        _create_iso_triggers(cur, table)
+    _create_room_indexes(cur)
+
+def _create_iso_triggers(cur: sqlite3.Cursor, table: str) -> None:
+    """Triggery, které při INSERT/UPDATE dopočítají *_iso z českých datumů."""
+    cols = ISO_DATE_COLUMNS[table]
+    new_iso = ", ".join(f"{c}_iso = {_cz_to_iso_sql('NEW.' + c)}" for c in cols)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_iso_ins AFTER INSERT ON {table}
+        BEGIN UPDATE {table} SET {new_iso} WHERE rowid = NEW.rowid; END""")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_iso_upd AFTER UPDATE OF {", ".join(cols)} ON {table}
+        BEGIN UPDATE {table} SET {new_iso} WHERE rowid = NEW.rowid; END""")
+
+def _create_room_indexes(cur: sqlite3.Cursor) -> None:
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resrooms_id ON reservation_rooms(id)")
+    # okna měsíců/roků a kontrola překryvu pro konkrétní pokoj
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resrooms_type_dates "
+                "ON reservation_rooms(room_type, arrival_iso, departure_iso)")
+    # okno přes všechny pokoje: pobyty končící po začátku okna (typicky jen pár nejnovějších)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_resrooms_dates "
+                "ON reservation_rooms(departure_iso, arrival_iso)")
+
+def _quarantine_rows(cur: sqlite3.Cursor, migration: int, table: str, where: str, reason: str) -> int:
+    """
+    Přesune řádky `table` splňující `where` do _migration_quarantine (celý řádek
+    jako JSON) a smaže je z tabulky. Migrace tak nic nezahodí beze stopy.
+    Vrací počet přesunutých řádků.
+    """
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS _migration_quarantine (
+            migration INTEGER NOT NULL,     -- verze schématu (index v MIGRATIONS + 1)
+            source_table TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            row_json TEXT NOT NULL,
+            moved_at TEXT NOT NULL DEFAULT (datetime('now'))
         )""")
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS reservation_rooms (
-            id TEXT NOT NULL,
-            room_idx INTEGER NOT NULL,
-            room_type TEXT,
-            employees INTEGER,
-            guests INTEGER,
-            arrival TEXT,
-            departure TEXT,
-            nights INTEGER,
-            price REAL
+    cols = [c[1] for c in cur.execute(f"PRAGMA table_info({table})").fetchall()]
+    row_json = "json_object(" + ", ".join(f"'{c}', {c}" for c in cols) + ")"
+    cur.execute(f"""
+        INSERT INTO _migration_quarantine(migration, source_table, reason, row_json)
+        SELECT ?, ?, ?, {row_json} FROM {table} WHERE {where} ORDER BY rowid""", (migration, table, reason))
+    moved = cur.execute(f"DELETE FROM {table} WHERE {where}").rowcount
+    if moved:
+        logging.getLogger(__name__).warning(
+            "Migrace %d: %d řádků z %s přesunuto do _migration_quarantine (%s)", migration, moved, table, reason)
+    return moved
+
+def _m003_foreign_keys(cur: sqlite3.Cursor) -> None:
+    """
+    Pokoje a účastníci dostanou cizí klíč na reservations(id) s ON DELETE CASCADE.
+    SQLite neumí přidat FK do existující tabulky, takže se obě tabulky přestaví
+    (nová tabulka -> kopie dat -> záměna). Duplicitní rezervace (stejné id, ponechá
+    se nejstarší řádek) a osiřelé pokoje/účastníci bez rezervace – v kalendáři
+    blokovali pokoj a nešli smazat – se nepřenáší, ale odloží do
+    _migration_quarantine (viz _quarantine_rows) a počty jdou do logu.
+    """
+    # rodičovský klíč musí být unikátní (starší DB měly jen obyčejný index)
+    unique_on_id = any(
+        idx[2] and [c[2] for c in cur.execute(f"PRAGMA index_info('{idx[1]}')").fetchall()] == ["id"]
+        for idx in cur.execute("PRAGMA index_list(reservations)").fetchall()
+    )
+    if not unique_on_id:
+        _quarantine_rows(cur, 3, "reservations",
+                         "rowid NOT IN (SELECT MIN(rowid) FROM reservations GROUP BY id)", "duplicitní id rezervace")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_res_id_unique ON reservations(id)")
+    for table in ("reservation_rooms", "participants"):
+        _quarantine_rows(cur, 3, table, "id IS NULL OR id NOT IN (SELECT id FROM reservations WHERE id IS NOT NULL)",
+                         "bez rezervace")
+
+    cur.execute("""
+    CREATE TABLE reservation_rooms_new (
+        id TEXT NOT NULL REFERENCES reservations(id) ON DELETE CASCADE ON UPDATE CASCADE,
+        room_idx INTEGER NOT NULL,
+        room_type TEXT,
+        employees INTEGER,
+        guests INTEGER,
+        arrival TEXT,
+        departure TEXT,
+        nights INTEGER,
+        price REAL,
+        arrival_iso TEXT,
+        departure_iso TEXT
+    )""")
+    cur.execute("""
+        INSERT INTO reservation_rooms_new(id, room_idx, room_type, employees, guests, arrival, departure,
+                                          nights, price, arrival_iso, departure_iso)
+        SELECT id, room_idx, room_type, employees, guests, arrival, departure,
+               nights, price, arrival_iso, departure_iso
+        FROM reservation_rooms ORDER BY rowid""")
+    cur.execute("""
+    CREATE TABLE participants_new (
+        id TEXT NOT NULL REFERENCES reservations(id) ON DELETE CASCADE ON UPDATE CASCADE,
+        person_idx INTEGER NOT NULL,    -- pořadí (1..N)
+        name TEXT NOT NULL,
+        is_employee INTEGER NOT NULL,   -- 1 = zaměstnanec, 0 = host
+        nights INTEGER NOT NULL,
+        room_type TEXT,                 -- pro výpočet ceny
+        price REAL NOT NULL
+    )""")
+    cur.execute("""
+        INSERT INTO participants_new(id, person_idx, name, is_employee, nights, room_type, price)
+        SELECT id, person_idx, name, is_employee, nights, room_type, price
+        FROM participants ORDER BY rowid""")
+
+    cur.execute("DROP TABLE reservation_rooms")
+    cur.execute("DROP TABLE participants")
+    cur.execute("ALTER TABLE reservation_rooms_new RENAME TO reservation_rooms")
+    cur.execute("ALTER TABLE participants_new RENAME TO participants")
+    _create_iso_triggers(cur, "reservation_rooms")
+    _create_room_indexes(cur)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_part_id ON participants(id)")
+
+
+ROOM_NIGHTS_MAX_STAY = 3660  # nejdelší pobyt, který triggery rozloží na noci (~10 let)
+
+def _create_room_nights_triggers(cur: sqlite3.Cursor) -> None:
+    """
+    Triggery na reservation_rooms, které drží room_nights v souladu s pobyty.
+    Datumy bere z českých sloupců (ISO dopočítává jiný trigger a pořadí triggerů
+    SQLite nezaručuje). Po smazání/změně pobytu se uvolněné noci doplní ze
+    zbývajících pobytů, které je také pokrývají (starší data s překryvy).
+    """
+    new_a, new_d = _cz_to_iso_sql("NEW.arrival"), _cz_to_iso_sql("NEW.departure")
+    old_a, old_d = _cz_to_iso_sql("OLD.arrival"), _cz_to_iso_sql("OLD.departure")
+    insert_new = f"""
+        INSERT INTO room_nights(room_type, night, booking_id)
+        SELECT NEW.room_type, date({new_a}, '+' || o.n || ' days'), NEW.id
+        FROM night_offsets o
+        WHERE o.n < julianday({new_d}) - julianday({new_a})
+          AND NEW.room_type IS NOT NULL AND NEW.room_type <> '';"""
+    free_old = f"""
+        DELETE FROM room_nights
+        WHERE booking_id = OLD.id AND room_type = OLD.room_type AND night >= {old_a} AND night < {old_d};
+        INSERT OR IGNORE INTO room_nights(room_type, night, booking_id)
+        SELECT rr.room_type, date(rr.arrival_iso, '+' || o.n || ' days') AS night, rr.id
+        FROM reservation_rooms rr JOIN night_offsets o
+          ON o.n < julianday(rr.departure_iso) - julianday(rr.arrival_iso)
+        WHERE rr.room_type = OLD.room_type AND rr.rowid <> OLD.rowid
+          AND rr.arrival_iso < {old_d} AND rr.departure_iso > {old_a}
+          AND night >= {old_a} AND night < {old_d};"""
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_room_nights_ins AFTER INSERT ON reservation_rooms
+        BEGIN {insert_new} END""")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_room_nights_del AFTER DELETE ON reservation_rooms
+        BEGIN {free_old} END""")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_room_nights_upd
+        AFTER UPDATE OF id, room_type, arrival, departure ON reservation_rooms
+        BEGIN {free_old} {insert_new} END""")
+
+def _m004_room_nights(cur: sqlite3.Cursor) -> None:
+    """
+    Tabulka room_nights: jedna řádka = jeden pokoj obsazený jednu noc.
+    UNIQUE(room_type, night) odmítne dvojí rezervaci přímo v DB, kalendář je
+    jen rozsahový dotaz nad indexem. Naplní se z existujících pobytů; u
+    starších překryvů vyhrává dřívější pobyt (další kolize už DB nepustí).
+    """
+    cur.execute("CREATE TABLE IF NOT EXISTS night_offsets(n INTEGER PRIMARY KEY)")
+    cur.execute(f"""
+        INSERT OR IGNORE INTO night_offsets(n)
+        WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < {ROOM_NIGHTS_MAX_STAY})
+        SELECT n FROM seq""")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS room_nights(
+            room_type TEXT NOT NULL,
+            night TEXT NOT NULL,
+            booking_id TEXT NOT NULL,
+            UNIQUE(room_type, night)
         )""")
-        cur.execute("""
-                    CREATE TABLE IF NOT EXISTS requests
-                    (
-                        req_id
-                        TEXT
-                        PRIMARY
-                        KEY,
-                        guest_name
-                        TEXT
-                        NOT
-                        NULL,
-                        contact
-                        TEXT,
-                        arrival
-                        TEXT,
-                        departure
-                        TEXT,
-                        nights
-                        INTEGER,
-                        people
-                        INTEGER,
-                        created_at
-                        TEXT
-                        NOT
-                        NULL,
-                        status
-                        TEXT
-                        NOT
-                        NULL
-                        DEFAULT
-                        'nová', -- nová | schváleno | zamítnuto | vyřízeno
-                        note
-                        TEXT
-                    )
-                    """)
-        try:
-            cur.execute("ALTER TABLE requests ADD COLUMN rooms_json TEXT")
-        except Exception:
-            pass
-        try:
-            cur.execute("ALTER TABLE requests ADD COLUMN per_room INTEGER NOT NULL DEFAULT 0")
-        except Exception:
-            pass
-        con.commit()
-        # NOVÉ: účastníci (per-person)
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS participants (
-            id TEXT NOT NULL,               -- booking ID
-            person_idx INTEGER NOT NULL,    -- pořadí (1..N)
-            name TEXT NOT NULL,
-            is_employee INTEGER NOT NULL,   -- 1 = zaměstnanec, 0 = host
-            nights INTEGER NOT NULL,
-            room_type TEXT,                 -- pro výpočet ceny
-            price REAL NOT NULL
+    # okno přes všechny pokoje (měsíc/rok kalendáře)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_room_nights_night ON room_nights(night, room_type, booking_id)")
+    cur.execute("""
+        INSERT OR IGNORE INTO room_nights(room_type, night, booking_id)
+        SELECT rr.room_type, date(rr.arrival_iso, '+' || o.n || ' days'), rr.id
+        FROM reservation_rooms rr JOIN night_offsets o
+          ON o.n < julianday(rr.departure_iso) - julianday(rr.arrival_iso)
+        WHERE rr.room_type IS NOT NULL AND rr.room_type <> ''
+        ORDER BY rr.rowid, o.n""")
+    _create_room_nights_triggers(cur)
+
+ROOM_PEOPLE_SQL = "MAX(COALESCE({p}employees, 0) + COALESCE({p}guests, 0), 1)"  # pobyt zabere aspoň 1 lůžko
+
+def _create_occupancy_triggers(cur: sqlite3.Cursor) -> None:
+    """
+    Triggery na reservation_rooms pro room_nights s počtem osob. Po vložení/změně
+    pobytu zkontrolují jeho noci: pokoj s kapacitou (room_capacity) nesmí mít víc
+    osob než lůžek, pokoj bez kapacity nejvýš jeden pobyt na noc. Po smazání se
+    noci pobytu odeberou a doplní se z dalších řádků téže rezervace, které je
+    pokrývají (starší data s duplicitními řádky).
+    """
+    new_a, new_d = _cz_to_iso_sql("NEW.arrival"), _cz_to_iso_sql("NEW.departure")
+    old_a, old_d = _cz_to_iso_sql("OLD.arrival"), _cz_to_iso_sql("OLD.departure")
+    insert_new = f"""
+        INSERT INTO room_nights(room_type, night, booking_id, people)
+        SELECT NEW.room_type, date({new_a}, '+' || o.n || ' days'), NEW.id, {ROOM_PEOPLE_SQL.format(p="NEW.")}
+        FROM night_offsets o
+        WHERE o.n < julianday({new_d}) - julianday({new_a})
+          AND NEW.room_type IS NOT NULL AND NEW.room_type <> '';
+        SELECT RAISE(ABORT, 'room_nights: kapacita pokoje překročena')
+        WHERE EXISTS (
+            SELECT 1 FROM room_nights rn
+            WHERE rn.room_type = NEW.room_type AND rn.night >= {new_a} AND rn.night < {new_d}
+            GROUP BY rn.night
+            HAVING CASE WHEN (SELECT capacity FROM room_capacity WHERE room_type = NEW.room_type) IS NULL
+                        THEN COUNT(DISTINCT rn.booking_id) > 1
+                        ELSE SUM(rn.people) > (SELECT capacity FROM room_capacity WHERE room_type = NEW.room_type)
+                   END);"""
+    free_old = f"""
+        DELETE FROM room_nights
+        WHERE booking_id = OLD.id AND room_type = OLD.room_type AND night >= {old_a} AND night < {old_d};
+        INSERT INTO room_nights(room_type, night, booking_id, people)
+        SELECT rr.room_type, date(rr.arrival_iso, '+' || o.n || ' days') AS night, rr.id,
+               {ROOM_PEOPLE_SQL.format(p="rr.")}
+        FROM reservation_rooms rr JOIN night_offsets o
+          ON o.n < julianday(rr.departure_iso) - julianday(rr.arrival_iso)
+        WHERE rr.id = OLD.id AND rr.room_type = OLD.room_type AND rr.rowid <> OLD.rowid
+          AND rr.arrival_iso < {old_d} AND rr.departure_iso > {old_a}
+          AND night >= {old_a} AND night < {old_d};"""
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_occupancy_ins AFTER INSERT ON reservation_rooms
+        BEGIN {insert_new} END""")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_occupancy_del AFTER DELETE ON reservation_rooms
+        BEGIN {free_old} END""")
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_occupancy_upd
+        AFTER UPDATE OF id, room_type, arrival, departure, employees, guests ON reservation_rooms
+        BEGIN {free_old} {insert_new} END""")
+
+def _m005_room_capacity(cur: sqlite3.Cursor) -> None:
+    """
+    room_nights počítá osoby: jedna řádka = jeden pobyt v pokoji jednu noc
+    (people = zaměstnanci + hosté, aspoň 1). UNIQUE(room_type, night) padá –
+    pokoj s kapacitou může sdílet víc rezervací, hlídají to triggery proti
+    room_capacity (plní se z configu, viz _sync_room_capacity).
+    """
+    for trg in ("ins", "del", "upd"):
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_room_nights_{trg}")
+    cur.execute("DROP TABLE IF EXISTS room_nights")
+    cur.execute("""
+        CREATE TABLE room_nights(
+            room_type TEXT NOT NULL,
+            night TEXT NOT NULL,
+            booking_id TEXT NOT NULL,
+            people INTEGER NOT NULL
         )""")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_res_id ON reservations(id)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_resrooms_id ON reservation_rooms(id)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_part_id ON participants(id)")
-        try:
-            cur.execute("ALTER TABLE requests ADD COLUMN rooms_json TEXT DEFAULT NULL;")
-        except Exception:
-            pass
-        try:
-            cur.execute("ALTER TABLE requests ADD COLUMN per_room INTEGER NOT NULL DEFAULT 0;")
-        except Exception:
-            pass
-        con.commit()
+    cur.execute("CREATE INDEX idx_room_nights_type_night ON room_nights(room_type, night)")
+    # okno přes všechny pokoje (měsíc/rok kalendáře), pokrývající
+    cur.execute("CREATE INDEX idx_room_nights_night ON room_nights(night, room_type, booking_id, people)")
+    cur.execute("CREATE TABLE IF NOT EXISTS room_capacity(room_type TEXT PRIMARY KEY, capacity INTEGER)")
+    cur.execute(f"""
+        INSERT INTO room_nights(room_type, night, booking_id, people)
+        SELECT rr.room_type, date(rr.arrival_iso, '+' || o.n || ' days'), rr.id, {ROOM_PEOPLE_SQL.format(p="rr.")}
+        FROM reservation_rooms rr JOIN night_offsets o
+          ON o.n < julianday(rr.departure_iso) - julianday(rr.arrival_iso)
+        WHERE rr.room_type IS NOT NULL AND rr.room_type <> ''""")
+    _create_occupancy_triggers(cur)
+
+def _sync_room_capacity(con: sqlite3.Connection, cfg: pd.DataFrame) -> None:
+    """Kapacity z configu -> room_capacity (NULL = pokoj bez kapacity, jen jeden pobyt na noc)."""
+    caps = room_capacities(cfg) or {}
+    con.execute("DELETE FROM room_capacity")
+    con.executemany("INSERT INTO room_capacity(room_type, capacity) VALUES (?, ?)",
+                    [(rt, c) for rt, c in caps.items() if c > 0])
+
+def ensure_room_capacity(db_path: str, cfg_path: str, pool: Optional[SiteConnectionPool] = None) -> None:
+    """
+    room_capacity odpovídá configu lokality; přepisuje se jen po změně CSV
+    (mtime). Volá se před každým zápisem, takže běžně stojí jen stat().
+    Podle kterého mtime je tabulka naplněná, si pamatuje pool DB.
+    """
+    pool = pool or _conn_pool(db_path)
+    mtime = os.stat(cfg_path).st_mtime
+    if pool.capacity_synced.get(cfg_path) == mtime:
+        return
+    with pool.connection() as con:
+        con.execute("BEGIN IMMEDIATE")
+        _sync_room_capacity(con, load_config_for_path(cfg_path, mtime))
+    pool.capacity_synced[cfg_path] = mtime
+
+# pořadí = verze schématu (user_version); nové kroky jen přidávat na konec
+MIGRATIONS = [
+    _m001_base_schema,   # 1: základní tabulky
+    _m002_iso_dates,     # 2: *_iso sloupce, triggery, indexy nad datumy
+    _m003_foreign_keys,  # 3: FK pokojů a účastníků na rezervaci, ON DELETE CASCADE
+    _m004_room_nights,   # 4: room_nights (pokoj × noc) s UNIQUE, triggery, backfill
+    _m005_room_capacity, # 5: room_nights s počtem osob, kapacity pokojů místo UNIQUE
+]
+
+def migrate_db(db_path: str) -> int:
+    """
+    Dožene schéma DB na poslední verzi a vrátí ji. Každý krok běží ve vlastní
+    BEGIN IMMEDIATE transakci spolu se zvýšením user_version – neprovede se
+    napůl ani dvakrát, ani když startují dva procesy zároveň.
+    """
+    with _conn_pool(db_path).connection() as con:
+        while True:
+            con.execute("BEGIN IMMEDIATE")
+            version = con.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                con.commit()
+                return version
+            MIGRATIONS[version](con.cursor())
+            con.execute(f"PRAGMA user_version = {version + 1}")
+            con.commit()
+
+@st.cache_resource(show_spinner=False)
+def _schema_ready(db_path: str) -> int:
+    """migrate_db jednou za proces pro každou DB lokality."""
+    return migrate_db(db_path)
+
+def init_db():
+    """
+    Zajistí aktuální schéma DB zvolené lokality a kapacity pokojů podle configu;
+    po prvním běhu v procesu (dokud se config nezmění) nic nedělá.
+    """
+    db_path, cfg_path = current_paths()
+    if not db_path:
+        raise RuntimeError("Lokalita není zvolena.")
+    _schema_ready(db_path)
+    ensure_room_capacity(db_path, cfg_path)
 
 
 def participant_price(room_type: str, is_employee: bool, nights: int, cfg: pd.DataFrame) -> float:
@@ -805,28 +1415,42 @@ def fetch_booking_rooms(booking_id: str) -> pd.DataFrame:
         """, con, params=(booking_id,))
     return df
 
+def _participants_changed() -> None:
+    """Účastníci jsou jen ve feedech se jmény – jen tehdy je změna přegeneruje."""
+    if ics_feed_names_enabled():
+        schedule_feed_refresh(True, frozenset())
+
 def delete_participants_by_id(booking_id: str):
-    with get_conn() as con:
+    with write_transaction() as con:
         con.execute("DELETE FROM participants WHERE id = ?", (booking_id,))
-        con.commit()
-
-def insert_participants(booking_id: str, payload: list[dict]):
-    with get_conn() as con:
-        cur = con.cursor()
-        for p in payload:
-            cur.execute("""
-                INSERT INTO participants(id, person_idx, name, is_employee, nights, room_type, price)
-                VALUES(?,?,?,?,?,?,?)
-            """, (
-                booking_id,
-                int(p["person_idx"]),
-                p["name"],
-                1 if p["is_employee"] else 0,
-                int(p["nights"]),
-                p.get("room_type", ""),
-                float(p.get("price", 0.0)),
-            ))
-        con.commit()
+    _participants_changed()
+
+SQL_INSERT_PARTICIPANT = """
+    INSERT INTO participants(id, person_idx, name, is_employee, nights, room_type, price)
+    VALUES(?,?,?,?,?,?,?)
+"""
+
+def _participant_rows(booking_id: str, payload: list[dict]) -> list[tuple]:
+    return [(
+        booking_id,
+        int(p["person_idx"]),
+        p["name"],
+        1 if p["is_employee"] else 0,
+        int(p["nights"]),
+        p.get("room_type", ""),
+        float(p.get("price", 0.0)),
+    ) for p in payload]
+
+def insert_participants(booking_id: str, payload: list[dict], replace: bool = False):
+    """
+    Uloží účastníky jedním executemany v jedné transakci.
+    replace=True nejdřív smaže dosavadní účastníky rezervace (ve stejné transakci).
+    """
+    with write_transaction() as con:
+        if replace:
+            con.execute("DELETE FROM participants WHERE id = ?", (booking_id,))
+        con.executemany(SQL_INSERT_PARTICIPANT, _participant_rows(booking_id, payload))
+    _participants_changed()
 
 def participants_ui():
     st.header("Účastníci rezervace")
@@ -930,8 +1554,7 @@ def participants_ui():
                 st.error("Počet nocí musí být ≥ 1 u všech účastníků.")
                 return
         try:
-            delete_participants_by_id(booking_id)
-            insert_participants(booking_id, participant_rows)
+            insert_participants(booking_id, participant_rows, replace=True)
             st.success("Účastníci uloženi.")
         except Exception as e:
             st.error(f"Ukládání selhalo: {e}")
@@ -972,34 +1595,34 @@ def participants_ui():
                 st.error(f"Odeslání e-mailu selhalo: {e}")
 
 
-def create_voucher_pdf_bytes_participants(booking_id: str) -> bytes:
-    # Unicode fonty...
-
-    ensure_czech_fonts()
-
+def create_voucher_pdf_bytes_participants(booking_id: str, renderer: Optional[str] = None) -> bytes:
+    """Poukaz s účastníky; stejný obsah rezervace = PDF z cache (viz voucher_cache_key)."""
     hdr, _ = fetch_detail(booking_id)
     if not hdr:
         raise ValueError("ID nenalezeno.")
-    _id, guest_name, garr, gdep, gnights, per_room = hdr
     parts = fetch_participants(booking_id)
     if parts.empty:
         raise ValueError("Nejsou uložení žádní účastníci.")
+    renderer = _voucher_renderer(renderer)
+    key = voucher_cache_key("ucastnici", hdr, parts.to_numpy().tolist(), renderer)
+    return _voucher_cache().get_or_build(key, lambda: _render_voucher_job("ucastnici", hdr, parts, renderer))
+
+def _build_voucher_pdf_participants(hdr: tuple, parts: pd.DataFrame) -> bytes:
+    # fonty, styly a logo z registru procesu (viz pdf_resources)
+    res = pdf_resources()
+
+    _id, guest_name, garr, gdep, gnights, per_room = hdr
 
     buf = BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=18*mm, rightMargin=18*mm, topMargin=15*mm, bottomMargin=15*mm)
-    styles = getSampleStyleSheet()
-    base_font = "DejaVuSans"
-    bold_font = "DejaVuSans-Bold"
-    styles["Normal"].fontName = base_font
-    styles["Title"].fontName = bold_font
-    styles["Heading3"].fontName = bold_font
-
-    styles.add(ParagraphStyle(name="Small", parent=styles["Normal"], fontName=base_font, fontSize=9))
+    styles = res.styles
+    base_font = res.base_font
+    bold_font = res.bold_font
 
     story = []
 
     # === LOGO ZOO PRAHA (nahoře vpravo) ===
-    logo = _zoo_logo_flowable(36)  # 36 mm šířka
+    logo = res.logo_flowable()  # 36 mm šířka
     if logo:
         story.append(logo)
         story.append(Spacer(1, 6))
@@ -1012,20 +1635,11 @@ def create_voucher_pdf_bytes_participants(booking_id: str) -> bytes:
 
     # === (ZDE byla sekce 'Režim datumů' a 'Příjezd/​Odjezd' — odstraněno) ===
 
-    data = [["#", "Jméno", "Zam.", "Nocí", "Pokoj", "Cena (Kč)"]]
-    total = 0.0
-    for idx, r in parts.iterrows():
-        data.append([
-            int(r["person_idx"]),
-            r["name"],
-            "Ano" if int(r["is_employee"]) == 1 else "Ne",
-            int(r["nights"]),
-            r.get("room_type") or "",
-            int(r["price"] or 0),
-        ])
-        total += float(r["price"] or 0.0)
-
-    tbl = Table(data, colWidths=[8*mm, 55*mm, 12*mm, 14*mm, 35*mm, 25*mm])
+    _, columns = VOUCHER_LAYOUTS["ucastnici"]
+    body, total = _voucher_table("ucastnici", hdr, parts)
+    data = [[c[0] for c in columns]] + body
+
+    tbl = Table(data, colWidths=[c[1]*mm for c in columns])
     tbl.setStyle(TableStyle([
         ("FONTNAME", (0,0), (-1,-1), base_font),
         ("FONTSIZE", (0,0), (-1,-1), 9),
@@ -1059,21 +1673,23 @@ def fetch_participants(booking_id: str) -> pd.DataFrame:
         """, con, params=(booking_id,))
 
 def insert_or_replace_booking(header: dict, rooms_payload: list, overwrite: bool):
-    # 1) kontrola konfliktů (kromě self při editaci)
-    exclude = header["id"] if overwrite else None
-    conflicts = find_room_conflicts(rooms_payload, exclude_id=exclude)
-    if conflicts:
-        # Sestavíme stručnou zprávu
-        sample = conflicts[:5]
-        lines = [
-            f"- {c['room_type']}: koliduje s {c['existing_id']} ({c['existing_arrival']}–{c['existing_departure']})"
-            for c in sample
-        ]
-        more = f"\n… a další {len(conflicts) - len(sample)} konfliktů." if len(conflicts) > len(sample) else ""
-        raise ValueError("Není volno pro vybrané pokoje a termíny:\n" + "\n".join(lines) + more)
-
-    # 2) standardní logika uložení
-    with get_conn() as con:
+    # kontrola i zápis v jedné BEGIN IMMEDIATE transakci – dva admini
+    # ukládající souběžně stejný pokoj/termín se nemůžou oba „vejít“
+    with write_transaction() as con:
+        # 1) kontrola konfliktů (kromě self při editaci)
+        exclude = header["id"] if overwrite else None
+        conflicts = find_room_conflicts(rooms_payload, exclude_id=exclude, con=con)
+        if conflicts:
+            # Sestavíme stručnou zprávu
+            sample = conflicts[:5]
+            lines = [
+                f"- {_format_conflict(c)}"
+                for c in sample
+            ]
+            more = f"\n… a další {len(conflicts) - len(sample)} konfliktů." if len(conflicts) > len(sample) else ""
+            raise ValueError("Není volno pro vybrané pokoje a termíny:\n" + "\n".join(lines) + more)
+
+        # 2) standardní logika uložení
         cur = con.cursor()
 
         if not overwrite:
@@ -1082,37 +1698,18 @@ def insert_or_replace_booking(header: dict, rooms_payload: list, overwrite: bool
                 raise ValueError(f"Rezervace s ID '{header['id']}' už existuje.")
 
         if overwrite:
-            cur.execute("DELETE FROM reservations WHERE id = ?", (header["id"],))
+            # hlavičku jen přepíšeme (upsert níže) – DELETE by kaskádou smazal i účastníky
             cur.execute("DELETE FROM reservation_rooms WHERE id = ?", (header["id"],))
 
-        cur.execute("""
-            INSERT INTO reservations(id, guest_name, global_arrival, global_departure, global_nights, per_room)
-            VALUES(?,?,?,?,?,?)
-        """, (
-            header["id"],
-            header["guest_name"],
-            header.get("global_arrival"),
-            header.get("global_departure"),
-            header.get("global_nights", 0),
-            1 if header.get("per_room") else 0
-        ))
-
-        for r in rooms_payload:
-            cur.execute("""
-                INSERT INTO reservation_rooms(id, room_idx, room_type, employees, guests, arrival, departure, nights, price)
-                VALUES(?,?,?,?,?,?,?,?,?)
-            """, (
-                header["id"],
-                r["room_idx"],
-                r.get("room_type"),
-                int(r.get("employees", 0)),
-                int(r.get("guests", 0)),
-                r.get("arrival"),
-                r.get("departure"),
-                int(r.get("nights", 0)),
-                float(r.get("price", 0.0)),
-            ))
-        con.commit()
+        cur.execute(SQL_INSERT_RESERVATION + """
+            ON CONFLICT(id) DO UPDATE SET
+                guest_name = excluded.guest_name,
+                global_arrival = excluded.global_arrival,
+                global_departure = excluded.global_departure,
+                global_nights = excluded.global_nights,
+                per_room = excluded.per_room
+        """, _reservation_row(header))
+        cur.executemany(SQL_INSERT_ROOM, _room_rows(header["id"], rooms_payload))
 # ---------- CONFIG ----------
 def price_for(room_type: str, employees: int, guests: int, nights: int, cfg: pd.DataFrame) -> float:
     if not room_type or nights <= 0:
@@ -1130,43 +1727,84 @@ def days_between(a: Optional[date], d: Optional[date]) -> int:
         return 0
     return (d - a).days
 
+def delete_bookings(booking_ids: list[str]) -> int:
+    """
+    Smaže rezervace jedním DELETE v jedné transakci; pokoje a účastníky
+    odstraní cizí klíče (ON DELETE CASCADE). Vrací počet smazaných rezervací.
+    """
+    ids = list(dict.fromkeys(str(i) for i in booking_ids if i))
+    if not ids:
+        return 0
+    with write_transaction() as con:
+        cur = con.execute("DELETE FROM reservations WHERE id IN (SELECT value FROM json_each(?))",
+                          (json.dumps(ids),))
+        return cur.rowcount
+
 def delete_by_id(booking_id: str):
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.execute("DELETE FROM reservations WHERE id = ?", (booking_id,))
-        cur.execute("DELETE FROM reservation_rooms WHERE id = ?", (booking_id,))
-        con.commit()
+    delete_bookings([booking_id])
+
+SQL_INSERT_RESERVATION = """
+    INSERT INTO reservations(id, guest_name, global_arrival, global_departure, global_nights, per_room)
+    VALUES(?,?,?,?,?,?)
+"""
+SQL_INSERT_ROOM = """
+    INSERT INTO reservation_rooms(id, room_idx, room_type, employees, guests, arrival, departure, nights, price)
+    VALUES(?,?,?,?,?,?,?,?,?)
+"""
+
+def _reservation_row(header: Dict) -> tuple:
+    return (
+        header["id"],
+        header["guest_name"],
+        header.get("global_arrival"),
+        header.get("global_departure"),
+        header.get("global_nights", 0),
+        1 if header.get("per_room") else 0,
+    )
+
+def _room_rows(booking_id: str, rooms: List[Dict]) -> list[tuple]:
+    return [(
+        booking_id,
+        r["room_idx"],
+        r.get("room_type"),
+        int(r.get("employees", 0)),
+        int(r.get("guests", 0)),
+        r.get("arrival"),
+        r.get("departure"),
+        int(r.get("nights", 0)),
+        float(r.get("price", 0.0)),
+    ) for r in rooms]
 
 def insert_booking(payload_header: Dict, payload_rooms: List[Dict]):
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.execute("""
-            INSERT INTO reservations(id, guest_name, global_arrival, global_departure, global_nights, per_room)
-            VALUES(?,?,?,?,?,?)
-        """, (
-            payload_header["id"],
-            payload_header["guest_name"],
-            payload_header.get("global_arrival"),
-            payload_header.get("global_departure"),
-            payload_header.get("global_nights", 0),
-            1 if payload_header.get("per_room") else 0
-        ))
-        for r in payload_rooms:
-            cur.execute("""
-                INSERT INTO reservation_rooms(id, room_idx, room_type, employees, guests, arrival, departure, nights, price)
-                VALUES(?,?,?,?,?,?,?,?,?)
-            """, (
-                payload_header["id"],
-                r["room_idx"],
-                r.get("room_type"),
-                r.get("employees", 0),
-                r.get("guests", 0),
-                r.get("arrival"),
-                r.get("departure"),
-                r.get("nights", 0),
-                r.get("price", 0.0),
-            ))
-        con.commit()
+    with write_transaction() as con:
+        con.execute(SQL_INSERT_RESERVATION, _reservation_row(payload_header))
+        con.executemany(SQL_INSERT_ROOM, _room_rows(payload_header["id"], payload_rooms))
+
+def insert_bookings_bulk(bookings: List[Dict], check_conflicts: bool = True) -> int:
+    """
+    Hromadný import: bookings = [{"header": {...}, "rooms": [...], "participants": [...]}, ...]
+    (participants nepovinné). Všechno v jedné transakci a po dávkách přes executemany –
+    buď se naimportuje celý seznam, nebo nic. S check_conflicts=True se každá
+    rezervace kontroluje proti DB i proti dříve importovaným ze stejné dávky.
+    Vrací počet vložených rezervací.
+    """
+    with write_transaction() as con:
+        if check_conflicts:
+            caps = room_capacities(get_cfg()) or {}
+            for b in bookings:
+                conflicts = find_room_conflicts(b["rooms"], con=con, caps=caps)
+                if conflicts:
+                    c = conflicts[0]
+                    raise ValueError(f"Import zastaven: {b['header']['id']} – {_format_conflict(c)}.")
+                # vložit hned, ať kontrola dalších rezervací vidí i tuto
+                con.execute(SQL_INSERT_RESERVATION, _reservation_row(b["header"]))
+                con.executemany(SQL_INSERT_ROOM, _room_rows(b["header"]["id"], b["rooms"]))
+        else:
+            con.executemany(SQL_INSERT_RESERVATION, [_reservation_row(b["header"]) for b in bookings])
+            con.executemany(SQL_INSERT_ROOM, [row for b in bookings for row in _room_rows(b["header"]["id"], b["rooms"])])
+        con.executemany(SQL_INSERT_PARTICIPANT,
+                        [row for b in bookings for row in _participant_rows(b["header"]["id"], b.get("participants") or [])])
+    return len(bookings)
 
 def fetch_detail(booking_id: str):
     with get_conn() as con:
@@ -1329,7 +1967,8 @@ def fetch_overview_rooms() -> pd.DataFrame:
 
 # --- KALENDÁŘ: pomocné funkce (bez kapacity) ---
 import calendar
-from datetime import datetime as dt
+from datetime import datetime as dt, timedelta
+import numpy as np
 
 def _parse_cz_date(s: str) -> Optional[date]:
     if not s:
@@ -1339,51 +1978,83 @@ def _parse_cz_date(s: str) -> Optional[date]:
     except Exception:
         return None
 
-def occupancy_by_day_boolean() -> pd.DataFrame:
-    with get_conn() as con:
-        rows = pd.read_sql_query("""
-            SELECT room_type, arrival, departure
-            FROM reservation_rooms
-            WHERE room_type IS NOT NULL AND room_type <> ''
-        """, con)
-
-    if rows.empty:
-        return pd.DataFrame(columns=["date", "room_type", "occupied"])
-
-    recs = []
-    for _, r in rows.iterrows():
-        rt = str(r["room_type"])
-        a = _parse_cz_date(str(r["arrival"]))
-        d = _parse_cz_date(str(r["departure"]))
-        if not a or not d:
-            continue
-        curr = a
-        while curr < d:  # odjezd exkluzivně
-            recs.append({"date": curr, "room_type": rt, "occupied": 1})
-            curr = curr + timedelta(days=1)   # ✅ čistý posun o den
+def _month_bounds(year: int, month: int) -> tuple[date, date]:
+    """Okno měsíce [1. den, 1. den dalšího měsíce)."""
+    first = date(year, month, 1)
+    return first, first + timedelta(days=calendar.monthrange(year, month)[1])
+
+def _month_slice(origin: date, year: int, month: int) -> slice:
+    """Sloupce daného měsíce v bitmapě, která začíná dnem `origin`."""
+    first, nxt = _month_bounds(year, month)
+    return slice((first - origin).days, (nxt - origin).days)
+
+def load_room_nights(start: date, end: date, con: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+    """Obsazené noci z `room_nights` v okně [start, end) jako ['room_type','night','booking_id','people']."""
+    sql = """
+        SELECT room_type, night, booking_id, people FROM room_nights
+        WHERE night >= ? AND night < ?
+    """
+    if con is None:
+        with get_conn() as con:
+            return pd.read_sql_query(sql, con, params=(start.isoformat(), end.isoformat()))
+    return pd.read_sql_query(sql, con, params=(start.isoformat(), end.isoformat()))
 
-    if not recs:
-        return pd.DataFrame(columns=["date", "room_type", "occupied"])
+def room_capacity_vector(room_types: list[str], cfg: Optional[pd.DataFrame] = None) -> np.ndarray:
+    """Kapacita pokojů v pořadí room_types; 0 = pokoj bez kapacity (celý jednomu pobytu)."""
+    caps = room_capacities(get_cfg() if cfg is None else cfg) or {}
+    return np.array([max(0, caps.get(rt, 0)) for rt in room_types], dtype=np.int32)
 
-    df = pd.DataFrame(recs)
-    df = df.groupby(["date", "room_type"], as_index=False)["occupied"].max()
-    return df
+def occupancy_load(start: date, end: date, room_types: list[str],
+                   con: Optional[sqlite3.Connection] = None,
+                   cfg: Optional[pd.DataFrame] = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Zatížení pokojů pro okno [start, end): (load, capacity), load = pokoje × dny (int).
+    Pokoj s kapacitou: load = počet osob na noc, capacity = lůžka.
+    Pokoj bez kapacity: load = počet pobytů na noc, capacity = 1.
+    Plný je pokoj, když load >= capacity; 0 < load < capacity = částečně obsazený.
+
+    Noci jsou předpočítané v `room_nights` (triggery), takže stačí rozsahový
+    dotaz nad indexem a sečíst je do matice (np.add.at). Měsíc/rok je pak
+    jen řez matice (viz _month_slice). `con`/`cfg` pro běh mimo session
+    (vlákno FeedRefresher), jinak aktuální lokalita.
+    """
+    n_days = max(0, (end - start).days)
+    cap = room_capacity_vector(room_types, cfg)
+    load = np.zeros((len(room_types), n_days), dtype=np.int32)
+    if n_days == 0 or not room_types:
+        return load, np.maximum(cap, 1)
+    nights = load_room_nights(start, end, con)
+    if nights.empty:
+        return load, np.maximum(cap, 1)
+
+    row_of = {rt: i for i, rt in enumerate(room_types)}
+    ri = nights["room_type"].map(row_of)
+    ok = ri.notna().to_numpy()  # pokoje, které už v configu nejsou, se nezobrazují
+    ri = ri.to_numpy()[ok].astype(np.int64)
+    day = (pd.to_datetime(nights["night"], format="%Y-%m-%d").to_numpy().astype("datetime64[D]")
+           - np.datetime64(start, "D")).astype(np.int64)[ok]
+    # kapacitní pokoje sčítají osoby, ostatní pobyty
+    weight = np.where(cap[ri] > 0, nights["people"].to_numpy()[ok], 1).astype(np.int32)
+    np.add.at(load, (ri, day), weight)
+    return load, np.maximum(cap, 1)
+
+def occupancy_bitmap(start: date, end: date, room_types: list[str]) -> np.ndarray:
+    """
+    Matice plné obsazenosti pro okno [start, end): řádky = room_types (pořadí
+    z configu), sloupce = dny od `start`. True = pokoj je plný (bez kapacity:
+    má pobyt). Příjezd včetně, odjezd exkluzivně.
+    """
+    load, cap = occupancy_load(start, end, room_types)
+    return load >= cap[:, None]
 
 def availability_for_month_bool(room_type: str, year: int, month: int) -> pd.DataFrame:
     """
     ['date','available']  (True = volno, False = obsazeno) pro daný typ pokoje.
     """
-    occ = occupancy_by_day_boolean()
-    occ_rt = occ[occ["room_type"] == room_type] if not occ.empty else pd.DataFrame(columns=["date","occupied"])
-
-    first = date(year, month, 1)
-    last_day = calendar.monthrange(year, month)[1]
-    days = pd.date_range(first, date(year, month, last_day), freq="D").date
-
-    merged = pd.DataFrame({"date": days}).merge(occ_rt[["date","occupied"]], on="date", how="left")
-    merged["occupied"] = merged["occupied"].fillna(0).astype(int)
-    merged["available"] = merged["occupied"].apply(lambda x: False if x >= 1 else True)
-    return merged[["date", "available"]]
+    first, nxt = _month_bounds(year, month)
+    occ = occupancy_bitmap(first, nxt, [room_type])[0]
+    days = pd.date_range(first, nxt - timedelta(days=1), freq="D").date
+    return pd.DataFrame({"date": days, "available": ~occ})
 def render_calendar_matrix_bool(av_df: pd.DataFrame, year: int, month: int, title: str = ""):
     """
     Mini kalendář Po–Ne:
@@ -1427,24 +2098,358 @@ def calendars_all_ui():
     year = c1.number_input("Rok", min_value=2000, max_value=2100, value=today.year, step=1)
     month = c2.number_input("Měsíc", min_value=1, max_value=12, value=today.month, step=1)
 
+    # obsazenost spočítáme jednou pro všechny typy, pak jen bereme řádky
+    first, nxt = _month_bounds(int(year), int(month))
+    occ = occupancy_bitmap(first, nxt, room_types)
+    days = pd.date_range(first, nxt - timedelta(days=1), freq="D").date
+
     # vykreslíme kalendáře pro všechny typy, po dvou vedle sebe
     cols_per_row = 2
     for i, rt in enumerate(room_types):
         if i % cols_per_row == 0:
             row = st.columns(cols_per_row)
-        av = availability_for_month_bool(rt, int(year), int(month))
+        av = pd.DataFrame({"date": days, "available": ~occ[i]})
         with row[i % cols_per_row]:
             st.markdown(f"### {rt}")
             render_calendar_matrix_bool(av, int(year), int(month))
             st.markdown("---")
 
 
+# --- VOLNÉ TERMÍNY: hledání oken nad bitmapou obsazenosti ---
+FREE_WINDOWS_LIMIT = 500  # víc výsledků UI stejně nezobrazí
+
+def room_capacities(cfg: pd.DataFrame) -> Optional[dict]:
+    """{pokoj -> počet lůžek} z nepovinného sloupce KAPACITA configu; None, když sloupec chybí."""
+    if "KAPACITA" not in cfg.columns:
+        return None
+    caps = pd.to_numeric(cfg["KAPACITA"], errors="coerce").fillna(0).astype(int)
+    return dict(zip(cfg["POKOJ"].tolist(), caps.tolist()))
+
+def find_free_windows(room_types: list[str], nights: int, start: date, end: date,
+                      party_size: int = 0, require_all: bool = True,
+                      first_only: bool = False, limit: int = FREE_WINDOWS_LIMIT) -> list[dict]:
+    """
+    Okna `nights` po sobě jdoucích volných nocí s příjezdem v [start, end − nights].
+    require_all=True: všechny `room_types` musí být zároveň úplně prázdné.
+    require_all=False: stačí pokoje z `room_types`, jejichž volná lůžka (KAPACITA
+    v configu minus už ubytované osoby) pokryjí `party_size`; pokoj bez hodnoty
+    KAPACITA je výhradní s jedním lůžkem (jako v occupancy_load). Bez sloupce
+    KAPACITA stačí jeden volný pokoj.
+
+    Součet zatížení v okně je rozdíl kumulativních součtů (posuvné okno), volná
+    lůžka jsou kapacita minus maximum zatížení v okně, takže víceletý horizont
+    je jeden dotaz + pár vektorových operací.
+    Vrací [{"arrival", "departure", "rooms", "capacity", "beds"}] seřazené podle
+    příjezdu; capacity = volná lůžka ve vrácených pokojích, beds = {pokoj -> volná
+    lůžka} (obojí None bez kapacit v configu).
+    """
+    nights = int(nights)
+    if nights <= 0 or not room_types or (end - start).days < nights:
+        return []
+
+    load, cap = occupancy_load(start, end, room_types)
+    busy = np.zeros((len(room_types), load.shape[1] + 1), dtype=np.int64)
+    np.cumsum(load, axis=1, out=busy[:, 1:])
+    empty = (busy[:, nights:] - busy[:, :-nights]) == 0   # pokoje × možné dny příjezdu
+
+    # cap z occupancy_load: lůžka, u pokoje bez hodnoty KAPACITA 1 (výhradní)
+    has_caps = room_capacities(get_cfg()) is not None
+    if require_all:
+        free = empty
+        ok = empty.all(axis=0)
+        beds = np.repeat(cap[:, None], ok.size, axis=1) if has_caps else None
+        if has_caps and party_size and cap.sum() < party_size:
+            return []
+    elif has_caps:
+        # volná lůžka po celé okno: kapacita minus nejvyšší zatížení v okně
+        peak = np.lib.stride_tricks.sliding_window_view(load, nights, axis=1).max(axis=2)
+        beds = np.clip(cap[:, None] - peak, 0, None)
+        free = beds > 0
+        ok = beds.sum(axis=0) >= max(1, int(party_size))
+    else:
+        beds, free = None, empty
+        ok = free.any(axis=0)
+
+    out = []
+    for i in np.flatnonzero(ok)[:1 if first_only else limit]:
+        rooms = [rt for rt, f in zip(room_types, free[:, i]) if f]
+        arrival = start + timedelta(days=int(i))
+        room_beds = None if beds is None else {
+            rt: int(b) for rt, b, f in zip(room_types, beds[:, i], free[:, i]) if f}
+        out.append({
+            "arrival": arrival,
+            "departure": arrival + timedelta(days=nights),
+            "rooms": rooms,
+            "capacity": None if room_beds is None else sum(room_beds.values()),
+            "beds": room_beds,
+        })
+    return out
+
+def _prefill_booking_from_window(window: dict, party: int = 0, require_all: bool = True) -> None:
+    """
+    on_click: předvyplní formulář 'Přidat' oknem z hledání (stejně jako žádost).
+    `party` osob rozdělí jako hosty do pokojů podle volných lůžek (bez kapacit
+    všechny do prvního pokoje); v režimu „kterékoli“ vynechá pokoje, na které
+    už nikdo nezbyl.
+    """
+    rooms, left = [], int(party)
+    for rt in window["rooms"][:MAX_ROOMS]:
+        if party and not left and not require_all:
+            break
+        guests = left if window["beds"] is None else min(left, window["beds"][rt])
+        rooms.append({"room_type": rt, "employees": 0, "guests": guests})
+        left -= guests
+    if left and rooms:
+        rooms[-1]["guests"] += left   # víc osob než volných lůžek v povolených pokojích
+    st.session_state["pending_order"] = {
+        "guest_name": "",
+        "global_arrival": window["arrival"].strftime("%d.%m.%Y"),
+        "global_departure": window["departure"].strftime("%d.%m.%Y"),
+        "per_room": False,
+        "rooms": rooms,
+    }
+    st.session_state["nav"] = "Přidat"
+
+def free_windows_ui():
+    st.header("Hledání volných termínů")
+    cfg = get_cfg()
+    all_rooms = cfg["POKOJ"].tolist()
+    if not all_rooms:
+        st.warning("Žádné pokoje v configu.")
+        return
+    caps = room_capacities(cfg)
+
+    today = date.today()
+    c1, c2 = st.columns([3, 1])
+    rooms = c1.multiselect("Pokoje", all_rooms, default=all_rooms[:1], key="fw_rooms")
+    require_all = c2.radio("Podmínka", ["Všechny vybrané", "Kterékoli s kapacitou"],
+                           key="fw_mode", horizontal=False) == "Všechny vybrané"
+    c3, c4, c5, c6 = st.columns(4)
+    nights = c3.number_input("Nocí", min_value=1, max_value=60, value=7, step=1, key="fw_nights")
+    party = c4.number_input("Osob", min_value=0, max_value=200, value=0, step=1, key="fw_party")
+    h_from = c5.date_input("Od", value=today, format="DD.MM.YYYY", key="fw_from")
+    h_to = c6.date_input("Do", value=date(today.year + 2, 12, 31), format="DD.MM.YYYY", key="fw_to")
+    first_only = st.checkbox("Jen první volný termín", value=False, key="fw_first")
+    if caps is None and party:
+        st.caption("Config nemá sloupec KAPACITA – počet osob se při hledání nezohlední.")
+
+    if not rooms:
+        st.info("Vyber aspoň jeden pokoj.")
+        return
+
+    t0 = time.perf_counter()
+    windows = find_free_windows(rooms, int(nights), h_from, h_to, party_size=int(party),
+                                require_all=require_all, first_only=first_only)
+    took_ms = (time.perf_counter() - t0) * 1000.0
+
+    if not windows:
+        st.warning("V zadaném horizontu není žádný vyhovující volný termín.")
+        return
+    more = " (zobrazeno prvních %d)" % FREE_WINDOWS_LIMIT if len(windows) == FREE_WINDOWS_LIMIT else ""
+    st.caption(f"Nalezeno {len(windows)} možných příjezdů{more} za {took_ms:.1f} ms.")
+
+    table = pd.DataFrame([{
+        "Příjezd": w["arrival"].strftime("%d.%m.%Y"),
+        "Odjezd": w["departure"].strftime("%d.%m.%Y"),
+        "Volné pokoje": ", ".join(w["rooms"]),
+        **({"Lůžek": w["capacity"]} if caps is not None else {}),
+    } for w in windows])
+    st.dataframe(table, use_container_width=True, hide_index=True)
+
+    idx = st.selectbox("Termín k rezervaci", range(len(windows)), key="fw_pick",
+                       format_func=lambda i: f"{table.iloc[i]['Příjezd']} – {table.iloc[i]['Odjezd']} "
+                                             f"({table.iloc[i]['Volné pokoje']})")
+    st.button("Předvyplnit do 'Přidat'", type="primary", key="fw_prefill",
+              on_click=_prefill_booking_from_window, args=(windows[idx], int(party), require_all))
+
+
+# --- PŘIDĚLOVÁNÍ POKOJŮ skupině (branch-and-bound nad volnými pokoji) ---
+ALLOCATION_OBJECTIVES = {"rooms": "Nejméně pokojů", "price": "Nejnižší cena"}
+
+def _room_prices(cfg: pd.DataFrame) -> dict:
+    """{pokoj -> (cena zaměstnanec, cena host)} za osobu a noc."""
+    return {rt: (float(cz), float(cn)) for rt, cz, cn in zip(cfg["POKOJ"], cfg["CENA_Z"], cfg["CENA_N"])}
+
+def _k_smallest_sums(values: list[float], k: int) -> list[float]:
+    """out[i] = součet k nejmenších z values[:i] (inf, dokud jich není k)."""
+    out = [0.0 if k == 0 else math.inf] * (len(values) + 1)
+    if k == 0:
+        return out
+    heap, total = [], 0.0  # max-heap k nejmenších (záporné hodnoty)
+    for i, v in enumerate(values):
+        if len(heap) < k:
+            heapq.heappush(heap, -v)
+            total += v
+        elif v < -heap[0]:
+            total += v + heapq.heappushpop(heap, -v)
+        if len(heap) == k:
+            out[i + 1] = total
+    return out
+
+def _fill_rooms(rooms: list[str], employees: int, guests: int, caps: dict,
+                prices: dict) -> tuple[float, list[dict]]:
+    """
+    Nejlevnější rozsazení osob do vybraných pokojů -> (cena za noc, pokoje s osobami).
+    Výměnou zaměstnanec↔host se ukáže, že v optimu mají lůžka zaměstnanců
+    rozdíl (cena Z − cena N) nejvýš takový jako lůžka hostů: stačí lůžka seřadit
+    podle rozdílu a zkusit každý bod řezu – vlevo nejlevnější lůžka pro
+    zaměstnance, vpravo pro hosty. Nevejdou-li se, vrací (inf, []).
+    """
+    beds = sorted((prices[rt][0] - prices[rt][1], rt) for rt in rooms for _ in range(caps[rt]))
+    n = len(beds)
+    if employees + guests > n:
+        return math.inf, []
+    emp_cost = _k_smallest_sums([prices[rt][0] for _, rt in beds], employees)
+    gst_cost = _k_smallest_sums([prices[rt][1] for _, rt in reversed(beds)], guests)[::-1]
+    k = min(range(employees, n - guests + 1), key=lambda i: emp_cost[i] + gst_cost[i])
+
+    put = {rt: [0, 0] for rt in rooms}
+    for _, rt in sorted(beds[:k], key=lambda b: prices[b[1]][0])[:employees]:
+        put[rt][0] += 1
+    for _, rt in sorted(beds[k:], key=lambda b: prices[b[1]][1])[:guests]:
+        put[rt][1] += 1
+    filled = [{"room_type": rt, "employees": e, "guests": g} for rt, (e, g) in put.items() if e + g]
+    return emp_cost[k] + gst_cost[k], filled
+
+def allocate_rooms(employees: int, guests: int, arrival: date, departure: date,
+                   preferred: Optional[list[str]] = None, objective: str = "rooms") -> Optional[dict]:
+    """
+    Najde pokoje pro skupinu na [arrival, departure) podle kapacit z configu
+    (sloupec KAPACITA); u částečně obsazených pokojů počítá jen lůžka volná po
+    celý pobyt. objective="rooms": nejméně pokojů, pak cena;
+    objective="price": nejnižší cena, pak počet pokojů. Při shodě vyhrají
+    preferované typy. Prohledává podmnožiny volných pokojů (branch-and-bound):
+    větev se ořízne, když ani zbylé kapacity nestačí nebo když dolní odhad
+    nemůže porazit dosud nejlepší řešení. Odhad počtu pokojů = vybrané +
+    nejméně největších zbývajících; odhad ceny = nejlevnější lůžka ve
+    vybraných a zbývajících pokojích (seřazené ceny lůžek se spočtou předem,
+    v uzlu se jen slučují).
+    Vrací {"rooms": [{room_type, employees, guests, price}], "price": float}
+    nebo None, když přidělení neexistuje.
+    """
+    if objective not in ALLOCATION_OBJECTIVES:
+        raise ValueError(f"Neznámé kritérium: {objective}")
+    cfg = get_cfg()
+    caps = room_capacities(cfg)
+    if caps is None:
+        raise ValueError("Config nemá sloupec KAPACITA – bez kapacit pokojů nelze přidělovat.")
+    people, nights = int(employees) + int(guests), (departure - arrival).days
+    if people <= 0 or nights <= 0:
+        return None
+
+    room_types = cfg["POKOJ"].tolist()
+    peak = occupancy_load(arrival, departure, room_types)[0].max(axis=1)
+    # zbývající lůžka; pokoje bez kapacity nepřidělujeme
+    caps = {rt: caps.get(rt, 0) - int(p) for rt, p in zip(room_types, peak) if caps.get(rt, 0) > 0}
+    preferred = set(preferred or [])
+    # preferované a velké pokoje napřed: dobré řešení se najde brzy a víc se ořezává
+    cand = sorted((rt for rt in room_types if caps.get(rt, 0) > 0),
+                  key=lambda rt: (rt not in preferred, -caps[rt]))
+    prices = _room_prices(cfg)
+    suffix_cap = np.concatenate([np.cumsum([caps[rt] for rt in cand][::-1])[::-1], [0]])
+    # ceny lůžek (Z, N, min(Z, N)) pokojů cand[i:], vzestupně – pro cenový odhad
+    suffix_beds = [([], [], [])]
+    for rt in reversed(cand):
+        beds = [[p] * caps[rt] for p in (prices[rt][0], prices[rt][1], min(prices[rt]))]
+        suffix_beds.append(tuple(sorted(prev + b) for prev, b in zip(suffix_beds[-1], beds)))
+    suffix_beds.reverse()
+    suffix_pref = np.concatenate([np.cumsum([rt in preferred for rt in cand][::-1])[::-1], [0]])
+
+    def key_of(chosen: list[str]) -> tuple:
+        price, filled = _fill_rooms(chosen, employees, guests, caps, prices)
+        price *= nights
+        non_pref = sum(r["room_type"] not in preferred for r in filled)
+        order = (len(filled), price) if objective == "rooms" else (price, len(filled))
+        return order + (non_pref,), filled
+
+    def min_rooms(rooms: list[str], need: int) -> int:
+        """Kolik největších z `rooms` je potřeba, aby pokryly `need` lůžek."""
+        n = 0
+        for c in sorted((caps[rt] for rt in rooms), reverse=True):
+            if need <= 0:
+                break
+            need -= c
+            n += 1
+        return n
+
+    def cheapest(chosen_beds: list, rest: list, k: int) -> float:
+        """Součet k nejlevnějších lůžek ze dvou seřazených seznamů."""
+        return float(sum(itertools.islice(heapq.merge(chosen_beds, rest), k)))
+
+    def lower_bound(chosen: list[str], i: int, cap: int, beds: tuple) -> tuple:
+        # nepreferovaných pokojů bude aspoň (pokojů) − (preferovaných, které ještě jdou použít)
+        pref_left = sum(rt in preferred for rt in chosen) + suffix_pref[i]
+        if objective == "rooms":
+            n_rooms = len(chosen) + min_rooms(cand[i:], people - cap)
+            return (n_rooms, 0.0, max(0, n_rooms - pref_left))
+        # relaxace: každý platí aspoň nejlevnější volné lůžko svého druhu
+        # (lůžko smí „sdílet“ zaměstnanec s hostem), resp. min(Z, N) bez sdílení
+        z, n, m = (cheapest(b, r, k) for b, r, k in zip(beds, suffix_beds[i], (employees, guests, people)))
+        n_rooms = min_rooms(chosen + cand[i:], people)
+        return (max(z + n, m) * nights, n_rooms, max(0, n_rooms - pref_left))
+
+    best = {"key": None, "rooms": None}
+
+    def search(i: int, chosen: list[str], cap: int, beds: tuple = ([], [], [])) -> None:
+        if cap + suffix_cap[i] < people:
+            return
+        # odhad platí i pro samotné `chosen` -> ořízne dřív, než se rozsazení spočítá
+        if best["key"] is not None and lower_bound(chosen, i, cap, beds) >= best["key"]:
+            return
+        if cap >= people:
+            key, filled = key_of(chosen)
+            if best["key"] is None or key < best["key"]:
+                best["key"], best["rooms"] = key, filled
+            if objective == "rooms":
+                return  # další pokoj už počet pokojů jen zvýší
+        if i == len(cand) or len(chosen) == MAX_ROOMS:
+            return
+        rt = cand[i]
+        if objective == "price":
+            added = tuple(sorted(b + [p] * caps[rt]) for b, p in zip(beds, (prices[rt][0], prices[rt][1], min(prices[rt]))))
+        else:
+            added = beds
+        search(i + 1, chosen + [rt], cap + caps[rt], added)
+        search(i + 1, chosen, cap, beds)
+
+    search(0, [], 0)
+    if best["rooms"] is None:
+        return None
+    rooms = [dict(r, price=price_for(r["room_type"], r["employees"], r["guests"], nights, cfg))
+             for r in best["rooms"]]
+    return {"rooms": rooms, "price": float(sum(r["price"] for r in rooms))}
+
+def _request_party(rooms: list[dict]) -> tuple[int, int, list[str]]:
+    """(zaměstnanci, hosté, požadované typy pokojů) z rooms_json žádosti."""
+    employees = sum(int(r.get("employees", 0)) for r in rooms)
+    guests = sum(int(r.get("guests", 0)) for r in rooms)
+    return employees, guests, [r.get("room_type") for r in rooms if r.get("room_type")]
+
+def _request_stay(arr: Optional[str], dep: Optional[str], per_room: bool) -> tuple[date, date]:
+    """
+    Společný termín žádosti (dd.mm.yyyy) pro přidělení pokojů. Chybějící nebo
+    neplatný termín hlásí jako ValueError s tím, co přesně chybí – jinak by
+    allocate_rooms hlásil jen „žádné volné pokoje“.
+    """
+    missing = [label for label, v in (("příjezd", arr), ("odjezd", dep)) if not (v or "").strip()]
+    if missing:
+        hint = " (žádost po pokojích má termíny jen u jednotlivých pokojů)" if per_room else ""
+        raise ValueError(f"Žádost nemá vyplněný {' ani '.join(missing)}{hint} – pokoje nelze přidělit.")
+    a_date, d_date = _parse_cz_date(arr), _parse_cz_date(dep)
+    if not a_date or not d_date or a_date >= d_date:
+        raise ValueError(f"Žádost má neplatný termín {arr} – {dep} – pokoje nelze přidělit.")
+    return a_date, d_date
+
+
 import json
 
-def create_reservation_from_request(req_id: str) -> str:
+def create_reservation_from_request(req_id: str, allocate: Optional[str] = None) -> str:
     """
     Vezme žádost z `requests` (vč. rooms_json, per_room) a vytvoří plnohodnotnou
     rezervaci v `reservations` + `reservation_rooms`. Vrací booking_id.
+    S `allocate` ("rooms"/"price") se pokoje nepřebírají ze žádosti, ale přidělí
+    je allocate_rooms pro celou skupinu na termín žádosti (typy ze žádosti
+    jsou jen preferované).
     """
     with get_conn() as con:
         row = con.execute("""
@@ -1460,6 +2465,8 @@ def create_reservation_from_request(req_id: str) -> str:
      note, status, per_room_flag, rooms_json) = row
 
     per_room = int(per_room_flag) == 1
+    if allocate:
+        a_date, d_date = _request_stay(arr, dep, per_room)
     if not rooms_json:
         raise ValueError("V žádosti chybí rooms_json (detail pokojů).")
 
@@ -1468,6 +2475,16 @@ def create_reservation_from_request(req_id: str) -> str:
     except Exception as e:
         raise ValueError(f"Neplatný JSON v žádosti: {e}")
 
+    if allocate:
+        employees, guests, preferred = _request_party(rooms)
+        plan = allocate_rooms(employees, guests, a_date, d_date, preferred=preferred, objective=allocate)
+        if plan is None:
+            raise ValueError("Pro žádost nejsou v termínu volné pokoje s dostatečnou kapacitou.")
+        n = (d_date - a_date).days
+        per_room = False
+        rooms = [dict(r, arrival=arr, departure=dep, nights=n) for r in plan["rooms"]]
+        nights = n
+
     # Header rezervace
     booking_id = new_booking_id()
     header = {
@@ -1509,85 +2526,617 @@ def create_reservation_from_request(req_id: str) -> str:
 
     return booking_id
 
-import pandas as pd
-from datetime import date
 
-def shade_weekend_columns(df, year: int, month: int, room_col: str = "Pokoj", color: str = "#f3f4f6"):
+# --- STATISTIKY: obsazenost a tržby po měsících a pokojích ---
+STATS_COLUMNS = ["Mesic", "Pokoj", "Dni", "ObsazeneNoci", "Obsazenost",
+                 "NociZamestnanci", "NociHoste", "Trzby"]
+
+def _month_edges(start: date, end: date) -> list[date]:
+    """Hranice měsíců okna [start, end): start, 1. dny dalších měsíců, end."""
+    edges = [start]
+    nxt = _month_bounds(start.year, start.month)[1]
+    while nxt < end:
+        edges.append(nxt)
+        nxt = _month_bounds(nxt.year, nxt.month)[1]
+    return edges + [end]
+
+def _load_room_stays(start: date, end: date) -> pd.DataFrame:
+    """Řádky reservation_rooms, které zasahují do [start, end)."""
+    with get_conn() as con:
+        return pd.read_sql_query("""
+            SELECT room_type, employees, guests, price, arrival_iso, departure_iso
+            FROM reservation_rooms
+            WHERE room_type IS NOT NULL AND room_type <> ''
+              AND arrival_iso < ? AND departure_iso > ?
+        """, con, params=(end.isoformat(), start.isoformat()))
+
+def compute_site_statistics(start: date, end: date) -> pd.DataFrame:
     """
-    Obarví sloupce (SO/NE) v měsíční mřížce: první sloupec je názvy pokojů,
-    ostatní jsou dny 1..31. Vrací pandas Styler.
+    Ukazatele za okno [start, end) po měsících a pokojích (sloupce STATS_COLUMNS):
+    dny v okně, obsazené noci pokoje, obsazenost (podíl), noci zaměstnanců
+    a hostů (osobonoci) a tržby. Cena pobytu se rozpočítá rovnoměrně na jeho noci.
+
+    Jeden průchod přes pobyty: každý přičte své denní hodnoty na den příjezdu
+    a odečte je v den odjezdu (rozdílové pole ukazatel × pokoj × den), kumulativní
+    součet dá hodnoty po dnech a np.add.reduceat je sečte po měsících – pobyt
+    přes hranici měsíce se tak rozdělí sám. Noc je obsazená, když ji kryje
+    aspoň jeden pobyt.
     """
-    # připrav mapování day->is_weekend
-    cal = _cal.Calendar(firstweekday=0)  # 0=pondělí vlevo
-    weekend_days = set()
-    for d in cal.itermonthdates(year, month):
-        if d.month == month and d.weekday() >= 5:  # 5=SO, 6=NE
-            weekend_days.add(d.day)
+    room_types = get_cfg()["POKOJ"].tolist()
+    if not room_types or start >= end:
+        return pd.DataFrame(columns=STATS_COLUMNS)
+    edges = _month_edges(start, end)
+    n_days = (end - start).days
+    offsets = np.array([(e - start).days for e in edges[:-1]])
+    days = np.diff([(e - start).days for e in edges])
+
+    stays = _load_room_stays(start, end)
+    ri = stays["room_type"].map({rt: i for i, rt in enumerate(room_types)})
+    ok = ri.notna().to_numpy()  # pokoje, které už v configu nejsou, se nepočítají
+    ri = ri.to_numpy()[ok].astype(np.int64)
+    base = np.datetime64(start, "D")
+    a = (stays["arrival_iso"].to_numpy(dtype="datetime64[D]") - base).astype(np.int64)[ok]
+    d = (stays["departure_iso"].to_numpy(dtype="datetime64[D]") - base).astype(np.int64)[ok]
+    per_night = np.stack([
+        np.ones(len(ri)),  # počet pobytů -> obsazenost
+        stays["employees"].fillna(0).to_numpy(dtype=float)[ok],
+        stays["guests"].fillna(0).to_numpy(dtype=float)[ok],
+        stays["price"].fillna(0).to_numpy(dtype=float)[ok] / np.maximum(d - a, 1),
+    ])  # (ukazatel, pobyt)
+
+    diff = np.zeros((4, len(room_types), n_days + 1))
+    np.add.at(diff, (slice(None), ri, np.clip(a, 0, n_days)), per_night)
+    np.add.at(diff, (slice(None), ri, np.clip(d, 0, n_days)), -per_night)
+    daily = np.cumsum(diff[:, :, :-1], axis=2)
+    daily[0] = daily[0] > 0.5  # obsazená noc (součty pobytů jsou celá čísla)
+    occupied, emp, gst, revenue = np.add.reduceat(daily, offsets, axis=2)
+
+    n_rooms, n_months = len(room_types), len(days)
+    return pd.DataFrame({
+        "Mesic": np.tile([f"{e.year}-{e.month:02d}" for e in edges[:-1]], n_rooms),
+        "Pokoj": np.repeat(room_types, n_months),
+        "Dni": np.tile(days, n_rooms),
+        "ObsazeneNoci": np.rint(occupied).astype(np.int64).ravel(),
+        "Obsazenost": (occupied / days).ravel(),
+        "NociZamestnanci": np.rint(emp).astype(np.int64).ravel(),
+        "NociHoste": np.rint(gst).astype(np.int64).ravel(),
+        "Trzby": np.round(revenue, 2).ravel(),
+    }, columns=STATS_COLUMNS)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _site_statistics_cached(db_path: str, start: date, end: date, version: int, cfg_mtime: float) -> pd.DataFrame:
+    return compute_site_statistics(start, end)
+
+def site_statistics(start: date, end: date) -> pd.DataFrame:
+    """compute_site_statistics z cache; klíč nese data_version, takže zápis ji zneplatní."""
+    db_path, cfg_path = current_paths()
+    return _site_statistics_cached(db_path, start, end, data_version(), Path(cfg_path).stat().st_mtime)
+
+def statistics_ui():
+    st.header("Statistiky obsazenosti a tržeb")
+    today = date.today()
+    c1, c2 = st.columns(2)
+    d_from = c1.date_input("Od", value=date(today.year, 1, 1), format="DD.MM.YYYY", key="stats_from")
+    d_to = c2.date_input("Do (včetně)", value=date(today.year, 12, 31), format="DD.MM.YYYY", key="stats_to")
+    if d_from > d_to:
+        st.error("Datum „Od“ je po datu „Do“.")
+        return
 
-    # připrav stylovací mřížku (stejně velká jako df)
-    styles = pd.DataFrame("", index=df.index, columns=df.columns)
+    df = site_statistics(d_from, d_to + timedelta(days=1))
+    if df.empty:
+        st.info("Žádné pokoje v configu.")
+        return
 
-    # obarvi víkendové sloupce (ignoruj první sloupec s názvy pokojů)
-    for col in df.columns:
-        if col == room_col:
-            continue
-        # sloupce mohou být int i str → normalizace
-        try:
-            day_num = int(col)
-        except (ValueError, TypeError):
-            continue
-        if day_num in weekend_days:
-            styles[col] = f"background-color: {color}"
+    room_days = int(df["Dni"].sum())
+    sold = int(df["ObsazeneNoci"].sum())
+    m1, m2, m3, m4, m5 = st.columns(5)
+    m1.metric("Obsazenost", f"{sold / room_days:.1%}" if room_days else "–")
+    m2.metric("Prodané pokojonoci", f"{sold}")
+    m3.metric("Noci zaměstnanců", f"{int(df['NociZamestnanci'].sum())}")
+    m4.metric("Noci hostů", f"{int(df['NociHoste'].sum())}")
+    m5.metric("Tržby", f"{df['Trzby'].sum():,.0f} Kč".replace(",", " "))
+
+    by_month = df.groupby("Mesic").agg(Dni=("Dni", "sum"), ObsazeneNoci=("ObsazeneNoci", "sum"),
+                                       NociZamestnanci=("NociZamestnanci", "sum"),
+                                       NociHoste=("NociHoste", "sum"), Trzby=("Trzby", "sum"))
+    st.subheader("Obsazenost po měsících (%)")
+    st.bar_chart((by_month["ObsazeneNoci"] / by_month["Dni"] * 100).rename("Obsazenost %"))
+    st.subheader("Noci zaměstnanců a hostů")
+    st.bar_chart(by_month[["NociZamestnanci", "NociHoste"]])
+    st.subheader("Tržby po měsících (Kč)")
+    st.bar_chart(by_month["Trzby"])
+
+    st.subheader("Po pokojích")
+    by_room = df.groupby("Pokoj", sort=False).agg(
+        ObsazeneNoci=("ObsazeneNoci", "sum"), Dni=("Dni", "sum"),
+        NociZamestnanci=("NociZamestnanci", "sum"), NociHoste=("NociHoste", "sum"), Trzby=("Trzby", "sum"))
+    by_room.insert(1, "Obsazenost", (by_room["ObsazeneNoci"] / by_room["Dni"] * 100).round(1))
+    st.bar_chart(by_room["Trzby"])
+    st.dataframe(
+        by_room.drop(columns="Dni"),
+        use_container_width=True,
+        column_config={"Obsazenost": st.column_config.NumberColumn("Obsazenost %", format="%.1f"),
+                       "Trzby": st.column_config.NumberColumn(format="%d")},
+    )
 
-    return df.style.apply(lambda _: styles, axis=None)
+    with st.expander("Měsíce × pokoje (data)"):
+        st.dataframe(df, use_container_width=True, hide_index=True)
+        st.download_button(
+            "Stáhnout CSV",
+            data=df.to_csv(index=False).encode("utf-8"),
+            file_name=f"statistiky_{d_from:%Y%m%d}_{d_to:%Y%m%d}.csv",
+            mime="text/csv",
+        )
 
-# --- KALENDÁŘ: pomocné funkce (bez kapacity, boolean obsazenosti) ---
-import calendar
-from datetime import datetime as dt, timedelta
-
-def _parse_cz_date(s: str) -> Optional[date]:
-    if not s:
-        return None
+# --- ICS: kalendářové feedy obsazenosti (telefony správců) ---
+import os
+import unicodedata
+from contextlib import ExitStack
+from typing import Iterator
+
+ICS_DIR = BASE_DIR / "ics"      # ics/<lokalita>/vse.ics + ics/<lokalita>/<pokoj>.ics
+ICS_FEED_PAST_DAYS = 60         # feedy na disku: pobyty od (dnes − N dní), starší telefon nepotřebuje
+ICS_PRODID = "-//Rezervace chat Hejnice a Dobrejov//CS"
+
+def _slug(text: str) -> str:
+    """ASCII název souboru: 'Pokoj č.1' -> 'pokoj_c_1'."""
+    ascii_ = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", ascii_.lower()).strip("_") or "x"
+
+def _ics_escape(text: str) -> str:
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def _ics_line(line: str) -> str:
+    """Řádek s CRLF, zalomený po 75 bajtech (RFC 5545, pokračování začíná mezerou)."""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line + "\r\n"
+    parts, cur, size = [], [], 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > (75 if not parts else 74):
+            parts.append("".join(cur))
+            cur, size = [], 0
+        cur.append(ch)
+        size += n
+    parts.append("".join(cur))
+    return "\r\n ".join(parts) + "\r\n"
+
+@st.cache_resource(show_spinner=False, ttl=60)
+def ics_feed_names_enabled() -> bool:
+    """Jména hostů ve feedech na disku jen se souhlasem (secrets ICS_FEED_NAMES = true)."""
     try:
-        return dt.strptime(s, "%d.%m.%Y").date()
+        return str(st.secrets.get("ICS_FEED_NAMES", "")).strip().lower() in ("1", "true", "ano")
     except Exception:
-        return None
+        return False  # bez secrets.toml
 
-def occupancy_by_day_boolean() -> pd.DataFrame:
+def iter_ics_events(con: sqlite3.Connection, site: str, start: Optional[date] = None,
+                    end: Optional[date] = None, room_type: Optional[str] = None,
+                    with_names: bool = False) -> Iterator[tuple[str, str]]:
     """
-    ['date','room_type','occupied'] kde occupied ∈ {0,1}.
-    Příjezd včetně, odjezd exkluzivně.
+    Události (pokoj, text VEVENT) pro řádky reservation_rooms zasahující do
+    [start, end) – generátor nad kurzorem, tabulka se nenačítá celá.
+    Bez `with_names` jen „obsazeno“ a počty osob; s nimi jméno rezervace
+    a účastníci pokoje.
     """
+    where, params = ["rr.room_type IS NOT NULL", "rr.room_type <> ''",
+                     "rr.arrival_iso IS NOT NULL", "rr.departure_iso IS NOT NULL"], []
+    if start:
+        where.append("rr.departure_iso > ?")
+        params.append(start.isoformat())
+    if end:
+        where.append("rr.arrival_iso < ?")
+        params.append(end.isoformat())
+    if room_type:
+        where.append("rr.room_type = ?")
+        params.append(room_type)
+    names_sql = ("r.guest_name, (SELECT group_concat(p.name, ', ') FROM participants p "
+                 "WHERE p.id = rr.id AND p.room_type = rr.room_type)") if with_names else "NULL, NULL"
+    cur = con.execute(f"""
+        SELECT rr.id, rr.room_idx, rr.room_type, rr.arrival_iso, rr.departure_iso,
+               rr.employees, rr.guests, {names_sql}
+        FROM reservation_rooms rr
+        JOIN reservations r ON r.id = rr.id
+        WHERE {" AND ".join(where)}
+        ORDER BY rr.arrival_iso, rr.id, rr.room_idx
+    """, params)
+
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    domain = f"{_slug(site)}.rezervace"
+    for bid, idx, rt, a_iso, d_iso, emp, gst, guest, people in cur:
+        summary = f"{rt} – {guest} ({bid})" if with_names and guest else f"{rt} – obsazeno"
+        desc = f"Zaměstnanci: {int(emp or 0)}, hosté: {int(gst or 0)}"
+        if with_names and people:
+            desc += f"\nÚčastníci: {people}"
+        yield rt, "".join((
+            "BEGIN:VEVENT\r\n",
+            _ics_line(f"UID:{_ics_escape(bid)}-{idx}@{domain}"),
+            f"DTSTAMP:{stamp}\r\n",
+            f"DTSTART;VALUE=DATE:{a_iso.replace('-', '')}\r\n",
+            f"DTEND;VALUE=DATE:{d_iso.replace('-', '')}\r\n",
+            _ics_line(f"SUMMARY:{_ics_escape(summary)}"),
+            _ics_line(f"DESCRIPTION:{_ics_escape(desc)}"),
+            "TRANSP:OPAQUE\r\nEND:VEVENT\r\n",
+        ))
+
+def _ics_header(name: str) -> str:
+    return "".join((
+        "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n",
+        f"PRODID:{ICS_PRODID}\r\nCALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n",
+        _ics_line(f"X-WR-CALNAME:{_ics_escape(name)}"),
+        "X-WR-TIMEZONE:Europe/Prague\r\n",
+    ))
+
+ICS_FOOTER = "END:VCALENDAR\r\n"
+
+def iter_ics(start: Optional[date] = None, end: Optional[date] = None,
+             room_type: Optional[str] = None, with_names: bool = False) -> Iterator[str]:
+    """Celý kalendář aktuální lokality po kusech (hlavička, události, patička)."""
+    site = st.session_state.get("site") or ""
     with get_conn() as con:
-        rows = pd.read_sql_query("""
-            SELECT room_type, arrival, departure
-            FROM reservation_rooms
-            WHERE room_type IS NOT NULL AND room_type <> ''
-        """, con)
+        yield _ics_header(f"{site} – {room_type}" if room_type else f"{site} – obsazenost")
+        for _, event in iter_ics_events(con, site, start, end, room_type, with_names):
+            yield event
+    yield ICS_FOOTER
 
-    if rows.empty:
-        return pd.DataFrame(columns=["date", "room_type", "occupied"])
+ICS_SITE_FEED = "vse"   # soubor feedu celé lokality (vse.ics)
 
-    recs = []
-    for _, r in rows.iterrows():
-        rt = str(r["room_type"])
-        a = _parse_cz_date(str(r["arrival"]))
-        d = _parse_cz_date(str(r["departure"]))
-        if not a or not d:
-            continue
-        curr = a
-        while curr < d:  # odjezd exkluzivně
-            recs.append({"date": curr, "room_type": rt, "occupied": 1})
-            curr = curr + timedelta(days=1)
+def ics_feed_paths(site: str, room_types: list[str]) -> dict[Optional[str], Path]:
+    """
+    {None -> feed lokality, pokoj -> feed pokoje}. Pokoj, jehož název by dal
+    stejný soubor jako feed lokality nebo jiný pokoj, dostane příponu _2, _3…
+    """
+    folder = ICS_DIR / _slug(site)
+    paths, used = {None: folder / f"{ICS_SITE_FEED}.ics"}, {ICS_SITE_FEED}
+    for rt in room_types:
+        base = name = _slug(rt)
+        n = 2
+        while name in used:
+            name, n = f"{base}_{n}", n + 1
+        used.add(name)
+        paths[rt] = folder / f"{name}.ics"
+    return paths
+
+def _tmp_path(path: Path) -> Path:
+    """Dočasný soubor vedle `path`, vlastní procesu a vláknu – souběžní zapisovatelé si ho nepřejmenují."""
+    return path.with_suffix(f"{path.suffix}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+def write_ics_feeds(site: str, db_path: str, cfg_path: str, with_names: bool = False) -> dict:
+    """
+    Přepíše feedy lokality (celá lokalita + každý pokoj) jedním průchodem
+    událostí: každá jde do feedu lokality a do feedu svého pokoje. Soubory se
+    píší vedle (_tmp_path) a pak atomicky nahradí, telefon tak nikdy nestáhne půlku.
+    Nezávisí na session (běží i z vlákna FeedRefresher). Vrací {soubor: událostí}.
+    """
+    room_types = load_config_for_path(cfg_path, Path(cfg_path).stat().st_mtime)["POKOJ"].tolist()
+    paths = ics_feed_paths(site, room_types)
+    next(iter(paths.values())).parent.mkdir(parents=True, exist_ok=True)
+    counts = {p: 0 for p in paths.values()}
+    start = date.today() - timedelta(days=ICS_FEED_PAST_DAYS)
+    tmp = {rt: _tmp_path(path) for rt, path in paths.items()}
+    try:
+        with ExitStack() as stack:
+            out = {}
+            for rt, path in tmp.items():
+                f = stack.enter_context(open(path, "w", encoding="utf-8", newline=""))
+                f.write(_ics_header(f"{site} – {rt}" if rt else f"{site} – obsazenost"))
+                out[rt] = f
+            with _conn_pool(db_path).connection() as con:
+                for rt, event in iter_ics_events(con, site, start, None, None, with_names):
+                    out[None].write(event)
+                    counts[paths[None]] += 1
+                    if rt in out:  # pokoje, které už v configu nejsou, jen ve feedu lokality
+                        out[rt].write(event)
+                        counts[paths[rt]] += 1
+            for f in out.values():
+                f.write(ICS_FOOTER)
+        for rt, path in paths.items():
+            os.replace(tmp[rt], path)
+    finally:
+        for path in tmp.values():
+            path.unlink(missing_ok=True)
+    return {str(p): n for p, n in counts.items()}
+
+class FeedRefresher:
+    """
+    Přegeneruje soubory odvozené z rezervací (ICS feedy, veřejné snapshoty
+    kalendáře) na pozadí po zápisu,
+    aby uložení rezervace na ně nečekalo. Zápisy těsně po sobě se slijí: pro
+    lokalitu běží nejvýš jedno vlákno, před každým během počká `delay` sekund
+    (dávka zápisů = jedno přegenerování) a zopakuje práci, jen když mezitím
+    přišel další zápis. Poslední chybu si pamatuje pro zobrazení v UI.
+    """
+
+    def __init__(self, job, merge=None, delay: float = 0.0):
+        self._job = job
+        self._merge = merge   # merge(čekající args, nové args) -> args; bez něj platí nové
+        self._delay = delay
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending: dict[str, tuple] = {}
+        self._running: set[str] = set()
+        self.runs = 0
+        self.last_error: Optional[str] = None
+
+    def schedule(self, site: str, *args) -> None:
+        with self._lock:
+            if site in self._pending and self._merge:
+                args = self._merge(self._pending[site], args)
+            self._pending[site] = args
+            if site in self._running:
+                return
+            self._running.add(site)
+        threading.Thread(target=self._run, args=(site,), daemon=True, name=f"feeds-{_slug(site)}").start()
+
+    def _run(self, site: str) -> None:
+        while True:
+            if self._delay:
+                time.sleep(self._delay)
+            with self._lock:
+                if site not in self._pending:
+                    self._running.discard(site)
+                    self._idle.notify_all()
+                    return
+                args = self._pending.pop(site)
+            try:
+                self._job(site, *args)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{site}: {e}"
+            self.runs += 1
 
-    if not recs:
-        return pd.DataFrame(columns=["date", "room_type", "occupied"])
+    def wait(self, timeout: float = 10.0) -> bool:
+        """Počká, až doběhnou všechna přegenerování (benchmark, testy)."""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._running, timeout)
 
-    df = pd.DataFrame(recs)
-    # aspoň jedna rezervace daného typu a dne => obsazeno (1)
-    df = df.groupby(["date", "room_type"], as_index=False)["occupied"].max()
-    return df
+def refresh_site_files(site: str, db_path: str, cfg_path: str, with_names: bool = False,
+                       ics: bool = True, months: Optional[frozenset] = None) -> None:
+    """
+    Soubory odvozené z rezervací lokality: ICS feedy (ics=True) a snapshoty
+    měsíců `months` (None = všechny, prázdná množina = žádné). Chyba jednoho
+    nezastaví ostatní.
+    """
+    jobs = []
+    if ics:
+        jobs.append((write_ics_feeds, (with_names,)))
+    if months is None or months:
+        jobs.append((write_public_snapshots, (months,)))
+    errors = []
+    for job, args in jobs:
+        try:
+            job(site, db_path, cfg_path, *args)
+        except Exception as e:
+            errors.append(f"{job.__name__}: {e}")
+    if errors:
+        raise RuntimeError("; ".join(errors))
+
+FEED_REFRESH_DELAY_S = 0.5   # zápisy během této prodlevy přegeneruje jeden běh
+
+def _merge_refresh(pending: tuple, new: tuple) -> tuple:
+    """Dva čekající refresh_site_files lokality slije do jednoho (feedy nebo, měsíce sjednotit)."""
+    *paths, ics_a, months_a = pending
+    *paths, ics_b, months_b = new
+    months = None if months_a is None or months_b is None else months_a | months_b
+    return (*paths, ics_a or ics_b, months)
+
+@st.cache_resource(show_spinner=False)
+def _feed_refresher() -> FeedRefresher:
+    return FeedRefresher(refresh_site_files, _merge_refresh, FEED_REFRESH_DELAY_S)
+
+def schedule_feed_refresh(ics: bool = True, months: Optional[frozenset] = None) -> None:
+    """
+    Feedy a snapshoty aktuální lokality se přegenerují na pozadí; bez argumentů
+    všechno, po zápisu jen to, čeho se změna týká (viz _take_booking_changes).
+    """
+    site = st.session_state.get("site")
+    if site in SITES:
+        _feed_refresher().schedule(site, SITES[site]["db"], SITES[site]["config"], ics_feed_names_enabled(),
+                                   ics, months)
+
+def ics_export_ui():
+    st.header("Export do kalendáře (ICS)")
+    room_types = get_cfg()["POKOJ"].tolist()
+    today = date.today()
+    c1, c2, c3 = st.columns([2, 1, 1])
+    room = c1.selectbox("Pokoj", ["Všechny pokoje"] + room_types, key="ics_room")
+    d_from = c2.date_input("Od", value=today, format="DD.MM.YYYY", key="ics_from")
+    d_to = c3.date_input("Do (včetně)", value=date(today.year + 1, 12, 31), format="DD.MM.YYYY", key="ics_to")
+    with_names = st.checkbox("Se jmény hostů a účastníků", value=False, key="ics_names")
+    if d_from > d_to:
+        st.error("Datum „Od“ je po datu „Do“.")
+        return
+    rt = None if room == "Všechny pokoje" else room
+    data = "".join(iter_ics(d_from, d_to + timedelta(days=1), rt, with_names)).encode("utf-8")
+    site = st.session_state.get("site", "")
+    st.download_button(
+        "Stáhnout .ics",
+        data=data,
+        file_name=f"obsazenost_{_slug(site)}{'_' + _slug(rt) if rt else ''}_{d_from:%Y%m%d}.ics",
+        mime="text/calendar",
+    )
+
+    st.markdown("---")
+    st.subheader("Feedy na disku")
+    st.caption(f"Přegenerují se po každé změně rezervací (pobyty od dnes − {ICS_FEED_PAST_DAYS} dní); "
+               f"jména {'ano' if ics_feed_names_enabled() else 'ne'} (secrets ICS_FEED_NAMES).")
+    paths = ics_feed_paths(site, room_types)
+    st.dataframe(pd.DataFrame([{
+        "Feed": rt or "Celá lokalita",
+        "Soubor": str(p),
+        "Aktualizováno": _dt.fromtimestamp(p.stat().st_mtime).strftime("%d.%m.%Y %H:%M:%S") if p.exists() else "–",
+    } for rt, p in paths.items()]), use_container_width=True, hide_index=True)
+    refresher = _feed_refresher()
+    if refresher.last_error:
+        st.error(f"Poslední přegenerování selhalo: {refresher.last_error}")
+    if st.button("Přegenerovat teď", key="ics_regen"):
+        schedule_feed_refresh()
+        refresher.wait()
+        st.success("Feedy přegenerovány.")
+
+# --- VEŘEJNÉ SNAPSHOTY kalendáře: statické HTML/JSON, veřejné stránky bez DB ---
+SNAPSHOT_DIR = BASE_DIR / "snapshots"   # snapshots/<lokalita>/YYYY-MM.html|json + manifest.json
+SNAPSHOT_MONTHS_AHEAD = 18              # od ledna letošního roku do (tento měsíc + N)
+
+def _snapshot_months(today: date) -> list[tuple[int, int]]:
+    """(rok, měsíc) snapshotů: leden letošního roku … tento měsíc + SNAPSHOT_MONTHS_AHEAD."""
+    last = today.year * 12 + today.month - 1 + SNAPSHOT_MONTHS_AHEAD
+    return [(i // 12, i % 12 + 1) for i in range(today.year * 12, last + 1)]
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = _tmp_path(path)
+    try:
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+@st.cache_resource(show_spinner=False)
+def _snapshot_lock(site: str) -> threading.Lock:
+    """Zámek přestavby snapshotů lokality (vlákno FeedRefresher i sessions)."""
+    return threading.Lock()
+
+def write_public_snapshots(site: str, db_path: str, cfg_path: str,
+                           months: Optional[frozenset] = None) -> dict:
+    """
+    Veřejné měsíční mřížky lokality (bez jmen) jako statické soubory: HTML
+    fragment pro stránku a JSON (pokoje, kapacity, zatížení po dnech) pro jiné
+    klienty. Celé období je jeden dotaz do room_nights, měsíce jsou řezy matice.
+    Manifest se zapisuje až po měsících, staré měsíce se mažou až po něm.
+    months = {(rok, měsíc)} přepíše jen tyto měsíce, pokud jinak snapshoty
+    platí (stejný rozsah i config); None = všechny.
+    Nezávisí na session (běží z vlákna FeedRefresher); přestavby jedné lokality
+    se řadí za sebe. Vrací manifest.
+    """
+    with _snapshot_lock(site):
+        return _write_public_snapshots(site, db_path, cfg_path, months)
+
+def _write_public_snapshots(site: str, db_path: str, cfg_path: str, only: Optional[frozenset] = None) -> dict:
+    cfg_mtime = Path(cfg_path).stat().st_mtime
+    cfg = load_config_for_path(cfg_path, cfg_mtime)
+    room_types = cfg["POKOJ"].tolist()
+    months = _snapshot_months(date.today())
+    names = [f"{y}-{m:02d}" for y, m in months]
+    folder = SNAPSHOT_DIR / _slug(site)
+    folder.mkdir(parents=True, exist_ok=True)
+    if only is not None:
+        try:
+            old = json.loads((folder / "manifest.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            old = None
+        if old and old["months"] == names and old["config_mtime"] == cfg_mtime:
+            months = [ym for ym in months if ym in only]
+            if not months:
+                return old
+    first, nxt = date(*months[0], 1), _month_bounds(*months[-1])[1]
+
+    with _conn_pool(db_path).connection() as con:
+        load, cap = occupancy_load(first, nxt, room_types, con=con, cfg=cfg)
+    for y, m in months:
+        frame = _occupancy_frame(load[:, _month_slice(first, y, m)], room_types)
+        name = f"{y}-{m:02d}"
+        _write_atomic(folder / f"{name}.html", availability_grid_html(y, m, frame, {}, cfg) if room_types else "")
+        _write_atomic(folder / f"{name}.json", json.dumps({
+            "year": y, "month": m, "rooms": room_types, "capacity": cap.tolist(),
+            "load": frame.to_numpy().tolist(),
+        }, ensure_ascii=False))
+    manifest = {"site": site, "generated_at": _dt.now().isoformat(timespec="seconds"),
+                "config_mtime": cfg_mtime, "months": names}
+    _write_atomic(folder / "manifest.json", json.dumps(manifest, ensure_ascii=False))
+    for old in folder.glob("????-??.*"):  # měsíce, které vypadly z rozsahu
+        if old.stem not in manifest["months"]:
+            old.unlink(missing_ok=True)
+    return manifest
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _read_snapshot(path: str, file_mtime: float) -> str:
+    return Path(path).read_text(encoding="utf-8")
+
+def public_snapshot_manifest() -> dict:
+    """
+    Manifest snapshotů aktuální lokality. Chybí-li, je z minulého měsíce nebo
+    ze starého configu, snapshoty se postaví hned (jediný případ, kdy veřejná
+    stránka sáhne do DB); jinak je obnovuje zápis rezervace. Když přestavba
+    selže, platí dosavadní manifest, a není-li žádný, stránka kreslí mřížky
+    živě z DB (manifest s "live": True).
+    """
+    site = st.session_state.get("site")
+    if site not in SITES:
+        raise RuntimeError("Lokalita není zvolena.")
+    db_path, cfg_path = SITES[site]["db"], SITES[site]["config"]
+    path = SNAPSHOT_DIR / _slug(site) / "manifest.json"
+    expected = [f"{y}-{m:02d}" for y, m in _snapshot_months(date.today())]
+    manifest = None
+    try:
+        manifest = json.loads(_read_snapshot(str(path), path.stat().st_mtime))
+    except (OSError, ValueError):
+        pass
+    if manifest and manifest["months"] == expected and manifest["config_mtime"] == Path(cfg_path).stat().st_mtime:
+        return manifest
+    try:
+        return write_public_snapshots(site, db_path, cfg_path)
+    except (OSError, sqlite3.Error):
+        return manifest or {"site": site, "months": expected, "live": True}
+
+def public_snapshot_html(year: int, month: int) -> Optional[str]:
+    """HTML mřížky měsíce ze snapshotu (nelze-li ho číst, živě z DB); None mimo rozsah snapshotů."""
+    name = f"{int(year)}-{int(month):02d}"
+    manifest = public_snapshot_manifest()
+    if name not in manifest["months"]:
+        return None
+    path = SNAPSHOT_DIR / _slug(st.session_state["site"]) / f"{name}.html"
+    if not manifest.get("live"):
+        try:
+            return _read_snapshot(str(path), path.stat().st_mtime)
+        except OSError:
+            pass  # smazán souběžnou přestavbou nebo nečitelný
+    return availability_grid_fragment(int(year), int(month), show_names=False)
+
+def render_public_month(year: int, month: int, with_style: bool = True) -> None:
+    """
+    Měsíční mřížka pro veřejnost ze snapshotu (bez DB); měsíc mimo rozsah
+    snapshotů se vykreslí živě z DB jako dřív (render_availability_grid).
+    """
+    html = public_snapshot_html(year, month)
+    if html is None:
+        render_availability_grid(year, month, show_names=False, with_style=with_style)
+    elif not html:
+        st.warning("Žádné pokoje v configu nebo prázdná data.")
+    else:
+        st.markdown((AVAILABILITY_GRID_CSS if with_style else "") + html, unsafe_allow_html=True)
+
+import pandas as pd
+from datetime import date
+
+def shade_weekend_columns(df, year: int, month: int, room_col: str = "Pokoj", color: str = "#f3f4f6"):
+    """
+    Obarví sloupce (SO/NE) v měsíční mřížce: první sloupec je názvy pokojů,
+    ostatní jsou dny 1..31. Vrací pandas Styler.
+    """
+    # připrav mapování day->is_weekend
+    cal = _cal.Calendar(firstweekday=0)  # 0=pondělí vlevo
+    weekend_days = set()
+    for d in cal.itermonthdates(year, month):
+        if d.month == month and d.weekday() >= 5:  # 5=SO, 6=NE
+            weekend_days.add(d.day)
 
+    # připrav stylovací mřížku (stejně velká jako df)
+    styles = pd.DataFrame("", index=df.index, columns=df.columns)
+
+    # obarvi víkendové sloupce (ignoruj první sloupec s názvy pokojů)
+    for col in df.columns:
+        if col == room_col:
+            continue
+        # sloupce mohou být int i str → normalizace
+        try:
+            day_num = int(col)
+        except (ValueError, TypeError):
+            continue
+        if day_num in weekend_days:
+            styles[col] = f"background-color: {color}"
+
+    return df.style.apply(lambda _: styles, axis=None)
 
 from datetime import date
 from typing import Optional
@@ -1612,7 +3161,11 @@ def calendar_matrix_ui():
     st.dataframe(styled, use_container_width=True)
 
 
-def booking_form(edit_id: Optional[str] = None):
+def _apply_pending_order(edit_id: Optional[str] = None) -> None:
+    """
+    Předvyplní formulář z `pending_order` (žádost, nalezený volný termín)
+    do klíčů session_state, které čte rooms_form. Jednorázově.
+    """
     # >>> PŘEDVYPLNĚNÍ Z VEŘEJNÉ ŽÁDOSTI (rooms_json -> stejné UI) <<<
     pending = st.session_state.get("pending_order")
     if pending and not edit_id:
@@ -1651,6 +3204,8 @@ def booking_form(edit_id: Optional[str] = None):
         # jednorázové použití
         st.session_state["pending_order"] = None
 
+def booking_form(edit_id: Optional[str] = None):
+    _apply_pending_order(edit_id)
 
     cfg = get_cfg()
     st.header("Rezervace")
@@ -1871,62 +3426,229 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.utils import ImageReader
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as PLImage
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
 from pathlib import Path
 from reportlab.lib.units import mm
 
-def _zoo_logo_flowable(max_width_mm: float = 36):
+# --- REGISTR PDF ZDROJŮ: fonty, styly a logo jednou za proces ---
+from reportlab.platypus import Flowable
+
+VOUCHER_LOGO = BASE_DIR / "static" / "zoo_logo.png"   # nezávisle na pracovním adresáři
+VOUCHER_LOGO_WIDTH_MM = 36
+VOUCHER_LOGO_DPI = 300            # logo se jednou zmenší na tohle rozlišení při tisku
+
+class _LogoFlowable(Flowable):
+    """Logo z už dekódovaného a zmenšeného ImageReaderu – kreslí se bez čtení souboru."""
+
+    def __init__(self, reader: ImageReader, width: float, height: float):
+        super().__init__()
+        self.reader, self.width, self.height = reader, width, height
+        self.hAlign = "RIGHT"
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask="auto")
+
+class PdfResources:
     """
-    Vrátí flowable s logem ZOO Praha zarovnaným doprava (nebo None, když není k dispozici).
-    Očekává soubor ./static/zoo_logo.png
+    Neměnné zdroje poukazů: zaregistrované TTF, hotový stylesheet (DejaVu,
+    styl Small) a dekódované logo zmenšené na tiskovou velikost. Styly i
+    logo se při sestavení PDF jen čtou, takže je sdílí všechny poukazy.
     """
-    try:
-        p = Path("static/zoo_logo.png")
-        if not p.exists() or p.stat().st_size == 0:
+
+    def __init__(self, logo_path: Optional[Path] = None, logo_width_mm: float = VOUCHER_LOGO_WIDTH_MM):
+        ensure_czech_fonts()
+        logo_path = VOUCHER_LOGO if logo_path is None else logo_path
+        self.base_font = "DejaVuSans"
+        self.bold_font = "DejaVuSans-Bold"
+        styles = getSampleStyleSheet()
+        styles["Normal"].fontName = self.base_font
+        styles["Title"].fontName = self.bold_font
+        styles["Heading3"].fontName = self.bold_font
+        styles.add(ParagraphStyle(name="Small", parent=styles["Normal"], fontName=self.base_font, fontSize=9))
+        self.styles = styles
+
+        self.logo: Optional[ImageReader] = None
+        self.logo_size = (0.0, 0.0)
+        self.logo_sig = None   # (velikost, mtime) načteného souboru – součást klíče cache poukazů
+        try:
+            if logo_path.exists() and logo_path.stat().st_size:
+                from PIL import Image as _PILImage
+                stat = logo_path.stat()
+                with _PILImage.open(logo_path) as im:
+                    im.load()
+                    iw, ih = im.size
+                    # zachovej poměr stran; větší obrázek se zmenší jen jednou tady
+                    target = max(1, round(logo_width_mm / 25.4 * VOUCHER_LOGO_DPI))
+                    if iw > target:
+                        im = im.resize((target, max(1, round(ih * target / iw))), _PILImage.LANCZOS)
+                    self.logo = ImageReader(im.copy())
+                self.logo_size = (logo_width_mm * mm, logo_width_mm * mm * (ih / float(iw) if iw else 1.0))
+                self.logo_sig = [stat.st_size, stat.st_mtime]
+        except Exception:
+            self.logo = None
+
+    def logo_flowable(self) -> Optional[Flowable]:
+        """Nový flowable s logem (zarovnaný doprava) nebo None, když logo není."""
+        if self.logo is None:
             return None
-        # zachovej poměr stran
-        ir = ImageReader(str(p))
-        iw, ih = ir.getSize()
-        aspect = (ih / float(iw)) if iw else 1.0
-
-        img = PLImage(str(p))
-        img.drawWidth = max_width_mm * mm
-        img.drawHeight = (max_width_mm * mm) * aspect
-        img.hAlign = "RIGHT"
-        return img
-    except Exception:
+        return _LogoFlowable(self.logo, *self.logo_size)
+
+@st.cache_resource(show_spinner=False)
+def pdf_resources() -> PdfResources:
+    """Registr PDF zdrojů – jedna instance na proces (workery dávky si ji zahřejí při startu)."""
+    return PdfResources()
+
+# --- CACHE POUKAZŮ: PDF podle obsahu rezervace ---
+import hashlib
+from collections import Counter, OrderedDict
+
+VOUCHER_TEMPLATE_VERSION = 2      # zvýšit při změně vzhledu poukazu -> PDF v cache přestanou platit
+VOUCHER_CACHE_MAX_ITEMS = 64      # PDF v paměti procesu (LRU)
+VOUCHER_CACHE_DIR: Optional[Path] = None   # např. BASE_DIR / "pdf_cache" – PDF i na disk (přežijí restart)
+VOUCHER_CACHE_MAX_FILES = 2000    # na disku; starší se mažou
+
+class PdfCache:
+    """
+    Obsahově adresovaná cache PDF {klíč -> bytes}: LRU v paměti a volitelně
+    kopie v adresáři (soubor <klíč>.pdf). Klíč je hash vstupních dat poukazu,
+    takže úprava rezervace vede na jiný klíč a staré PDF se už nepoužije.
+    Chyba disku (plný, jen pro čtení, soubor smazaný jiným procesem) je jen
+    miss / nezapsaná kopie – poukaz se vždy vyrobí.
+    """
+
+    def __init__(self, max_items: int, disk_dir: Optional[Path] = None, max_files: int = 0):
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+        self.max_items = max_items
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_files = max_files
+        self.hits = self.disk_hits = self.misses = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.disk_dir:
+            path = self.disk_dir / f"{key}.pdf"
+            try:
+                data = path.read_bytes()
+                if data:
+                    os.utime(path)  # pro mazání nejstarších
+            except OSError:
+                data = None
+            if data:
+                self._remember(key, data)
+                with self._lock:
+                    self.disk_hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
         return None
 
-def create_voucher_pdf_bytes(booking_id: str) -> bytes:
-    # unicode fonty (beze změny)...
-    ensure_czech_fonts()
+    def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        if self.disk_dir:
+            tmp = self.disk_dir / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+                tmp.write_bytes(data)
+                os.replace(tmp, self.disk_dir / f"{key}.pdf")
+                self._prune_disk()
+            except OSError as e:
+                logging.getLogger(__name__).warning("PDF cache: kopie %s na disk se nezapsala: %s", key, e)
+                try:
+                    tmp.unlink(missing_ok=True)
+                except OSError:
+                    pass
+
+    def get_or_build(self, key: str, build) -> bytes:
+        data = self.get(key)
+        if data is None:
+            # staví se mimo zámek; souběžný miss postaví totéž PDF dvakrát, nic víc
+            data = build()
+            self.put(key, data)
+        return data
+
+    def _remember(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _prune_disk(self) -> None:
+        if not self.max_files:
+            return
+        files = []
+        for p in self.disk_dir.glob("*.pdf"):
+            try:
+                files.append((p.stat().st_mtime, p))
+            except OSError:   # mezitím smazal jiný proces
+                pass
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda f: f[0])
+        for _, p in files[:len(files) - self.max_files]:
+            p.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "items": len(self._items), "bytes": sum(len(v) for v in self._items.values())}
+
+@st.cache_resource(show_spinner=False)
+def _voucher_cache() -> PdfCache:
+    return PdfCache(VOUCHER_CACHE_MAX_ITEMS, VOUCHER_CACHE_DIR, VOUCHER_CACHE_MAX_FILES)
+
+def voucher_cache_key(kind: str, hdr: tuple, rows: list, renderer: str = "platypus") -> str:
+    """
+    SHA-256 ze všeho, co poukaz ovlivní: druh, renderer, verze šablony, logo
+    (velikost a mtime – to, které je v registru PDF zdrojů), hlavička
+    rezervace a řádky (pokoje / účastníci).
+    """
+    payload = json.dumps([kind, renderer, VOUCHER_TEMPLATE_VERSION, pdf_resources().logo_sig, list(hdr),
+                          [list(r) for r in rows]],
+                         ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
+def create_voucher_pdf_bytes(booking_id: str, renderer: Optional[str] = None) -> bytes:
+    """
+    Poukaz k rezervaci; stejný obsah rezervace = PDF z cache (viz voucher_cache_key).
+    renderer: "platypus" (SimpleDocTemplate) nebo "sablona" (předpočítané
+    pozadí + canvas, viz VoucherTemplate); None = VOUCHER_RENDERER.
+    """
     hdr, rooms = fetch_detail(booking_id)
     if not hdr:
         raise ValueError("ID nenalezeno.")
+    renderer = _voucher_renderer(renderer)
+    return _voucher_cache().get_or_build(voucher_cache_key("rezervace", hdr, rooms, renderer),
+                                         lambda: _render_voucher_job("rezervace", hdr, rooms, renderer))
+
+def _build_voucher_pdf(hdr: tuple, rooms: list) -> bytes:
+    # fonty, styly a logo z registru procesu (viz pdf_resources)
+    res = pdf_resources()
+
     _id, guest_name, garr, gdep, gnights, per_room = hdr
 
     buf = BytesIO()
     doc = SimpleDocTemplate(buf, pagesize=A4, leftMargin=18*mm, rightMargin=18*mm, topMargin=15*mm, bottomMargin=15*mm)
-    styles = getSampleStyleSheet()
-
-    # Fonty – počítáme s tím, že ensure_czech_fonts už proběhlo
-    base_font = "DejaVuSans"
-    bold_font = "DejaVuSans-Bold"
-
-
-    styles["Normal"].fontName = base_font
-    styles["Title"].fontName = bold_font
-    styles["Heading3"].fontName = bold_font
-    styles.add(ParagraphStyle(name="Small", parent=styles["Normal"], fontName=base_font, fontSize=9))
+    styles = res.styles
+    base_font = res.base_font
+    bold_font = res.bold_font
 
     story = []
 
     # === LOGO ZOO PRAHA (nahoře vpravo) ===
-    logo = _zoo_logo_flowable(36)
+    logo = res.logo_flowable()
     if logo:
         story.append(logo)
         story.append(Spacer(1, 6))
@@ -1939,15 +3661,11 @@ def create_voucher_pdf_bytes(booking_id: str) -> bytes:
 
     # === (ZDE byla sekce 'Režim datumů' a 'Příjezd/​Odjezd' — odstraněno) ===
 
-    data = [["#", "Pokoj", "Zam.", "Hosté", "Příjezd", "Odjezd", "Nocí", "Cena (Kč)"]]
-    total = 0.0
-    for idx, r in enumerate(rooms, start=1):
-        room_idx, room_type, employees, guests, arr, dep, nights, price = r
-        total += float(price or 0.0)
-        a, d, n = (arr or garr or ""), (dep or gdep or ""), (nights or gnights or 0)
-        data.append([idx, room_type or "", int(employees or 0), int(guests or 0), a, d, int(n), int(price or 0)])
+    _, columns = VOUCHER_LAYOUTS["rezervace"]
+    body, total = _voucher_table("rezervace", hdr, rooms)
+    data = [[c[0] for c in columns]] + body
 
-    tbl = Table(data, colWidths=[8*mm, 35*mm, 14*mm, 16*mm, 24*mm, 24*mm, 12*mm, 24*mm])
+    tbl = Table(data, colWidths=[c[1]*mm for c in columns])
     tbl.setStyle(TableStyle([
         ("FONTNAME", (0,0), (-1,-1), base_font),
         ("FONTSIZE", (0,0), (-1,-1), 9),
@@ -1971,6 +3689,254 @@ def create_voucher_pdf_bytes(booking_id: str) -> bytes:
     doc.build(story)
     return buf.getvalue()
 
+# --- ŠABLONOVÝ RENDERER POUKAZŮ: statické pozadí jako form XObject, text přes canvas ---
+from reportlab.pdfgen import canvas as _rl_canvas
+from typing import Callable
+
+VOUCHER_RENDERERS = ("platypus", "sablona")
+VOUCHER_RENDERER = "platypus"     # "sablona" = stejný vzhled, ~1,3× méně CPU; menší je jen sloučené PDF
+
+# druh poukazu -> (nadpis, sloupce tabulky: (záhlaví, šířka v mm, zarovnání dat))
+VOUCHER_LAYOUTS = {
+    "rezervace": ("POUKAZ / REZERVACE", [
+        ("#", 8, "CENTER"), ("Pokoj", 35, "LEFT"), ("Zam.", 14, "LEFT"), ("Hosté", 16, "LEFT"),
+        ("Příjezd", 24, "LEFT"), ("Odjezd", 24, "LEFT"), ("Nocí", 12, "RIGHT"), ("Cena (Kč)", 24, "RIGHT"),
+    ]),
+    "ucastnici": ("POUKAZ / ÚČASTNÍCI", [
+        ("#", 8, "CENTER"), ("Jméno", 55, "LEFT"), ("Zam.", 12, "LEFT"), ("Nocí", 14, "LEFT"),
+        ("Pokoj", 35, "LEFT"), ("Cena (Kč)", 25, "RIGHT"),
+    ]),
+}
+
+def _voucher_renderer(renderer: Optional[str]) -> str:
+    renderer = renderer or VOUCHER_RENDERER
+    if renderer not in VOUCHER_RENDERERS:
+        raise ValueError(f"Neznámý renderer poukazu: {renderer}")
+    return renderer
+
+def _voucher_table(kind: str, hdr: tuple, rows) -> tuple:
+    """Řádky tabulky poukazu (bez záhlaví) a celková cena – společné pro oba renderery."""
+    _id, guest_name, garr, gdep, gnights, per_room = hdr
+    body, total = [], 0.0
+    if kind == "ucastnici":
+        for r in rows.to_dict("records"):
+            body.append([
+                int(r["person_idx"]),
+                r["name"],
+                "Ano" if int(r["is_employee"]) == 1 else "Ne",
+                int(r["nights"]),
+                r.get("room_type") or "",
+                int(r["price"] or 0),
+            ])
+            total += float(r["price"] or 0.0)
+        return body, total
+    for idx, r in enumerate(rows, start=1):
+        room_idx, room_type, employees, guests, arr, dep, nights, price = r
+        total += float(price or 0.0)
+        a, d, n = (arr or garr or ""), (dep or gdep or ""), (nights or gnights or 0)
+        body.append([idx, room_type or "", int(employees or 0), int(guests or 0), a, d, int(n), int(price or 0)])
+    return body, total
+
+class VoucherTemplate:
+    """
+    Poukaz jednoho druhu rozmístěný stejně jako platypus verze (SimpleDocTemplate,
+    okraje 18/15 mm, styly z PdfResources), jen spočtený jednou za proces.
+    Logo, nadpis, popisky a záhlaví tabulky se do PDF kreslí jen jednou jako
+    form XObject; na stránku poukazu jde jen proměnný text a mřížka řádků.
+    Samostatný poukaz (jediný svého druhu v PDF) kreslí pozadí přímo – form
+    by byl jen režie navíc.
+    """
+
+    FRAME_PAD = 6     # vnitřní okraj rámce SimpleDocTemplate
+    CELL_PAD = 6      # levý/pravý padding buňky Table
+    FONT_SIZE = 9     # FONTSIZE tabulky; leading buňky zůstává 12
+    HEAD_H = 24       # záhlaví: leading 12 + padding 6/6
+    ROW_H = 18        # řádek: leading 12 + padding 3/3
+
+    def __init__(self, res: PdfResources, kind: str):
+        title, columns = VOUCHER_LAYOUTS[kind]
+        self.res = res
+        self.form = f"poukaz_{kind}"
+        self.base, self.bold = res.base_font, res.bold_font
+        self.normal, self.h3 = res.styles["Normal"], res.styles["Heading3"]
+        page_w, page_h = A4
+        # souřadnice tabulky na setiny bodu: kratší obsah stránky, rozdíl je pod rozlišením tisku
+        self.x0 = round(18 * mm + self.FRAME_PAD, 2)
+        width = page_w - 36 * mm - 2 * self.FRAME_PAD
+        self.top = round(page_h - 15 * mm - self.FRAME_PAD, 2)
+        self.bottom = 15 * mm + self.FRAME_PAD
+
+        # svisle stejné kroky jako story platypusu (baseline = spodek řádku + leading - fontSize)
+        y = self.top
+        self.logo_xy = None
+        if res.logo is not None:
+            lw, lh = res.logo_size
+            y -= lh
+            self.logo_xy = (self.x0 + width - lw, y)
+            y -= 6                                            # Spacer(1, 6)
+        ts = res.styles["Title"]
+        y -= ts.leading
+        self.title = (self.x0 + (width - pdfmetrics.stringWidth(title, self.bold, ts.fontSize)) / 2,
+                      y + ts.leading - ts.fontSize, ts.fontSize, title)
+        y -= ts.spaceAfter + 6                                # + Spacer(1, 6)
+        n = self.normal
+        self.fields = []   # (popisek, x popisku, x hodnoty, baseline) pro ID a jméno
+        for label in ("ID rezervace: ", "Jméno: "):
+            y -= n.leading
+            self.fields.append((label, self.x0, self.x0 + pdfmetrics.stringWidth(label, self.base, n.fontSize),
+                                y + n.leading - n.fontSize))
+        y -= 8                                                # Spacer(1, 8)
+        self.table_top = round(y, 2)
+
+        table_w = sum(c[1] * mm for c in columns)
+        self.edges = [round(self.x0 + (width - table_w) / 2, 2)]   # Table je v rámci centrovaná
+        for c in columns:
+            self.edges.append(round(self.edges[-1] + c[1] * mm, 2))
+        self.headers = [c[0] for c in columns]
+        # x textu buňky podle zarovnání (drawString / drawCentredString / drawRightString)
+        self.cells = []
+        for (l, r), (_, _, align) in zip(zip(self.edges, self.edges[1:]), columns):
+            if align == "CENTER":
+                self.cells.append(("C", (l + r) / 2))
+            elif align == "RIGHT":
+                self.cells.append(("R", r - self.CELL_PAD))
+            else:
+                self.cells.append(("L", l + self.CELL_PAD))
+
+    def _grid_style(self, c) -> None:
+        c.setStrokeColor(colors.grey)
+        c.setLineWidth(0.3)
+        c.setLineCap(1)
+        c.setLineJoin(1)
+
+    def _grid(self, c, top: float, bottom: float, top_line: bool = False) -> None:
+        left, right = self.edges[0], self.edges[-1]
+        segs = [(left, bottom, right, bottom)] + [(x, bottom, x, top) for x in self.edges]
+        if top_line:
+            segs.append((left, top, right, top))
+        c.lines(segs)
+
+    def _row_text(self, c):
+        text = c.beginText()
+        text.setFont(self.base, self.FONT_SIZE)
+        return text
+
+    def _flush_rows(self, c, text, top: float, bottom: float, top_line: bool) -> None:
+        """Texty a mřížka řádků jedné stránky mezi `top` a `bottom`."""
+        if bottom >= top:
+            return
+        c.drawText(text)
+        left, right = self.edges[0], self.edges[-1]
+        n = round((top - bottom) / self.ROW_H)
+        segs = [(left, top - k * self.ROW_H, right, top - k * self.ROW_H) for k in range(0 if top_line else 1, n + 1)]
+        segs += [(x, bottom, x, top) for x in self.edges]
+        c.lines(segs)
+
+    def _draw_background(self, c) -> None:
+        if self.logo_xy:
+            c.drawImage(self.res.logo, *self.logo_xy, *self.res.logo_size, mask="auto")
+        x, y, size, title = self.title
+        c.setFont(self.bold, size)
+        c.drawString(x, y, title)
+        c.setFont(self.base, self.normal.fontSize)
+        for label, lx, _, y in self.fields:
+            c.drawString(lx, y, label)
+        top, bottom = self.table_top, self.table_top - self.HEAD_H
+        c.setFillColor(colors.HexColor("#f0f0f0"))
+        c.rect(self.edges[0], bottom, self.edges[-1] - self.edges[0], self.HEAD_H, stroke=0, fill=1)
+        c.setFillColor(colors.black)
+        c.setFont(self.bold, self.FONT_SIZE)
+        for l, r, text in zip(self.edges, self.edges[1:], self.headers):   # záhlaví je celé na střed
+            c.drawCentredString((l + r) / 2, bottom + 6 + 12 - self.FONT_SIZE, text)
+        self._grid_style(c)
+        self._grid(c, top, bottom, top_line=True)
+
+    def draw(self, c, hdr: tuple, body: list, total: float, issued: str, shared: bool = True) -> None:
+        """
+        Jeden poukaz od aktuální stránky; dlouhá tabulka pokračuje na další jako
+        u platypusu. shared=False: pozadí přímo na stránku místo form XObjectu.
+        """
+        if not shared:
+            c.saveState()
+            self._draw_background(c)
+            c.restoreState()
+        else:
+            if not c.hasForm(self.form):
+                c.beginForm(self.form)
+                self._draw_background(c)
+                c.endForm()
+            c.doForm(self.form)
+        c.setFont(self.bold, self.normal.fontSize)
+        for (_, _, vx, y), value in zip(self.fields, hdr[:2]):
+            c.drawString(vx, y, str(value))
+
+        # řádky stránky: texty v jednom textovém objektu, mřížka jednou cestou
+        # (svislice přes všechny řádky najednou) – menší obsah stránky
+        self._grid_style(c)
+        y = top = self.table_top - self.HEAD_H
+        text, new_page = self._row_text(c), False
+        for row in body:
+            if y - self.ROW_H < self.bottom:
+                self._flush_rows(c, text, top, y, new_page)
+                c.showPage()
+                self._grid_style(c)
+                y = top = self.top
+                text, new_page = self._row_text(c), True
+            baseline = y - self.ROW_H + 3 + 12 - self.FONT_SIZE
+            for (align, x), value in zip(self.cells, row):
+                value = str(value)
+                if align != "L":   # jako drawCentredString / drawRightString
+                    w = pdfmetrics.stringWidth(value, self.base, self.FONT_SIZE)
+                    x -= w / 2 if align == "C" else w
+                text.setTextOrigin(round(x, 2), baseline)
+                text.textOut(value)
+            y -= self.ROW_H
+        self._flush_rows(c, text, top, y, new_page)
+
+        # Spacer(1, 8) + Heading3 (spaceBefore) + Spacer(1, 4) + Normal
+        h3, n = self.h3, self.normal
+        y -= 8 + h3.spaceBefore + h3.leading
+        if y - h3.spaceAfter - 4 - n.leading < self.bottom:
+            c.showPage()
+            y = self.top - h3.leading
+        c.setFont(self.bold, h3.fontSize)
+        c.drawString(self.x0, y + h3.leading - h3.fontSize, f"Celkem k úhradě: {int(total)} Kč")
+        y -= h3.spaceAfter + 4 + n.leading
+        c.setFont(self.base, n.fontSize)
+        c.drawString(self.x0, y + n.leading - n.fontSize, f"Vystaveno: {issued}")
+        c.showPage()
+
+@st.cache_resource(show_spinner=False)
+def voucher_template(kind: str) -> VoucherTemplate:
+    return VoucherTemplate(pdf_resources(), kind)
+
+def render_vouchers_template(vouchers: list, progress: Optional[Callable[[int, int], None]] = None) -> tuple:
+    """
+    vouchers = [(druh, hdr, řádky)] -> jedno PDF, každý poukaz od nové stránky.
+    Fonty, logo a pozadí každého druhu jsou v PDF jen jednou, takže sloučená
+    dávka je zlomek součtu jednotlivých PDF; druh, který je v PDF jen jednou,
+    se kreslí bez form XObjectu. Vrací (pdf_bytes, chyby).
+    """
+    errors, prepared = [], []
+    for kind, hdr, rows in vouchers:
+        try:   # data napřed – chyba nesmí nechat napůl nakreslenou stránku
+            prepared.append((kind, hdr) + _voucher_table(kind, hdr, rows))
+        except Exception as e:
+            errors.append((hdr[0], f"{kind}: {e}"))
+    if not prepared:
+        raise ValueError("Žádný poukaz k vykreslení.")
+    buf = BytesIO()
+    c = _rl_canvas.Canvas(buf, pagesize=A4)
+    issued = _dt.now().strftime('%d.%m.%Y %H:%M:%S')
+    per_kind = Counter(kind for kind, *_ in prepared)
+    for i, (kind, hdr, body, total) in enumerate(prepared, start=1):
+        voucher_template(kind).draw(c, hdr, body, total, issued, shared=per_kind[kind] > 1)
+        if progress:
+            progress(i, len(prepared))
+    c.save()
+    return buf.getvalue(), errors
+
+
 def counter(col, key: str, label: str = "", min_value: int = 0) -> int:
     # inicializace
     if key not in st.session_state:
@@ -2001,6 +3967,219 @@ def counter(col, key: str, label: str = "", min_value: int = 0) -> int:
 
 
 
+# --- HROMADNÉ POUKAZY: rozsah příjezdů / seznam ID -> ZIP, PDF paralelně v procesech ---
+import multiprocessing as mp
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+VOUCHER_BATCH_WORKERS: Optional[int] = None   # None = počet jader
+VOUCHER_BATCH_STALL_S = 120.0                 # tak dlouho bez hotového poukazu -> zbytek se kreslí v procesu
+# nastavení PDF, která workery převezmou z rodiče (rodič je mohl přepsat)
+_VOUCHER_WORKER_SETTINGS = ("FONT_REG", "FONT_BLD", "FONT_ITA", "FONT_BI", "VOUCHER_LOGO")
+
+def voucher_ids_arriving(start: date, end: date) -> List[str]:
+    """ID rezervací s prvním příjezdem v [start, end] (u per-room nejdřívější pokoj)."""
+    with get_conn() as con:
+        rows = con.execute("""
+            SELECT r.id, COALESCE(MIN(rr.arrival_iso), r.global_arrival_iso) AS first_arrival
+            FROM reservations r
+            LEFT JOIN reservation_rooms rr ON rr.id = r.id
+            GROUP BY r.id
+            HAVING first_arrival BETWEEN ? AND ?
+            ORDER BY first_arrival, r.id
+        """, (start.isoformat(), end.isoformat())).fetchall()
+    return [r[0] for r in rows]
+
+def _voucher_batch_jobs(booking_ids: List[str], with_participants: bool, renderer: str = "platypus") -> tuple:
+    """
+    Data všech poukazů dávky (čte jen hlavní proces). Vrací (jobs, errors);
+    job = (název souboru, klíč cache, druh, hdr, řádky) – klíče stejné jako
+    u jednotlivého poukazu, takže dávka i výběr po jednom sdílí cache.
+    """
+    jobs, errors = [], []
+    for bid in booking_ids:
+        hdr, rooms = fetch_detail(bid)
+        if not hdr:
+            errors.append((bid, "ID nenalezeno."))
+            continue
+        jobs.append((f"poukaz_{bid}.pdf", voucher_cache_key("rezervace", hdr, rooms, renderer),
+                     "rezervace", hdr, rooms))
+        if with_participants:
+            parts = fetch_participants(bid)
+            if not parts.empty:  # bez účastníků poukaz „účastníci“ prostě není
+                jobs.append((f"poukaz_ucastnici_{bid}.pdf",
+                             voucher_cache_key("ucastnici", hdr, parts.to_numpy().tolist(), renderer),
+                             "ucastnici", hdr, parts))
+    return jobs, errors
+
+def _render_voucher_job(kind: str, hdr: tuple, rows, renderer: str = "platypus") -> bytes:
+    """Vstupní bod workeru: jen vykreslení z předaných dat, bez DB a Streamlitu."""
+    if renderer == "sablona":
+        return render_vouchers_template([(kind, hdr, rows)])[0]
+    if kind == "ucastnici":
+        return _build_voucher_pdf_participants(hdr, rows)
+    return _build_voucher_pdf(hdr, rows)
+
+def _voucher_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool workerů poukazů. Žádný fork: forknout vícevláknový server Streamlitu
+    může zamrznout na zámku, který v tu chvíli drželo jiné vlákno. Forkserver
+    (app.py načte jednou, workery forkuje z jednovláknového serveru), jinde
+    spawn; vstupní bod je voucher_worker, který jde importovat bez app.py.
+    """
+    import voucher_worker
+
+    method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    ctx = mp.get_context(method)
+    if method == "forkserver":
+        ctx.set_forkserver_preload(["app"])
+    settings = {name: globals()[name] for name in _VOUCHER_WORKER_SETTINGS}
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                               initializer=voucher_worker.init, initargs=(settings,))
+
+def _render_batch_in_pool(todo: list, workers: int, renderer: str, finish, errors: list) -> list:
+    """
+    Vykreslí úlohy dávky v poolu, finish(name, key, pdf) po každém poukazu.
+    Vrací úlohy, které pool nevykreslil (nerozběhl se, spadl nebo
+    VOUCHER_BATCH_STALL_S nevrátil nic) – ty dokreslí volající v procesu.
+    """
+    import voucher_worker
+
+    try:
+        pool = _voucher_pool(workers)
+    except (ImportError, OSError, ValueError):
+        return todo
+    handled, stalled = set(), False
+    try:
+        pending = {}
+        for job in todo:
+            pending[pool.submit(voucher_worker.render, *job[2:], renderer)] = job
+        while pending:
+            done, _ = wait(pending, timeout=VOUCHER_BATCH_STALL_S, return_when=FIRST_COMPLETED)
+            if not done:
+                stalled = True  # zaseknutý worker – na zbytek se nečeká
+                break
+            for fut in done:
+                name, key, _, hdr, _ = pending.pop(fut)
+                try:
+                    finish(name, key, fut.result())
+                except BrokenProcessPool:
+                    continue
+                except Exception as e:
+                    errors.append((hdr[0], f"{name}: {e}"))
+                handled.add(name)
+    except BrokenProcessPool:
+        pass
+    finally:
+        # po zaseknutí bez čekání; rozpracované poukazy doběhnou naprázdno
+        pool.shutdown(wait=not stalled, cancel_futures=True)
+    return [job for job in todo if job[0] not in handled]
+
+def build_voucher_batch(booking_ids: List[str], with_participants: bool = True,
+                        workers: Optional[int] = None,
+                        progress: Optional[Callable[[int, int], None]] = None,
+                        cache: Optional[PdfCache] = None,
+                        renderer: Optional[str] = None, merged: bool = False) -> tuple:
+    """
+    Poukazy pro všechny rezervace jako jeden ZIP. PDF z cache se jen přibalí,
+    ostatní se vykreslí v ProcessPoolExecutor (ReportLab drží GIL, vlákna by
+    nepomohla, viz _render_batch_in_pool); co pool nevykreslí, dokreslí se
+    postupně v procesu. merged=True místo ZIPu vrátí jedno PDF se všemi poukazy (vždy šablonový
+    renderer, jedno plátno v procesu). progress(hotovo, celkem) se volá po
+    každém poukazu. Vrací (zip_bytes nebo pdf_bytes, souhrn).
+    """
+    renderer = "sablona" if merged else _voucher_renderer(renderer)
+    cache = cache or _voucher_cache()
+    jobs, errors = _voucher_batch_jobs(booking_ids, with_participants, renderer)
+    if merged:
+        pdf_bytes, failed = render_vouchers_template([(kind, hdr, rows) for _, _, kind, hdr, rows in jobs], progress)
+        errors += failed
+        return pdf_bytes, {"vouchers": len(jobs) - len(failed), "rendered": len(jobs) - len(failed),
+                           "cached": 0, "workers": 1, "errors": errors}
+    total = len(jobs)
+    pdfs: Dict[str, bytes] = {}
+    todo = []
+    for name, key, kind, hdr, rows in jobs:
+        data = cache.get(key)
+        if data is None:
+            todo.append((name, key, kind, hdr, rows))
+        else:
+            pdfs[name] = data
+    done = len(pdfs)
+    if progress:
+        progress(done, total)
+
+    def _finish(name: str, key: str, data: bytes) -> None:
+        nonlocal done
+        cache.put(key, data)
+        pdfs[name] = data
+        done += 1
+        if progress:
+            progress(done, total)
+
+    workers = min(workers or VOUCHER_BATCH_WORKERS or os.cpu_count() or 1, len(todo))
+    left = _render_batch_in_pool(todo, workers, renderer, _finish, errors) if workers > 1 else todo
+    for name, key, kind, hdr, rows in left:
+        try:
+            _finish(name, key, _render_voucher_job(kind, hdr, rows, renderer))
+        except Exception as e:
+            errors.append((hdr[0], f"{name}: {e}"))
+
+    buf = BytesIO()
+    # PDF jsou už komprimovaná – ZIP jen ukládá
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        for name, *_ in jobs:
+            if name in pdfs:
+                zf.writestr(name, pdfs[name])
+    summary = {"vouchers": len(pdfs), "rendered": len(pdfs) - (total - len(todo)),
+               "cached": total - len(todo), "workers": max(workers, 1), "errors": errors}
+    return buf.getvalue(), summary
+
+def voucher_batch_ui():
+    """Hromadné poukazy: rozsah příjezdů nebo seznam ID -> ZIP ke stažení."""
+    with st.expander("Hromadně – poukazy pro rozsah příjezdů nebo seznam ID"):
+        mode = st.radio("Výběr", ["Rozsah příjezdů", "Seznam ID"], horizontal=True, key="voucher_batch_mode")
+        if mode == "Rozsah příjezdů":
+            c1, c2 = st.columns(2)
+            d_from = c1.date_input("Příjezd od", value=date.today(), format="DD.MM.YYYY", key="voucher_batch_from")
+            d_to = c2.date_input("Příjezd do", value=date.today() + timedelta(days=6), format="DD.MM.YYYY",
+                                 key="voucher_batch_to")
+            ids = voucher_ids_arriving(d_from, d_to) if d_from <= d_to else []
+        else:
+            raw = st.text_area("ID rezervací (oddělená čárkou nebo novým řádkem)", key="voucher_batch_ids")
+            ids = list(dict.fromkeys(x.strip() for x in re.split(r"[,;\s]+", raw) if x.strip()))
+        with_parts = st.checkbox("Včetně poukazů s účastníky", value=True, key="voucher_batch_parts")
+        out = st.radio("Výstup", ["ZIP (PDF po poukazech)", "Jedno PDF (všechny poukazy)"], horizontal=True,
+                       key="voucher_batch_out")
+        merged = out.startswith("Jedno")
+        # ZIP = samostatná PDF: šablona tu je stejně velká a jen o málo rychlejší než platypus
+        fast = merged or st.checkbox("Rychlé vykreslení (šablona)", value=False, key="voucher_batch_fast")
+        st.caption(f"Vybráno rezervací: **{len(ids)}**")
+        if not st.button("Vytvořit PDF" if merged else "Vytvořit ZIP", key="voucher_batch_btn", disabled=not ids):
+            return
+        bar = st.progress(0.0, text="Připravuji…")
+
+        def _progress(done: int, total: int) -> None:
+            bar.progress(done / total if total else 1.0, text=f"Poukazy {done}/{total}")
+
+        try:
+            data, summary = build_voucher_batch(ids, with_parts, progress=_progress,
+                                                renderer="sablona" if fast else "platypus", merged=merged)
+        except Exception as e:
+            st.error(f"Hromadné generování selhalo: {e}")
+            return
+        st.success(f"Hotovo: {summary['vouchers']} PDF (nově {summary['rendered']}, "
+                   f"z cache {summary['cached']}, procesů {summary['workers']}).")
+        for bid, msg in summary["errors"]:
+            st.warning(f"{bid}: {msg}")
+        if merged:
+            st.download_button("Stáhnout PDF", data=data, mime="application/pdf",
+                               file_name=f"poukazy_{date.today():%Y%m%d}.pdf", key="voucher_batch_dl")
+        else:
+            st.download_button("Stáhnout ZIP", data=data, mime="application/zip",
+                               file_name=f"poukazy_{date.today():%Y%m%d}.zip", key="voucher_batch_dl")
+
 def voucher_ui():
     st.header("Vygenerovat poukaz (PDF)")
     with get_conn() as con:
@@ -2065,18 +4244,16 @@ def voucher_ui():
     recipient, mcfg = get_mail_recipient()
     st.caption(f"Adresát e-mailu: **{recipient or 'nenalezen'}** (configMAIL.csv)")
 
-    # cache PDF v session
+    # PDF z cache poukazů (podle obsahu rezervace) – opakované stažení/odeslání je jen vyhledání
     if gen_clicked:
         booking_id = label_to_id[chosen_label]
         try:
             pdf_bytes = create_voucher_pdf_bytes(booking_id)
-            st.session_state["voucher_pdf_bytes"] = pdf_bytes
-            st.session_state["voucher_pdf_name"] = f"poukaz_{booking_id}.pdf"
             st.success("Poukaz vygenerován.")
             st.download_button(
                 label="Stáhnout poukaz PDF",
                 data=pdf_bytes,
-                file_name=st.session_state["voucher_pdf_name"],
+                file_name=f"poukaz_{booking_id}.pdf",
                 mime="application/pdf",
             )
         except Exception as e:
@@ -2091,14 +4268,12 @@ def voucher_ui():
             return
 
         booking_id = label_to_id[chosen_label]
-        pdf_bytes = st.session_state.get("voucher_pdf_bytes")
-        pdf_name  = st.session_state.get("voucher_pdf_name") or f"poukaz_{booking_id}.pdf"
-        if not pdf_bytes:
-            try:
-                pdf_bytes = create_voucher_pdf_bytes(booking_id)
-            except Exception as e:
-                st.error(f"PDF se nepodařilo vytvořit: {e}")
-                return
+        pdf_name = f"poukaz_{booking_id}.pdf"
+        try:
+            pdf_bytes = create_voucher_pdf_bytes(booking_id)
+        except Exception as e:
+            st.error(f"PDF se nepodařilo vytvořit: {e}")
+            return
 
         try:
             subj = mcfg.get("SUBJECT_VOUCHER") or f"Poukaz k rezervaci {booking_id}"
@@ -2108,6 +4283,9 @@ def voucher_ui():
         except Exception as e:
             st.error(f"Odeslání e-mailu selhalo: {e}")
 
+    st.markdown("---")
+    voucher_batch_ui()
+
 
 def sidebar_site_badge():
     site = st.session_state.get("site")
@@ -2125,6 +4303,9 @@ def sidebar_site_badge():
                     st.sidebar.warning("E-mail příjemce nenalezen (configMAIL.csv).")
             except Exception:
                 pass
+            cs = _availability_cache().stats()
+            st.sidebar.caption(f"Cache kalendáře: {cs['hits']} zásahů / {cs['misses']} přepočtů, "
+                               f"{cs['entries']} měsíců v paměti, verze dat {data_version()}")
         elif role == "dohled":
             st.sidebar.info("Role: **Dohled**")
         else:
@@ -2148,132 +4329,279 @@ def sidebar_site_badge():
         st.sidebar.warning("Nevybraná lokalita")
 
 
+def occupancy_matrix(year: int, month: int) -> pd.DataFrame:
+    """
+    Zatížení pokojů v měsíci: řádky = pokoje, sloupce = dny v měsíci, hodnoty =
+    osoby (pokoj s kapacitou) / pobyty (bez kapacity) na noc, viz occupancy_load.
+    Mezi zápisy se servíruje z procesní cache (viz AvailabilityCache).
+    """
+    key, version = _availability_key(year, month)
+    return _availability_cache().get_or_compute(key, version, lambda: _compute_occupancy(year, month))
+
 def availability_matrix(year: int, month: int) -> pd.DataFrame:
     """
     Vrátí DataFrame: řádky = pokoje, sloupce = dny v měsíci,
-    hodnoty = True (volno) / False (obsazeno).
+    hodnoty = True (volno / volná lůžka) / False (plně obsazeno).
     """
+    return _availability_from_load(occupancy_matrix(year, month))
+
+def _availability_from_load(load: pd.DataFrame) -> pd.DataFrame:
+    """Zatížení -> True tam, kde pokoj ještě není plný."""
+    if load.empty:
+        return load.astype(bool)
+    cap = np.maximum(room_capacity_vector(load.index.tolist()), 1)
+    return load.lt(pd.Series(cap, index=load.index), axis=0)
+
+def _availability_key(year: int, month: int) -> tuple[tuple, tuple]:
+    """Klíč (db, rok, měsíc) a verze (data_version, mtime configu) pro AvailabilityCache."""
+    db_path, cfg_path = current_paths()
+    if not db_path:
+        raise RuntimeError("Lokalita není zvolena.")
+    return (db_path, int(year), int(month)), (data_version(), Path(cfg_path).stat().st_mtime)
+
+def _compute_occupancy(year: int, month: int) -> pd.DataFrame:
     cfg = get_cfg()
     room_types = cfg["POKOJ"].tolist()
     if not room_types:
         return pd.DataFrame()
 
-    last_day = calendar.monthrange(year, month)[1]
-    days = [date(year, month, d) for d in range(1, last_day + 1)]
-
-    occ = occupancy_by_day_boolean()
-
-    data = {}
-    for rt in room_types:
-        row = []
-        for d in days:
-            occupied = False
-            if not occ.empty:
-                mask = (occ["room_type"] == rt) & (occ["date"] == d) & (occ["occupied"] == 1)
-                if not occ[mask].empty:
-                    occupied = True
-            row.append(not occupied)  # True = volno, False = obsazeno
-        data[rt] = row
-
-    df = pd.DataFrame(data, index=days).T
-    df.columns = [d.day for d in days]
-    return df
-
-def render_availability_grid(year: int, month: int, show_names: bool = False):
-    df = availability_matrix(year, month)
-    if df.empty:
+    first, nxt = _month_bounds(year, month)
+    return _occupancy_frame(occupancy_load(first, nxt, room_types)[0], room_types)
+
+def _occupancy_frame(load: np.ndarray, room_types: list[str]) -> pd.DataFrame:
+    """Řez matice zatížení (pokoje × dny měsíce) -> DataFrame ve tvaru occupancy_matrix."""
+    return pd.DataFrame(load, index=room_types, columns=list(range(1, load.shape[1] + 1)))
+
+from html import escape as _html_escape
+
+# Styl mřížky jednou na stránku, buňky nesou jen krátké třídy
+AVAILABILITY_GRID_CSS = """<style>
+.ag{border-collapse:collapse;width:100%;font-size:13px}
+.ag th,.ag td{border:1px solid #ccc}
+.ag th{padding:2px;text-align:center;width:28px}
+.ag th.r{padding:4px 2px;text-align:left;width:auto}
+.ag td{padding:6px;text-align:center;font-size:11px;line-height:1.05}
+.ag td.r{padding:4px 6px;text-align:left;font-weight:bold;font-size:13px;white-space:nowrap}
+.ag .f{background:#2ecc71;color:#0b3d0b}
+.ag .p{background:#f5b041;color:#3d2a0b}
+.ag .o{background:#e74c3c;color:#fff}
+</style>"""
+
+@st.cache_resource(show_spinner=False)
+def _grid_html_cache() -> AvailabilityCache:
+    """Hotové HTML měsíčních mřížek {(db, rok, měsíc, jména) -> str}, verze jako u dostupnosti."""
+    return AvailabilityCache()
+
+def availability_grid_html(year: int, month: int, load: pd.DataFrame, name_map: dict,
+                           cfg: Optional[pd.DataFrame] = None) -> str:
+    """
+    HTML tabulka měsíce (bez <style>, viz AVAILABILITY_GRID_CSS): volno / částečně
+    obsazeno (x/kapacita) / plno. Prázdný `name_map` = bez jmen v buňkách.
+    """
+    caps = room_capacity_vector(load.index.tolist(), cfg).tolist()
+    days = list(range(1, calendar.monthrange(year, month)[1] + 1))
+    values = load.reindex(columns=days, fill_value=0).to_numpy().tolist()
+    free_td = "<td class='f' title='Volno'></td>"
+
+    parts = ["<table class='ag'><tr><th class='r'>Pokoj</th>"]
+    parts.extend(f"<th>{d}</th>" for d in days)
+    parts.append("</tr>")
+    for room, row, cap in zip(load.index, values, caps):
+        parts.append(f"<tr><td class='r'>{_html_escape(str(room))}</td>")
+        for d, val in zip(days, row):
+            if val == 0:
+                parts.append(free_td)
+                continue
+            # obsazeno – červené (plno) / oranžové (volná lůžka) + jméno/tooltip (pokud admin)
+            full = val >= max(cap, 1)
+            label = "" if full else f"{val}/{cap}"
+            title = "Obsazeno" if full else f"Obsazeno {val} z {cap} lůžek"
+            nm = name_map.get((room, date(year, month, d))) if name_map else None
+            if nm:
+                title = nm if full else f"{title}: {nm}"
+                # zkrátit do buňky, ať se nerozbije layout
+                label = nm if len(nm) <= 12 else nm[:12] + "…"
+            parts.append(f"<td class='{'o' if full else 'p'}' title='{_html_escape(title)}'>"
+                         f"{_html_escape(label)}</td>")
+        parts.append("</tr>")
+    parts.append("</table>")
+    return "".join(parts)
+
+def availability_grid_fragment(year: int, month: int, show_names: bool = False,
+                               load: Optional[pd.DataFrame] = None,
+                               name_map: Optional[dict] = None) -> str:
+    """
+    HTML mřížky měsíce z procesní cache (klíč lokalita, rok, měsíc, jména; verze
+    = data_version + mtime configu). `load`/`name_map` se použijí jen při missu;
+    prázdný řetězec = žádné pokoje.
+    """
+    key, version = _availability_key(year, month)
+
+    def build() -> str:
+        df = load if load is not None else occupancy_matrix(year, month)
+        if df.empty:
+            return ""
+        names = {}
+        if show_names:
+            names = name_map if name_map is not None else occupied_name_map(*_month_bounds(year, month))
+        return availability_grid_html(year, month, df, names)
+
+    return _grid_html_cache().get_or_compute(key + (bool(show_names),), version, build)
+
+def render_availability_grid(year: int, month: int, show_names: bool = False,
+                             load: Optional[pd.DataFrame] = None,
+                             name_map: Optional[dict] = None, with_style: bool = True,
+                             html: Optional[str] = None):
+    """
+    Měsíční mřížka pokoje × dny: volno / částečně obsazeno (x/kapacita) / plno.
+    `load` (occupancy_matrix) a `name_map` lze předat hotové (roční pohled je
+    spočítá jednou pro všech 12 měsíců), stejně tak hotové `html` z cache;
+    with_style=False, když stránka už AVAILABILITY_GRID_CSS vložila.
+    """
+    if html is None:
+        html = availability_grid_fragment(year, month, show_names, load, name_map)
+    if not html:
         st.warning("Žádné pokoje v configu nebo prázdná data.")
         return
+    st.markdown((AVAILABILITY_GRID_CSS if with_style else "") + html, unsafe_allow_html=True)
 
-    # jména do buněk jen pro admina
-    name_map = {}
-    if show_names:
-        name_map = occupied_name_map()  # {(room_type, date) -> "Jméno (ID)"}
-
-    # sloupce = 1..last_day
-    last_day = calendar.monthrange(year, month)[1]
-
-    # CSS: čitelný kontrast pro text v buňkách
-    cell_css = "border:1px solid #ccc;padding:6px;text-align:center;font-size:11px;line-height:1.05;"
-    html = "<table style='border-collapse:collapse;width:100%;font-size:13px;'>"
-
-    # hlavička
-    html += "<tr><th style='border:1px solid #ccc;padding:4px 2px;text-align:left;'>Pokoj</th>"
-    for d in range(1, last_day + 1):
-        html += f"<th style='border:1px solid #ccc;padding:2px;text-align:center;width:28px'>{d}</th>"
-    html += "</tr>"
-
-    # řádky
-    for room, row in df.iterrows():
-        html += f"<tr><td style='border:1px solid #ccc;padding:4px 6px;text-align:left;font-weight:bold;white-space:nowrap'>{room}</td>"
-        for d in range(1, last_day + 1):
-            val = bool(row.get(d, True))  # True = volno, False = obsazeno
-            day_date = date(year, month, d)
-            if val:
-                # volno – prázdné pole (zelené)
-                html += f"<td style='{cell_css}background:#2ecc71;color:#0b3d0b' title='Volno'></td>"
-            else:
-                # obsazeno – červené + jméno/tooltip (pokud admin)
-                label = ""
-                title = "Obsazeno"
-                if show_names:
-                    nm = name_map.get((room, day_date))
-                    if nm:
-                        title = nm
-                        # zkrátit do buňky, ať se nerozbije layout
-                        label = nm if len(nm) <= 12 else nm[:12] + "…"
-                html += f"<td style='{cell_css}background:#e74c3c;color:#fff' title='{title}'>{label}</td>"
-        html += "</tr>"
-    html += "</table>"
-
-    st.markdown(html, unsafe_allow_html=True)
 
 
-
-def _ranges_overlap(a1, d1, a2, d2) -> bool:
-    """Interval je [a, d) – odjezd exkluzivně. Vrací True, když se překrývá."""
-    return not (d1 <= a2 or d2 <= a1)
-
-def find_room_conflicts(rooms_payload: list[dict], exclude_id: Optional[str] = None) -> list[dict]:
+def find_room_conflicts(rooms_payload: list[dict], exclude_id: Optional[str] = None,
+                        con: Optional[sqlite3.Connection] = None,
+                        caps: Optional[dict[str, int]] = None) -> list[dict]:
     """
     Zjistí konflikty v DB vůči plánovaným řádkům pokojů.
-    rooms_payload: položky s klíči room_type, arrival (dd.mm.yyyy), departure (dd.mm.yyyy)
+    rooms_payload: položky s klíči room_type, arrival (dd.mm.yyyy), departure (dd.mm.yyyy),
+    u pokojů s kapacitou (KAPACITA v configu) i employees/guests.
     exclude_id: ID, které při kontrole ignorujeme (při editaci).
-    Vrací list dictů: {room_type, existing_id, existing_arrival, existing_departure, new_arrival, new_departure}
+    con: otevřené spojení (uvnitř write_transaction); jinak si otevře vlastní.
+    caps: room_capacities(get_cfg()), když je volající už má (hromadný import
+    je nenačítá z cache znovu pro každou rezervaci).
+    Vrací list dictů: {room_type, existing_id, existing_arrival, existing_departure,
+    new_arrival, new_departure, capacity}; capacity je None u pokoje bez kapacity
+    (konflikt = jakýkoli překryv), jinak konflikt nastane, až osoby překročí lůžka.
+    """
+    if caps is None:
+        caps = room_capacities(get_cfg())
+    caps = {rt: c for rt, c in (caps or {}).items() if c > 0}
+    wanted = []  # (pos, room_type, arrival_iso, departure_iso)
+    shared = []  # (pos, room_type, arrival, departure, people) – pokoje s kapacitou
+    for pos, r in enumerate(rooms_payload):
+        rt = (r.get("room_type") or "").strip()
+        a = _parse_cz_date(r.get("arrival") or "")
+        d = _parse_cz_date(r.get("departure") or "")
+        if not rt or not a or not d or a >= d:
+            # prázdné/nesmyslné řádky přeskočíme (neumožní uložit jinde)
+            continue
+        if rt in caps:
+            people = max(int(r.get("employees") or 0) + int(r.get("guests") or 0), 1)
+            shared.append((pos, rt, a, d, people))
+        else:
+            wanted.append((pos, rt, a.isoformat(), d.isoformat()))
+    if con is None:
+        with get_conn() as con:
+            return (_exclusive_conflicts(rooms_payload, wanted, exclude_id, con)
+                    + _capacity_conflicts(rooms_payload, shared, caps, exclude_id, con))
+    return (_exclusive_conflicts(rooms_payload, wanted, exclude_id, con)
+            + _capacity_conflicts(rooms_payload, shared, caps, exclude_id, con))
+
+def _exclusive_conflicts(rooms_payload: list[dict], wanted: list[tuple], exclude_id: Optional[str],
+                         con: sqlite3.Connection) -> list[dict]:
+    """Pokoje bez kapacity: konflikt je každý překryv s jinou rezervací."""
+    if not wanted:
+        return []
+
+    # všechny požadované pokoje jedním dotazem; překryv [a, d) řeší
+    # index (room_type, arrival_iso, departure_iso) pro každý řádek VALUES
+    values = ", ".join(["(?, ?, ?, ?)"] * len(wanted))
+    sql = f"""
+        WITH wanted(pos, room_type, arrival_iso, departure_iso) AS (VALUES {values})
+        SELECT w.pos, rr.id, rr.arrival, rr.departure
+        FROM wanted w
+        JOIN reservation_rooms rr
+          ON rr.room_type = w.room_type
+         AND rr.arrival_iso < w.departure_iso
+         AND rr.departure_iso > w.arrival_iso
+        WHERE (? IS NULL OR rr.id <> ?)
+        ORDER BY w.pos, rr.arrival_iso
     """
+    params = [v for row in wanted for v in row] + [exclude_id, exclude_id]
+    rows = con.execute(sql, params).fetchall()
+
     conflicts = []
-    with get_conn() as con:
-        cur = con.cursor()
-        for r in rooms_payload:
-            rt = (r.get("room_type") or "").strip()
-            a = _parse_cz_date(r.get("arrival") or "")
-            d = _parse_cz_date(r.get("departure") or "")
-            if not rt or not a or not d or a >= d:
-                # prázdné/nesmyslné řádky přeskočíme (neumožní uložit jinde)
-                continue
+    for pos, eid, ea_s, ed_s in rows:
+        r = rooms_payload[pos]
+        conflicts.append({
+            "room_type": (r.get("room_type") or "").strip(),
+            "existing_id": eid,
+            "existing_arrival": ea_s,
+            "existing_departure": ed_s,
+            "new_arrival": r.get("arrival"),
+            "new_departure": r.get("departure"),
+            "capacity": None,
+        })
+    return conflicts
 
-            params = [rt]
-            sql = "SELECT id, arrival, departure FROM reservation_rooms WHERE room_type = ?"
-            if exclude_id:
-                sql += " AND id <> ?"
-                params.append(exclude_id)
+def _capacity_conflicts(rooms_payload: list[dict], shared: list[tuple], caps: dict[str, int],
+                        exclude_id: Optional[str], con: sqlite3.Connection) -> list[dict]:
+    """
+    Pokoje s kapacitou: osoby v DB (room_nights) + osoby všech plánovaných řádků
+    na tentýž pokoj a noc nesmí překročit kapacitu. Hlásí první přeplněnou noc
+    každého řádku; existing_id je některá z rezervací, které tu noc pokoj sdílí
+    (None, když lůžka nestačí už samotné skupině).
+    """
+    if not shared:
+        return []
+    # osoby z plánu na (pokoj, noc)
+    planned: dict[tuple, int] = {}
+    for _, rt, a, d, people in shared:
+        for k in range((d - a).days):
+            key = (rt, a + timedelta(days=k))
+            planned[key] = planned.get(key, 0) + people
+
+    values = ", ".join(["(?, ?, ?)"] * len(shared))
+    rows = con.execute(f"""
+        WITH wanted(room_type, arrival_iso, departure_iso) AS (VALUES {values})
+        SELECT rn.room_type, rn.night, SUM(rn.people), MIN(rn.booking_id)
+        FROM (SELECT DISTINCT * FROM wanted) w
+        JOIN room_nights rn
+          ON rn.room_type = w.room_type AND rn.night >= w.arrival_iso AND rn.night < w.departure_iso
+        WHERE (? IS NULL OR rn.booking_id <> ?)
+        GROUP BY rn.room_type, rn.night
+    """, [v for _, rt, a, d, _p in shared for v in (rt, a.isoformat(), d.isoformat())]
+         + [exclude_id, exclude_id]).fetchall()
+    booked = {(rt, date.fromisoformat(n)): (int(people), bid) for rt, n, people, bid in rows}
 
-            for (eid, ea_s, ed_s) in cur.execute(sql, params).fetchall():
-                ea = _parse_cz_date(ea_s or "")
-                ed = _parse_cz_date(ed_s or "")
-                if not ea or not ed:
-                    continue
-                if _ranges_overlap(a, d, ea, ed):
-                    conflicts.append({
-                        "room_type": rt,
-                        "existing_id": eid,
-                        "existing_arrival": ea_s,
-                        "existing_departure": ed_s,
-                        "new_arrival": r.get("arrival"),
-                        "new_departure": r.get("departure"),
-                    })
+    conflicts = []
+    for pos, rt, a, d, _ in shared:
+        for k in range((d - a).days):
+            night = a + timedelta(days=k)
+            people, bid = booked.get((rt, night), (0, None))
+            if people + planned[(rt, night)] > caps[rt]:
+                r = rooms_payload[pos]
+                conflicts.append({
+                    "room_type": rt,
+                    "existing_id": bid,
+                    "existing_arrival": night.strftime("%d.%m.%Y"),
+                    "existing_departure": (night + timedelta(days=1)).strftime("%d.%m.%Y"),
+                    "new_arrival": r.get("arrival"),
+                    "new_departure": r.get("departure"),
+                    "capacity": caps[rt],
+                })
+                break
     return conflicts
 
+def _format_conflict(c: dict) -> str:
+    """Konflikt z find_room_conflicts jako jeden řádek zprávy."""
+    if c.get("capacity") is None:
+        return f"{c['room_type']}: koliduje s {c['existing_id']} ({c['existing_arrival']}–{c['existing_departure']})"
+    night = f"noc {c['existing_arrival']}–{c['existing_departure']}"
+    if c["existing_id"] is None:
+        return f"{c['room_type']}: překročena kapacita {c['capacity']} lůžek ({night})"
+    return (f"{c['room_type']}: spolu s {c['existing_id']} překročena kapacita "
+            f"{c['capacity']} lůžek ({night})")
+
 
 def calendar_year_ui():
     today = date.today()
@@ -2281,39 +4609,112 @@ def calendar_year_ui():
 
     st.header(f"Kalendář obsazenosti – {int(year)} (celý rok)")
 
+    room_types = get_cfg()["POKOJ"].tolist()
+    if not room_types:
+        st.warning("Žádné pokoje v configu nebo prázdná data.")
+        return
+
+    if current_role() == "public":
+        # veřejnost: statické snapshoty, DB jen pro měsíce mimo jejich rozsah
+        st.markdown(AVAILABILITY_GRID_CSS, unsafe_allow_html=True)
+        for month in range(1, 13):
+            st.markdown(f"### {CZ_MONTHS[month]} {int(year)}")
+            render_public_month(int(year), month, with_style=False)
+            st.markdown("---")
+        return
+
+    # hotové mřížky z procesní cache (každá se hledá jen jednou); chybějící se
+    # složí z měsíců (také z cache, jinak jeden dotaz za celý rok – měsíce jsou
+    # jen řezy matice zatížení) a uloží
+    y = int(year)
+    first, nxt = date(y, 1, 1), date(y + 1, 1, 1)
+    show_names = is_admin()
+    keys = [_availability_key(y, month) for month in range(1, 13)]
+    grids = _grid_html_cache()
+    htmls = [grids.get(key + (show_names,), version) for key, version in keys]
+    missing = [i for i, html in enumerate(htmls) if html is None]
+    if missing:
+        cache = _availability_cache()
+        months = {i: cache.get(*keys[i]) for i in missing}
+        if any(df is None for df in months.values()):
+            load = occupancy_load(first, nxt, room_types)[0]
+            for i, df in months.items():
+                if df is None:
+                    months[i] = _occupancy_frame(load[:, _month_slice(first, y, i + 1)], room_types)
+                    cache.put(*keys[i], months[i])
+        name_map = occupied_name_map(first, nxt) if show_names else {}
+        for i in missing:
+            df = months[i]
+            htmls[i] = "" if df.empty else availability_grid_html(y, i + 1, df, name_map)
+            grids.put(keys[i][0] + (show_names,), keys[i][1], htmls[i])
+
+    st.markdown(AVAILABILITY_GRID_CSS, unsafe_allow_html=True)
     for month in range(1, 13):
-        st.markdown(f"### {CZ_MONTHS[month]} {int(year)}")
-        render_availability_grid(int(year), month, show_names=is_admin())  # ⬅️ přidáno
+        st.markdown(f"### {CZ_MONTHS[month]} {y}")
+        render_availability_grid(y, month, show_names=show_names, html=htmls[month - 1],
+                                 with_style=False)
         st.markdown("---")
 
-def occupied_name_map() -> dict:
-    """
-    Vrátí mapu {(room_type, date)->"Jméno (ID)"} pro každý obsazený den.
-    Příjezd včetně, odjezd exkluzivně.
-    """
+def _query_name_map(start: Optional[date], end: Optional[date]) -> dict:
+    """{(room_type, date) -> "Jméno (ID)"} přímo z room_nights (index podle noci)."""
+    where, params = "", []
+    if start and end:
+        where, params = " WHERE rn.night >= ? AND rn.night < ?", [start.isoformat(), end.isoformat()]
     with get_conn() as con:
-        rows = pd.read_sql_query("""
-            SELECT rr.room_type, rr.arrival, rr.departure, r.id AS res_id, r.guest_name
-            FROM reservation_rooms rr
-            JOIN reservations r ON r.id = rr.id
-            WHERE rr.room_type IS NOT NULL AND rr.room_type <> ''
-        """, con)
+        rows = con.execute(f"""
+            SELECT DISTINCT rn.room_type, rn.night, r.id, r.guest_name
+            FROM room_nights rn
+            JOIN reservations r ON r.id = rn.booking_id{where}
+            ORDER BY rn.room_type, rn.night, r.id
+        """, params).fetchall()
 
     m = {}
-    if rows.empty:
-        return m
+    for rt, night, res_id, guest in rows:
+        label = f"{guest} ({res_id})" if guest else str(res_id)
+        key = (rt, date.fromisoformat(night))
+        m[key] = f"{m[key]}, {label}" if key in m else label
+    return m
 
-    for _, r in rows.iterrows():
-        rt = str(r["room_type"])
-        a = _parse_cz_date(str(r["arrival"]))
-        d = _parse_cz_date(str(r["departure"]))
-        if not rt or not a or not d or a >= d:
-            continue
-        label = f"{r['guest_name']} ({r['res_id']})" if r.get("guest_name") else str(r["res_id"])
-        curr = a
-        while curr < d:
-            m[(rt, curr)] = label
-            curr += timedelta(days=1)
+@st.cache_resource(show_spinner=False)
+def _name_index_cache() -> AvailabilityCache:
+    """Popisky obsazených nocí po letech {(db, rok) -> [12 × {(pokoj, den) -> popisek}]}."""
+    return AvailabilityCache()
+
+def _year_name_index(year: int) -> list[dict]:
+    """
+    Popisky roku rozdělené po měsících, z procesní cache (verze = data_version,
+    takže zápis ji zneplatní). Vrácené slovníky se nemění – jsou sdílené.
+    """
+    key, version = _availability_key(year, 1)
+
+    def build() -> list[dict]:
+        months = [{} for _ in range(12)]
+        for (rt, night), label in _query_name_map(date(year, 1, 1), date(year + 1, 1, 1)).items():
+            months[night.month - 1][(rt, night)] = label
+        return months
+
+    return _name_index_cache().get_or_compute((key[0], key[1]), version, build)
+
+def occupied_name_map(start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """
+    Vrátí mapu {(room_type, date)->"Jméno (ID)"} pro každý obsazený den
+    (sdílí-li pokoj víc rezervací, jsou oddělené čárkou).
+    Příjezd včetně, odjezd exkluzivně. S oknem [start, end) jen dny v okně –
+    skládá se z měsíců ročního indexu v cache (_year_name_index), takže měsíční
+    i roční pohled sdílí jeden dotaz za rok. Bez okna celá historie (bez cache).
+    """
+    if not (start and end):
+        return _query_name_map(None, None)
+    m = {}
+    y, mo = start.year, start.month
+    while date(y, mo, 1) < end:
+        part = _year_name_index(y)[mo - 1]
+        first, nxt = _month_bounds(y, mo)
+        if start <= first and nxt <= end:
+            m.update(part)
+        else:
+            m.update((k, v) for k, v in part.items() if start <= k[1] < end)
+        y, mo = (y + 1, 1) if mo == 12 else (y, mo + 1)
     return m
 
 
@@ -2346,7 +4747,10 @@ def calendar_grid_ui():
 
     st.markdown("---")
 
-    render_availability_grid(y, m, show_names=is_admin())
+    if current_role() == "public":
+        render_public_month(y, m)  # statický snapshot (mimo jeho rozsah z DB)
+    else:
+        render_availability_grid(y, m, show_names=is_admin())
 
 def insert_request(payload: dict):
     with get_conn() as con:
@@ -2443,6 +4847,28 @@ def requests_admin_ui():
     else:
         st.info("Žádost neobsahuje detail pokojů (rooms_json) nebo je prázdný.")
 
+    # --- Návrh přidělení pokojů (volné pokoje podle kapacit) ---
+    plan_objective = None
+    if rooms and room_capacities(get_cfg()) is not None:
+        st.markdown("**Návrh přidělení pokojů**")
+        plan_objective = st.radio("Kritérium", list(ALLOCATION_OBJECTIVES), horizontal=True,
+                                  format_func=ALLOCATION_OBJECTIVES.get, key="alloc_objective")
+        employees, guests, preferred = _request_party(rooms)
+        try:
+            a_date, d_date = _request_stay(*("" if pd.isna(sel.get(c)) else str(sel.get(c))
+                                             for c in ("arrival", "departure")), bool(per_room_flag))
+        except ValueError as e:
+            st.warning(str(e))
+            plan_objective = None
+        else:
+            plan = allocate_rooms(employees, guests, a_date, d_date, preferred=preferred, objective=plan_objective)
+            if plan:
+                st.dataframe(pd.DataFrame(plan["rooms"]), use_container_width=True, hide_index=True)
+                st.caption(f"Celkem {len(plan['rooms'])} pokojů, {int(plan['price'])} Kč.")
+            else:
+                st.info("V termínu žádosti nejsou volné pokoje s dostatečnou kapacitou.")
+                plan_objective = None
+
     # --- Akce ---
     ca, cb, cc, cd, ce = st.columns(5)
 
@@ -2485,6 +4911,15 @@ def requests_admin_ui():
             st.success(f"Rezervace vytvořena. ID: {booking_id}")
         except Exception as e:
             st.error(f"Převod se nepodařil: {e}")
+            if plan_objective:
+                st.info("Zkus rezervaci s navrženými pokoji (viz Návrh přidělení výše).")
+
+    if plan_objective and st.button("Vytvořit rezervaci s navrženými pokoji"):
+        try:
+            booking_id = create_reservation_from_request(req_id, allocate=plan_objective)
+            st.success(f"Rezervace vytvořena. ID: {booking_id}")
+        except Exception as e:
+            st.error(f"Převod se nepodařil: {e}")
 
 import pandas as pd
 import numpy as np
@@ -2561,6 +4996,23 @@ def delete_by_id_ui():
         st.session_state["del_preview_id"] = label_to_id[chosen_label]
         st.rerun()
 
+    # --- hromadné smazání (např. zrušená školní skupina) – jedna transakce ---
+    with st.expander("Hromadné smazání více rezervací"):
+        bulk_labels = st.multiselect("Rezervace ke smazání", labels, key="del_bulk_labels")
+        bulk_ok = st.checkbox(f"Rozumím a chci trvale smazat {len(bulk_labels)} rezervací.",
+                              key="del_bulk_confirm")
+        if st.button("Smazat vybrané", type="primary", disabled=not (bulk_labels and bulk_ok),
+                     key="del_bulk_execute"):
+            try:
+                n = delete_bookings([label_to_id[l] for l in bulk_labels])
+                st.session_state.pop("del_bulk_labels", None)
+                st.session_state.pop("del_bulk_confirm", None)
+                st.session_state.pop("del_preview_id", None)
+                st.success(f"Smazáno rezervací: {n}.")
+                st.rerun()
+            except Exception as e:
+                st.error(f"Smazání selhalo: {e}")
+
     booking_id = st.session_state.get("del_preview_id")
 
     if not booking_id:
@@ -2644,7 +5096,6 @@ def delete_by_id_ui():
     delete_disabled = not (confirm_checked and typed == _id)
     if col2.button("Smazat rezervaci", type="primary", disabled=delete_disabled, key="del_execute"):
         try:
-            delete_participants_by_id(_id)
             delete_by_id(_id)
             st.success(f"Rezervace {_id} byla smazána.")
             # vyčistíme stav náhledu, aby zmizel detail
@@ -2659,8 +5110,9 @@ def delete_by_id_ui():
 def main():
     st.set_page_config(page_title="Rezervace", layout="wide")
     # >>> ZAJISTÍ FONTY A MAPOVÁNÍ (bold/italic) JEŠTĚ PŘED GENEROVÁNÍM PDF <<<
+    # (registr je cache_resource – fonty se čtou jen při prvním běhu procesu)
     try:
-        ensure_czech_fonts()
+        pdf_resources()
     except Exception as e:
         st.error(f"Fonty DejaVuSans nejsou připravené: {e}")
         # nepřestřelíme celé UI, ale PDF do té doby nepůjde
@@ -2691,7 +5143,10 @@ def main():
             "Upravit podle ID",
             "Kalendář - měsíc",
             "Kalendář - celý rok",
+            "Volné termíny",
             "Žádosti",
+            "Statistiky",
+            "Export ICS",
             "Účastníci",
             "Poukaz (PDF)",
             "Smazat podle ID",
@@ -2703,6 +5158,7 @@ def main():
             "Kalendář - měsíc",
             "Účastníci",
             "Poukaz (PDF)",
+            "Export ICS",
         ]
     else:  # public
         pages = [
@@ -2739,11 +5195,26 @@ def main():
         calendar_grid_ui()
     elif page == "Kalendář - celý rok":
         calendar_year_ui()
+    elif page == "Volné termíny":
+        if role == "admin":
+            free_windows_ui()
+        else:
+            st.warning("Jen pro admina.")
     elif page == "Žádosti":
         if role == "admin":
             requests_admin_ui()
         else:
             st.warning("Jen pro admina.")
+    elif page == "Statistiky":
+        if role == "admin":
+            statistics_ui()
+        else:
+            st.warning("Jen pro admina.")
+    elif page == "Export ICS":
+        if role in ("admin", "dohled"):
+            ics_export_ui()
+        else:
+            st.warning("Jen pro přihlášené.")
     elif page == "Žádost o rezervaci":
             booking_form_unified(mode="public")
     elif page == "Přidat":
@@ -0,0 +1,1098 @@
+"""
+Benchmarky aplikace – běží bez `streamlit run` (headless).
+
+    python bench.py availability --stays 20000 --repeat 20
+    python bench.py cache --stays 20000
+    python bench.py windows --stays 20000 --nights 7
+    python bench.py allocate --rooms 14 --repeat 20
+    python bench.py availability --json vysledky.json
+    python bench.py stress --threads 16 --attempts 50
+    python bench.py render --stays 5000
+    python bench.py writes --participants 10000
+    python bench.py stats --stays 20000
+    python bench.py grid --stays 5000
+    python bench.py ics --stays 20000
+    python bench.py snapshots --stays 20000
+    python bench.py names --stays 20000
+    python bench.py vouchers --vouchers 50
+    python bench.py batch --vouchers 500 --workers 8
+    python bench.py pdfwarm --repeat 20
+    python bench.py template --vouchers 200
+    python bench.py pdf --repeat 20 --json pdf_v2.json --baseline pdf_v1.json
+
+Každý scénář si založí dočasnou lokalitu (SQLite + config) se syntetickými
+rezervacemi, skutečné databáze lokalit zůstávají netknuté.
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing as mp
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+# bez hlášek o chybějícím ScriptRunContext / spuštění mimo `streamlit run`
+logging.disable(logging.WARNING)
+
+import pandas as pd
+import streamlit as st
+
+import app
+
+BENCH_SITE = "_bench"
+
+
+@contextmanager
+def temp_site(config_src: str = app.SITES["Hejnice"]["config"]):
+    """Dočasná lokalita: prázdná DB se schématem + kopie configu, aktivní v session_state."""
+    with tempfile.TemporaryDirectory(prefix="hejnice_bench_") as tmp:
+        db_path = str(Path(tmp) / "bench.db")
+        cfg_path = str(Path(tmp) / "config_bench.csv")
+        Path(cfg_path).write_bytes(Path(config_src).read_bytes())
+        app.SITES[BENCH_SITE] = {"db": db_path, "config": cfg_path}
+        st.session_state["site"] = BENCH_SITE
+        # feedy a snapshoty po zápisech mimo repozitář
+        ics_dir, app.ICS_DIR = app.ICS_DIR, Path(tmp) / "ics"
+        snap_dir, app.SNAPSHOT_DIR = app.SNAPSHOT_DIR, Path(tmp) / "snapshots"
+        try:
+            app.init_db()
+            yield db_path
+        finally:
+            app._feed_refresher().wait()
+            app.ICS_DIR, app.SNAPSHOT_DIR = ics_dir, snap_dir
+            app._conn_pool(db_path).close_all()
+            app._conn_pools().pop(db_path, None)
+            app._schema_ready.clear()
+            st.session_state.pop("site", None)
+            app.SITES.pop(BENCH_SITE, None)
+
+
+def seed_stays(db_path: str, n_stays: int, first_year: int = 2020, seed: int = 1) -> date:
+    """
+    Naplní DB náhodnými rezervacemi (1–3 pokoje, 1–14 nocí, mezery 0–3 dny).
+    Pobyty v jednom pokoji se nepřekrývají (room_nights by kolizi odmítl), takže
+    s počtem pobytů roste pokrytý rozsah let. Osob v pokoji s KAPACITOU je nejvýš
+    tolik, kolik má lůžek (room_capacity je naplněná už od init_db). Vrací den
+    uprostřed rozsahu.
+    """
+    rnd = random.Random(seed)
+    cfg = app.get_cfg()
+    room_types = cfg["POKOJ"].tolist()
+    caps = app.room_capacities(cfg) or {}
+    free_from = {rt: date(first_year, 1, 1) for rt in room_types}
+    res_rows, room_rows = [], []
+    i = 0
+    while len(room_rows) < n_stays:
+        i += 1
+        bid = f"RES-BENCH-{i:06d}"
+        rooms = rnd.sample(room_types, rnd.randint(1, min(3, len(room_types))))
+        a = max(free_from[rt] for rt in rooms) + timedelta(days=rnd.randint(0, 3))
+        d = a + timedelta(days=rnd.randint(1, 14))
+        a_s, d_s = a.strftime("%d.%m.%Y"), d.strftime("%d.%m.%Y")
+        res_rows.append((bid, f"Host {i}", a_s, d_s, (d - a).days, 0))
+        for idx, rt in enumerate(rooms, start=1):
+            free_from[rt] = d
+            emp, gst = rnd.randint(0, 2), rnd.randint(0, 2)
+            if caps.get(rt, 0) > 0:
+                emp = min(emp, caps[rt])
+                gst = min(gst, caps[rt] - emp)
+            room_rows.append((bid, idx, rt, emp, gst, a_s, d_s, (d - a).days,
+                              float((d - a).days * rnd.choice([250, 400, 650]))))
+    with sqlite3.connect(db_path) as con:
+        con.executemany("INSERT INTO reservations(id, guest_name, global_arrival, global_departure, global_nights, per_room) "
+                        "VALUES(?,?,?,?,?,?)", res_rows)
+        con.executemany("INSERT INTO reservation_rooms(id, room_idx, room_type, employees, guests, arrival, departure, nights, price) "
+                        "VALUES(?,?,?,?,?,?,?,?,?)", room_rows)
+        con.commit()
+    first = date(first_year, 1, 1)
+    return first + (max(free_from.values()) - first) / 2
+
+
+def timed(fn, repeat: int) -> dict:
+    """Spustí fn `repeat`× a vrátí časy v ms (min/median/max)."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return {"min_ms": round(min(times), 3), "median_ms": round(statistics.median(times), 3),
+            "max_ms": round(max(times), 3), "repeat": repeat}
+
+
+# ---------- SCÉNÁŘE ----------
+
+def _legacy_availability_matrix(year: int, month: int) -> pd.DataFrame:
+    """Původní algoritmus (rozbalení nocí + maska přes celé `occ` pro každý pokoj×den) – jen pro srovnání."""
+    import calendar
+    room_types = app.get_cfg()["POKOJ"].tolist()
+    with app.get_conn() as con:
+        rows = pd.read_sql_query("SELECT room_type, arrival, departure FROM reservation_rooms "
+                                 "WHERE room_type IS NOT NULL AND room_type <> ''", con)
+    recs = []
+    for _, r in rows.iterrows():
+        a = app._parse_cz_date(str(r["arrival"]))
+        d = app._parse_cz_date(str(r["departure"]))
+        if not a or not d:
+            continue
+        curr = a
+        while curr < d:
+            recs.append({"date": curr, "room_type": str(r["room_type"]), "occupied": 1})
+            curr += timedelta(days=1)
+    occ = pd.DataFrame(recs, columns=["date", "room_type", "occupied"])
+    occ = occ.groupby(["date", "room_type"], as_index=False)["occupied"].max()
+    days = [date(year, month, d) for d in range(1, calendar.monthrange(year, month)[1] + 1)]
+    data = {}
+    for rt in room_types:
+        data[rt] = [occ[(occ["room_type"] == rt) & (occ["date"] == d) & (occ["occupied"] == 1)].empty for d in days]
+    df = pd.DataFrame(data, index=days).T
+    df.columns = [d.day for d in days]
+    return df
+
+
+def bench_availability(args) -> dict:
+    """availability_matrix: původní maskovací smyčka vs. bitmapa nad měsíčním oknem."""
+    with temp_site() as db_path:
+        mid = seed_stays(db_path, args.stays)
+        y, m = mid.year, mid.month
+        new = app._availability_from_load(app._compute_occupancy(y, m))
+        old = _legacy_availability_matrix(y, m)
+        if not new.equals(old):
+            raise SystemExit("availability_matrix: výsledek se liší od původního algoritmu!")
+        return {
+            "stays": args.stays,
+            "legacy": timed(lambda: _legacy_availability_matrix(y, m), max(1, args.repeat // 5)),
+            "bitmap": timed(lambda: app._availability_from_load(app._compute_occupancy(y, m)), args.repeat),
+        }
+
+
+def bench_cache(args) -> dict:
+    """availability_matrix přes procesní cache: miss (přepočet) vs. hit, zneplatnění zápisem."""
+    with temp_site() as db_path:
+        mid = seed_stays(db_path, args.stays)
+        y, m = mid.year, mid.month
+        cache = app._availability_cache()
+
+        def miss():
+            app._write_counter().bump(db_path)  # jako by proběhl zápis
+            return app.availability_matrix(y, m)
+
+        results = {"stays": args.stays,
+                   "miss": timed(miss, args.repeat),
+                   "hit": timed(lambda: app.availability_matrix(y, m), args.repeat)}
+
+        # skutečný zápis musí cache zneplatnit a další čtení už vidí novou rezervaci
+        room_type = app.get_cfg()["POKOJ"].iloc[0]
+        with app.write_transaction() as con:
+            con.execute("DELETE FROM reservations")
+        a_s, d_s = date(y, m, 10).strftime("%d.%m.%Y"), date(y, m, 12).strftime("%d.%m.%Y")
+        app.insert_booking({"id": "RES-CACHE", "guest_name": "Cache", "global_arrival": a_s,
+                            "global_departure": d_s, "global_nights": 2, "per_room": False},
+                           [{"room_idx": 1, "room_type": room_type, "employees": 1, "guests": 0,
+                             "arrival": a_s, "departure": d_s, "nights": 2, "price": 0.0}])
+        df = app.availability_matrix(y, m)
+        if df.loc[room_type, 10] or not df.loc[room_type, 12] or not df.drop(index=room_type).all().all():
+            raise SystemExit("availability_matrix po zápisu nevrací aktuální data!")
+        results["counters"] = cache.stats()
+        return results
+
+
+def _brute_force_windows(rooms: list, nights: int, start: date, end: date) -> list:
+    """Okna hledaná „ručně“: pro každý příjezd projít noci a pokoje přes obsazenost z DB."""
+    with app.get_conn() as con:
+        taken = set(con.execute("SELECT room_type, night FROM room_nights").fetchall())
+    out = []
+    arrival = start
+    while arrival + timedelta(days=nights) <= end:
+        nights_iso = [(arrival + timedelta(days=k)).isoformat() for k in range(nights)]
+        if all((rt, n) not in taken for rt in rooms for n in nights_iso):
+            out.append(arrival)
+        arrival += timedelta(days=1)
+    return out
+
+
+def bench_windows(args) -> dict:
+    """find_free_windows přes víceletý horizont: správnost proti hrubé síle + čas."""
+    with temp_site() as db_path:
+        mid = seed_stays(db_path, args.stays)
+        start, end = date(mid.year - 2, 1, 1), date(mid.year + 2, 1, 1)
+        room_types = app.get_cfg()["POKOJ"].tolist()
+        results = {"stays": args.stays, "horizon_days": (end - start).days, "nights": args.nights}
+        for label, rooms in (("one_room", room_types[:1]), ("two_rooms", room_types[-2:])):
+            found = [w["arrival"] for w in app.find_free_windows(rooms, args.nights, start, end, limit=10 ** 6)]
+            if found != _brute_force_windows(rooms, args.nights, start, end):
+                raise SystemExit(f"find_free_windows ({label}) se liší od hrubé síly!")
+            results[label] = {"windows": len(found),
+                              "all": timed(lambda: app.find_free_windows(rooms, args.nights, start, end), args.repeat),
+                              "first": timed(lambda: app.find_free_windows(rooms, args.nights, start, end,
+                                                                           first_only=True), args.repeat)}
+        return results
+
+
+def _exhaustive_allocation(employees: int, guests: int, arrival: date, departure: date, objective: str,
+                           preferred: tuple = ()):
+    """Nejlepší klíč přes všechny podmnožiny pokojů s volnými lůžky (bez ořezávání) – pro kontrolu allocate_rooms."""
+    cfg = app.get_cfg()
+    caps, prices = app.room_capacities(cfg), app._room_prices(cfg)
+    room_types = cfg["POKOJ"].tolist()
+    with app.get_conn() as con:
+        taken = con.execute("SELECT room_type, night, SUM(people) FROM room_nights "
+                            "WHERE night >= ? AND night < ? GROUP BY room_type, night",
+                            (arrival.isoformat(), departure.isoformat())).fetchall()
+    full = dict(caps)
+    for rt, _, people in taken:
+        caps[rt] = min(caps[rt], full[rt] - people)
+    free = [rt for rt in room_types if caps[rt] > 0]
+    nights, best = (departure - arrival).days, None
+    for k in range(1, app.MAX_ROOMS + 1):
+        for combo in itertools.combinations(free, k):
+            if sum(caps[rt] for rt in combo) < employees + guests:
+                continue
+            price, filled = app._fill_rooms(list(combo), employees, guests, caps, prices)
+            price *= nights
+            key = (len(filled), price) if objective == "rooms" else (price, len(filled))
+            key += (sum(r["room_type"] not in preferred for r in filled),)
+            best = key if best is None or key < best else best
+    return best
+
+
+def bench_allocate(args) -> dict:
+    """allocate_rooms (branch-and-bound) vs. úplný průchod podmnožin: shoda optima a čas."""
+    rnd = random.Random(7)
+    with tempfile.TemporaryDirectory(prefix="hejnice_bench_cfg_") as tmp:
+        cfg_path = Path(tmp) / "config_alloc.csv"
+        lines = ["POKOJ,CENA_Z,CENA_N,KAPACITA"]
+        for i in range(1, args.rooms + 1):
+            lines.append(f"Pokoj {i},{rnd.choice([100, 150, 200])},{rnd.choice([250, 300, 400])},{rnd.randint(1, 6)}")
+        cfg_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        with temp_site(str(cfg_path)) as db_path:
+            mid = seed_stays(db_path, args.stays)
+            results = {"config_rooms": args.rooms, "stays": args.stays, "cases": 0}
+            cases = []
+            for _ in range(40):
+                a = mid + timedelta(days=rnd.randrange(-300, 300))
+                d = a + timedelta(days=rnd.randint(1, 7))
+                pref = tuple(rnd.sample(app.get_cfg()["POKOJ"].tolist(), rnd.randint(0, 3)))
+                cases.append((rnd.randint(0, 8), rnd.randint(1, 14), a, d, pref))
+            for objective in app.ALLOCATION_OBJECTIVES:
+                for e, g, a, d, pref in cases:
+                    plan = app.allocate_rooms(e, g, a, d, preferred=list(pref), objective=objective)
+                    expected = _exhaustive_allocation(e, g, a, d, objective, pref)
+                    got = None
+                    if plan is not None:
+                        got = (len(plan["rooms"]), plan["price"]) if objective == "rooms" else (plan["price"], len(plan["rooms"]))
+                        got += (sum(r["room_type"] not in pref for r in plan["rooms"]),)
+                    if got != expected:
+                        raise SystemExit(f"allocate_rooms({objective}) {e}+{g} {a}–{d}: {got} != {expected}")
+                    results["cases"] += 1
+                e, g, a, d, pref = max(cases, key=lambda c: c[0] + c[1])
+                results[objective] = {
+                    "branch_and_bound": timed(lambda: app.allocate_rooms(e, g, a, d, preferred=list(pref),
+                                                                         objective=objective), args.repeat),
+                    "exhaustive": timed(lambda: _exhaustive_allocation(e, g, a, d, objective, pref),
+                                        max(1, args.repeat // 5)),
+                }
+            return results
+
+
+def _overlapping_pairs(db_path: str) -> int:
+    """Počet dvojic pobytů ve stejném pokoji, které se časově překrývají (má být 0)."""
+    with sqlite3.connect(db_path) as con:
+        return con.execute("""
+            SELECT COUNT(*) FROM reservation_rooms a
+            JOIN reservation_rooms b
+              ON a.room_type = b.room_type AND a.rowid < b.rowid
+             AND a.arrival_iso < b.departure_iso AND b.arrival_iso < a.departure_iso
+        """).fetchone()[0]
+
+
+def bench_stress(args) -> dict:
+    """
+    Souběžné ukládání: vlákna bombardují stejný pokoj v překrývajících se termínech.
+    Ověří, že v DB neskončí žádný překryv a že p99 latence uložení je pod limitem.
+    """
+    with temp_site() as db_path:
+        room_type = app.get_cfg()["POKOJ"].iloc[0]
+        origin = date(2030, 7, 1)
+        latencies, outcome = [], {"saved": 0, "conflict": 0, "error": 0}
+        lock = threading.Lock()
+        go = threading.Barrier(args.threads)
+
+        def worker(tid: int):
+            rnd = random.Random(tid)
+            go.wait()
+            for k in range(args.attempts):
+                a = origin + timedelta(days=rnd.randrange(28))
+                d = a + timedelta(days=rnd.randint(1, 4))
+                a_s, d_s = a.strftime("%d.%m.%Y"), d.strftime("%d.%m.%Y")
+                header = {"id": f"RES-STRESS-{tid:03d}-{k:04d}", "guest_name": f"Vlákno {tid}",
+                          "global_arrival": a_s, "global_departure": d_s,
+                          "global_nights": (d - a).days, "per_room": False}
+                rooms = [{"room_idx": 1, "room_type": room_type, "employees": 1, "guests": 0,
+                          "arrival": a_s, "departure": d_s, "nights": (d - a).days, "price": 0.0}]
+                t0 = time.perf_counter()
+                try:
+                    app.insert_or_replace_booking(header, rooms, overwrite=False)
+                    key = "saved"
+                except ValueError:
+                    key = "conflict"
+                except Exception:
+                    key = "error"
+                ms = (time.perf_counter() - t0) * 1000.0
+                with lock:
+                    latencies.append(ms)
+                    outcome[key] += 1
+
+        threads = [threading.Thread(target=worker, args=(t,)) for t in range(args.threads)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t0
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        overlaps = _overlapping_pairs(db_path)
+        result = {
+            "threads": args.threads, "attempts_per_thread": args.attempts, **outcome,
+            "overlapping_pairs": overlaps,
+            "p50_ms": round(statistics.median(latencies), 3), "p99_ms": round(p99, 3),
+            "p99_limit_ms": args.p99_ms, "wall_s": round(wall, 3),
+        }
+        if overlaps:
+            raise SystemExit(f"Double booking: {overlaps} překrývajících se pobytů!\n{result}")
+        if outcome["error"]:
+            raise SystemExit(f"Chyby při ukládání (zamčená DB?): {result}")
+        if p99 > args.p99_ms:
+            raise SystemExit(f"p99 latence {p99:.1f} ms překročila limit {args.p99_ms} ms\n{result}")
+        return result
+
+
+def _render_page_queries(booking_ids: list, year: int, month: int) -> None:
+    """DB dotazy, které dělá jedno vykreslení stránky Účastníci/Poukaz + měsíční kalendář."""
+    with app.get_conn() as con:
+        con.execute("SELECT id, guest_name FROM reservations ORDER BY id DESC").fetchall()
+    for bid in booking_ids:
+        app.fetch_booking_rooms(bid)
+        app.count_people_in_booking(bid)
+        app.fetch_detail(bid)
+        app.fetch_participants(bid)
+    app.availability_matrix(year, month)
+
+
+def bench_render(args) -> dict:
+    """Vykreslení stránky: nové spojení na každý helper (původní get_conn) vs. sdílený pool."""
+    with temp_site() as db_path:
+        mid = seed_stays(db_path, args.stays)
+        with sqlite3.connect(db_path) as con:
+            ids = [r[0] for r in con.execute("SELECT id FROM reservations LIMIT 3")]
+
+        def unpooled_conn():
+            # původní chování: sqlite3.connect() při každém volání, bez pragma
+            return sqlite3.connect(db_path, check_same_thread=False)
+
+        pooled_conn = app.get_conn
+        app.get_conn = unpooled_conn
+        try:
+            before = timed(lambda: _render_page_queries(ids, mid.year, mid.month), args.repeat)
+        finally:
+            app.get_conn = pooled_conn
+        after = timed(lambda: _render_page_queries(ids, mid.year, mid.month), args.repeat)
+        with sqlite3.connect(db_path) as con:
+            mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+        return {"stays": args.stays, "queries_per_render": 2 + 4 * len(ids),
+                "connect_per_call": before, "pooled": after, "journal_mode": mode}
+
+
+def _legacy_grid_html(year: int, month: int, load: pd.DataFrame, name_map: dict) -> str:
+    """Původní mřížka: `html +=` a celý inline styl v každé buňce – jen pro srovnání."""
+    import calendar
+    caps = dict(zip(load.index, app.room_capacity_vector(load.index.tolist())))
+    last_day = calendar.monthrange(year, month)[1]
+    cell_css = "border:1px solid #ccc;padding:6px;text-align:center;font-size:11px;line-height:1.05;"
+    html = "<table style='border-collapse:collapse;width:100%;font-size:13px;'>"
+    html += "<tr><th style='border:1px solid #ccc;padding:4px 2px;text-align:left;'>Pokoj</th>"
+    for d in range(1, last_day + 1):
+        html += f"<th style='border:1px solid #ccc;padding:2px;text-align:center;width:28px'>{d}</th>"
+    html += "</tr>"
+    for room, row in load.iterrows():
+        html += f"<tr><td style='border:1px solid #ccc;padding:4px 6px;text-align:left;font-weight:bold;white-space:nowrap'>{room}</td>"
+        cap = int(caps[room])
+        for d in range(1, last_day + 1):
+            val = int(row.get(d, 0))
+            if val == 0:
+                html += f"<td style='{cell_css}background:#2ecc71;color:#0b3d0b' title='Volno'></td>"
+                continue
+            full = val >= max(cap, 1)
+            label = "" if full else f"{val}/{cap}"
+            title = "Obsazeno" if full else f"Obsazeno {val} z {cap} lůžek"
+            nm = name_map.get((room, date(year, month, d)))
+            if nm:
+                title = nm if full else f"{title}: {nm}"
+                label = nm if len(nm) <= 12 else nm[:12] + "…"
+            bg = "#e74c3c;color:#fff" if full else "#f5b041;color:#3d2a0b"
+            html += f"<td style='{cell_css}background:{bg}' title='{title}'>{label}</td>"
+        html += "</tr>"
+    return html + "</table>"
+
+
+def bench_grid(args) -> dict:
+    """Roční pohled: velikost HTML a čas sestavení – původní inline styly vs. třídy + cache fragmentů."""
+    with temp_site() as db_path:
+        y = seed_stays(db_path, args.stays).year
+        first, nxt = date(y, 1, 1), date(y + 1, 1, 1)
+        loads = [app.occupancy_matrix(y, m) for m in range(1, 13)]
+        results = {"stays": args.stays, "rooms": len(loads[0])}
+        for show_names in (False, True):
+            names = app.occupied_name_map(first, nxt) if show_names else {}
+            legacy = [_legacy_grid_html(y, m, loads[m - 1], names) for m in range(1, 13)]
+            new = [app.availability_grid_html(y, m, loads[m - 1], names) for m in range(1, 13)]
+
+            def cold():
+                app._grid_html_cache.clear()
+                return [app.availability_grid_fragment(y, m, show_names, loads[m - 1], names) for m in range(1, 13)]
+
+            if cold() != new:
+                raise SystemExit("availability_grid_fragment nevrací stejné HTML jako availability_grid_html!")
+            results["names" if show_names else "public"] = {
+                "legacy_bytes": sum(len(h.encode("utf-8")) for h in legacy),
+                "classes_bytes": len(app.AVAILABILITY_GRID_CSS.encode("utf-8")) + sum(len(h.encode("utf-8")) for h in new),
+                "legacy": timed(lambda: [_legacy_grid_html(y, m, loads[m - 1], names) for m in range(1, 13)], args.repeat),
+                "classes": timed(lambda: [app.availability_grid_html(y, m, loads[m - 1], names) for m in range(1, 13)], args.repeat),
+                "cold_cache": timed(cold, args.repeat),
+                "warm_cache": timed(lambda: [app.availability_grid_fragment(y, m, show_names) for m in range(1, 13)], args.repeat),
+            }
+        return results
+
+
+def bench_ics(args) -> dict:
+    """ICS feedy lokality (vše + každý pokoj) jedním průchodem: čas, velikost a paměťová špička."""
+    with temp_site() as db_path:
+        seed_stays(db_path, args.stays)
+        cfg_path = app.SITES[BENCH_SITE]["config"]
+        past_days, app.ICS_FEED_PAST_DAYS = app.ICS_FEED_PAST_DAYS, 10 ** 5  # všechny pobyty
+        try:
+            tracemalloc.start()
+            counts = app.write_ics_feeds(BENCH_SITE, db_path, cfg_path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            site_feed = app.ics_feed_paths(BENCH_SITE, [])[None]
+            with sqlite3.connect(db_path) as con:
+                n_rows = con.execute("SELECT COUNT(*) FROM reservation_rooms").fetchone()[0]
+            if counts[str(site_feed)] != n_rows:
+                raise SystemExit("ICS feed lokality nemá událost pro každý pobyt!")
+            return {
+                "stays": args.stays,
+                "events": counts[str(site_feed)],
+                "feeds": len(counts),
+                "site_feed_bytes": site_feed.stat().st_size,
+                "peak_mem_kb": round(peak / 1024, 1),
+                "write_feeds": timed(lambda: app.write_ics_feeds(BENCH_SITE, db_path, cfg_path), args.repeat),
+                "window_90d": timed(lambda: "".join(app.iter_ics(date(2021, 1, 1), date(2021, 4, 1))), args.repeat),
+            }
+        finally:
+            app.ICS_FEED_PAST_DAYS = past_days
+
+
+def bench_snapshots(args) -> dict:
+    """Veřejný roční pohled: snapshoty ze souborů (bez DB) vs. výpočet z DB; stavba snapshotů."""
+    with temp_site() as db_path:
+        # pobyty kolem letošního roku, ať snapshoty (leden … +18 měsíců) nejsou prázdné
+        seed_stays(db_path, args.stays, first_year=date.today().year - 1)
+        cfg_path = app.SITES[BENCH_SITE]["config"]
+        build = timed(lambda: app.write_public_snapshots(BENCH_SITE, db_path, cfg_path), args.repeat)
+        months = app.public_snapshot_manifest()["months"]
+        for name in months:
+            y, m = map(int, name.split("-"))
+            if app.public_snapshot_html(y, m) != app.availability_grid_fragment(y, m, show_names=False):
+                raise SystemExit(f"Snapshot {name} se liší od mřížky z DB!")
+        year = date.today().year
+
+        def db_year():
+            app._grid_html_cache.clear()
+            app._availability_cache.clear()
+            return [app.availability_grid_fragment(year, m, show_names=False) for m in range(1, 13)]
+
+        def snapshot_year():
+            return [app.public_snapshot_html(year, m) for m in range(1, 13)]
+
+        # veřejné čtení nesmí otevřít spojení na DB
+        pool, get_conn = app._conn_pool, app.get_conn
+
+        def no_db(*_a, **_k):
+            raise SystemExit("Veřejný snapshot sáhl do DB!")
+
+        app._conn_pool, app.get_conn = no_db, no_db
+        try:
+            snapshot_year()
+            snapshot = timed(snapshot_year, args.repeat)
+        finally:
+            app._conn_pool, app.get_conn = pool, get_conn
+        return {"stays": args.stays, "months": len(months), "build": build,
+                "db_uncached": timed(db_year, args.repeat), "snapshot": snapshot}
+
+
+def bench_names(args) -> dict:
+    """Popisky obsazených nocí pro admina: celá historie vs. roční index v cache (12 měsíčních volání)."""
+    rnd = random.Random(3)
+    with temp_site() as db_path:
+        y = seed_stays(db_path, args.stays).year
+        for _ in range(20):
+            a = date(y - 1, 1, 1) + timedelta(days=rnd.randint(0, 700))
+            b = a + timedelta(days=rnd.randint(1, 120))
+            if app.occupied_name_map(a, b) != app._query_name_map(a, b):
+                raise SystemExit(f"occupied_name_map({a}, {b}) se liší od přímého dotazu!")
+
+        def months_cold():
+            app._name_index_cache.clear()
+            return [app.occupied_name_map(*app._month_bounds(y, m)) for m in range(1, 13)]
+
+        months_cold()
+        return {
+            "stays": args.stays,
+            "full_history": timed(lambda: app.occupied_name_map(), max(1, args.repeat // 5)),
+            "per_month_queries": timed(lambda: [app._query_name_map(*app._month_bounds(y, m)) for m in range(1, 13)],
+                                       args.repeat),
+            "year_index_cold": timed(months_cold, args.repeat),
+            "year_index_warm": timed(lambda: [app.occupied_name_map(*app._month_bounds(y, m)) for m in range(1, 13)],
+                                     args.repeat),
+        }
+
+
+def _use_repo_fonts() -> None:
+    """Bez static/fonts (mimo nasazení) vezme PDF fonty DejaVu přímo z adresáře aplikace."""
+    for name in ("FONT_REG", "FONT_BLD", "FONT_ITA", "FONT_BI"):
+        path = getattr(app, name)
+        if not path.exists():
+            setattr(app, name, app.BASE_DIR / path.name)
+
+
+def bench_vouchers(args) -> dict:
+    """Poukazy: sestavení PDF vs. zásah v paměti vs. zásah na disku; úprava rezervace = nový klíč."""
+    _use_repo_fonts()
+    with temp_site() as db_path, tempfile.TemporaryDirectory(prefix="hejnice_pdf_") as pdf_dir:
+        seed_stays(db_path, args.stays)
+        with sqlite3.connect(db_path) as con:
+            ids = [r[0] for r in con.execute("SELECT id FROM reservations ORDER BY id LIMIT ?", (args.vouchers,))]
+        cache = app.PdfCache(len(ids), Path(pdf_dir))
+        cached = app._voucher_cache
+        app._voucher_cache = lambda: cache
+        try:
+            cold = timed(lambda: [app.create_voucher_pdf_bytes(i) for i in ids], 1)
+            warm = timed(lambda: [app.create_voucher_pdf_bytes(i) for i in ids], args.repeat)
+            cache._items.clear()  # jen disk
+            disk = timed(lambda: [app.create_voucher_pdf_bytes(i) for i in ids], 1)
+            before = cache.stats()["misses"]
+            with app.write_transaction() as con:
+                con.execute("UPDATE reservations SET guest_name = guest_name || ' (upraveno)' WHERE id = ?", (ids[0],))
+            app.create_voucher_pdf_bytes(ids[0])
+            if cache.stats()["misses"] != before + 1:
+                raise SystemExit("Úprava rezervace nezneplatnila poukaz v cache!")
+            return {"vouchers": len(ids), "build": cold, "memory_hit": warm, "disk_hit": disk,
+                    "pdf_bytes": cache.stats()["bytes"] // max(1, cache.stats()["items"]), "cache": cache.stats()}
+        finally:
+            app._voucher_cache = cached
+
+
+def _seed_voucher_batch(db_path: str, args) -> list:
+    """Pobyty + účastníci u každé druhé rezervace (dávka má oba druhy poukazů); vrací ID rezervací."""
+    seed_stays(db_path, args.stays)
+    ids = app.voucher_ids_arriving(date(2000, 1, 1), date(2100, 1, 1))[:args.vouchers]
+    with sqlite3.connect(db_path) as con:
+        con.executemany("INSERT INTO participants(id, person_idx, name, is_employee, nights, room_type, price) "
+                        "VALUES(?,?,?,?,?,?,?)",
+                        [(bid, k, f"Účastník {k}", k % 2, 3, "Pokoj č.1", 250.0)
+                         for bid in ids[::2] for k in range(1, 5)])
+    return ids
+
+
+def bench_batch(args) -> dict:
+    """Hromadné poukazy: 1 proces vs. --workers procesů nad stejnou dávkou (vždy studená cache)."""
+    _use_repo_fonts()
+    with temp_site() as db_path:
+        ids = _seed_voucher_batch(db_path, args)
+        ticks = []
+        out = {"bookings": len(ids), "renderer": args.renderer or app.VOUCHER_RENDERER}
+        for workers in sorted({1, args.workers}):
+            t0 = time.perf_counter()
+            zip_bytes, summary = app.build_voucher_batch(ids, workers=workers, cache=app.PdfCache(0),
+                                                         progress=lambda d, t: ticks.append(d),
+                                                         renderer=args.renderer)
+            wall = time.perf_counter() - t0
+            if summary["errors"] or summary["cached"]:
+                raise SystemExit(f"Dávka: chyby / nečekané zásahy cache: {summary}")
+            out[f"workers_{summary['workers']}"] = {"wall_s": round(wall, 3), "pdfs": summary["vouchers"],
+                                                    "pdf_per_s": round(summary["vouchers"] / wall, 1),
+                                                    "zip_bytes": len(zip_bytes)}
+        runs = [v for k, v in out.items() if k.startswith("workers_")]
+        out["speedup"] = round(runs[-1]["pdf_per_s"] / runs[0]["pdf_per_s"], 2)
+        out["cpu_count"] = os.cpu_count()
+        out["progress_calls"] = len(ticks)
+        return out
+
+
+def bench_template(args) -> dict:
+    """
+    Šablonový renderer vs. platypus: CPU čas a velikost na poukaz (jednotlivá
+    PDF, teplý proces) a sloučené PDF celé dávky. Kontroluje, že oba renderery
+    kreslí stejný text na stejná místa (nekomprimovaný obsah stránky).
+    """
+    _use_repo_fonts()
+    with temp_site() as db_path:
+        ids = _seed_voucher_batch(db_path, args)
+        jobs, errors = app._voucher_batch_jobs(ids, True)
+        if errors:
+            raise SystemExit(f"Dávka: {errors}")
+        out = {"bookings": len(ids), "vouchers": len(jobs)}
+        for renderer in app.VOUCHER_RENDERERS:
+            app._render_voucher_job(*jobs[0][2:], renderer)   # zahřátí (fonty, šablony)
+            sizes = []
+            c0 = time.process_time()
+            for _, _, kind, hdr, rows in jobs:
+                sizes.append(len(app._render_voucher_job(kind, hdr, rows, renderer)))
+            cpu = time.process_time() - c0
+            out[renderer] = {"cpu_ms_per_voucher": round(cpu * 1000.0 / len(jobs), 3),
+                             "bytes_per_voucher": round(statistics.mean(sizes)),
+                             "total_bytes": sum(sizes)}
+        c0 = time.process_time()
+        merged, _ = app.render_vouchers_template([job[2:] for job in jobs])
+        cpu = time.process_time() - c0
+        out["merged_pdf"] = {"cpu_ms_per_voucher": round(cpu * 1000.0 / len(jobs), 3), "bytes": len(merged),
+                             "bytes_per_voucher": round(len(merged) / len(jobs))}
+        out["cpu_speedup"] = round(out["platypus"]["cpu_ms_per_voucher"] / out["sablona"]["cpu_ms_per_voucher"], 2)
+        out["size_ratio"] = round(out["sablona"]["total_bytes"] / out["platypus"]["total_bytes"], 3)
+        out["merged_size_ratio"] = round(len(merged) / out["platypus"]["total_bytes"], 3)
+
+        # stejný vzhled: texty a jejich pozice ze stránky (platypus je kreslí relativně k cm -> porovnáme množiny textů)
+        from reportlab import rl_config
+        compression = rl_config.pageCompression
+        rl_config.pageCompression = 0
+        try:
+            texts = {r: _pdf_texts(app._render_voucher_job(*jobs[1][2:], r)) for r in app.VOUCHER_RENDERERS}
+        finally:
+            rl_config.pageCompression = compression
+        if texts["platypus"] != texts["sablona"]:
+            raise SystemExit(f"Renderery se liší v textu: {texts['platypus'] ^ texts['sablona']}")
+        out["same_text"] = True
+        return out
+
+
+def _pdf_texts(pdf: bytes) -> set:
+    """Texty z Tj operátorů nekomprimovaného PDF (bez razítka „Vystaveno“)."""
+    import re
+    found = set()
+    for stream in re.findall(rb"stream\r?\n(.*?)endstream", pdf, re.S):
+        if b" Tj" in stream and b"BT" in stream:
+            found.update(t for t in re.findall(rb"\((.*?)\) Tj", stream) if not t.startswith(b"Vystaveno"))
+    return found
+
+
+def _voucher_latency_probe(workdir: str, hdr: tuple, rooms: list, repeat: int) -> dict:
+    """
+    Běží v čerstvém interpretu (spawn): první poukaz platí registr PDF zdrojů
+    (parsování TTF, stylesheet, dekódování loga), další už jen sestavení.
+    """
+    app.VOUCHER_LOGO = Path(workdir) / "static" / "zoo_logo.png"  # syntetické logo
+    _use_repo_fonts()
+    t0 = time.perf_counter()
+    app._build_voucher_pdf(hdr, rooms)
+    cold = (time.perf_counter() - t0) * 1000.0
+    warm = timed(lambda: app._build_voucher_pdf(hdr, rooms), repeat)
+    init = timed(app.PdfResources, 3)  # fonty už registrované -> jen styly + logo
+    return {"cold_first_ms": round(cold, 3), "warm": warm, "registry_rebuild": init,
+            "logo_px": list(app.pdf_resources().logo.getSize())}
+
+
+@contextmanager
+def logo_workdir():
+    """Dočasný adresář se static/zoo_logo.png (2400×1200 px), na který probe v čerstvém procesu nasměruje VOUCHER_LOGO."""
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory(prefix="hejnice_pdfres_") as workdir:
+        (Path(workdir) / "static").mkdir()
+        Image.new("RGB", (2400, 1200), (30, 120, 60)).save(Path(workdir) / "static" / "zoo_logo.png")
+        yield workdir
+
+
+def bench_pdfwarm(args) -> dict:
+    """Poukaz ve studeném vs. teplém procesu (registr PDF zdrojů), logo 2400×1200 px."""
+    hdr = ("RES-BENCH-000001", "Host Příliš Žluťoučký", "01.07.2025", "08.07.2025", 7, 0)
+    rooms = [(i, f"Pokoj č.{i}", 1, 1, "01.07.2025", "08.07.2025", 7, 2800.0) for i in range(1, 4)]
+    with logo_workdir() as workdir:
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+            out = pool.submit(_voucher_latency_probe, workdir, hdr, rooms, args.repeat).result()
+    out["cold_over_warm"] = round(out["cold_first_ms"] / out["warm"]["median_ms"], 1)
+    return out
+
+
+# případ -> (pokojů, účastníků); 150 účastníků = poukaz přes několik stran
+PDF_CASES = {
+    "1_pokoj": (1, 0),
+    "6_pokoju": (6, 0),
+    "150_ucastniku": (2, 150),
+}
+
+
+def _seed_pdf_cases(db_path: str) -> dict:
+    """Jedna rezervace pro každý případ z PDF_CASES (vlastní termín, bez kolizí); vrací {případ: ID}."""
+    room_types = app.get_cfg()["POKOJ"].tolist()
+    ids, res_rows, room_rows, part_rows = {}, [], [], []
+    for n, (case, (n_rooms, n_parts)) in enumerate(PDF_CASES.items()):
+        bid = f"RES-PDF-{n + 1:03d}"
+        a = date(2030, 1, 1) + timedelta(days=30 * n)
+        a_s, d_s = a.strftime("%d.%m.%Y"), (a + timedelta(days=5)).strftime("%d.%m.%Y")
+        res_rows.append((bid, "Přemysl Šťastný-Žluťoučký", a_s, d_s, 5, 0))
+        for idx, rt in enumerate(room_types[:n_rooms], start=1):
+            room_rows.append((bid, idx, rt, 1, 1, a_s, d_s, 5, 2000.0))
+        for k in range(1, n_parts + 1):
+            part_rows.append((bid, k, f"Účastník Čeněk Řehoř {k:03d}", int(k % 3 == 0), 5,
+                              room_types[k % n_rooms], 1250.0))
+        ids[case] = bid
+    with sqlite3.connect(db_path) as con:
+        con.executemany("INSERT INTO reservations(id, guest_name, global_arrival, global_departure, global_nights, per_room) "
+                        "VALUES(?,?,?,?,?,?)", res_rows)
+        con.executemany("INSERT INTO reservation_rooms(id, room_idx, room_type, employees, guests, arrival, departure, nights, price) "
+                        "VALUES(?,?,?,?,?,?,?,?,?)", room_rows)
+        con.executemany("INSERT INTO participants(id, person_idx, name, is_employee, nights, room_type, price) "
+                        "VALUES(?,?,?,?,?,?,?)", part_rows)
+        con.commit()
+    return ids
+
+
+def _max_rss_kb() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _pdf_probe(site: dict, workdir: str, booking_id: str, kind: str, renderer: str, repeat: int) -> dict:
+    """
+    Běží v čerstvém interpretu (spawn). Studený = první poukaz procesu (fonty,
+    styly, logo, šablona, spojení do DB); teplý = opakované sestavení s
+    vypnutou cache poukazů; cache_hit = totéž přes cache. Paměť: špička
+    tracemalloc jednoho teplého sestavení a nárůst max RSS studeným během.
+    """
+    app.VOUCHER_LOGO = Path(workdir) / "static" / "zoo_logo.png"
+    _use_repo_fonts()
+    app.SITES[BENCH_SITE] = site
+    st.session_state["site"] = BENCH_SITE
+    fn = app.create_voucher_pdf_bytes_participants if kind == "ucastnici" else app.create_voucher_pdf_bytes
+
+    rss0 = _max_rss_kb()
+    t0 = time.perf_counter()
+    pdf = fn(booking_id, renderer=renderer)
+    cold_ms = (time.perf_counter() - t0) * 1000.0
+    rss1 = _max_rss_kb()
+    cache_hit = timed(lambda: fn(booking_id, renderer=renderer), repeat)
+
+    cached = app._voucher_cache
+    app._voucher_cache = lambda: app.PdfCache(0)
+    try:
+        warm = timed(lambda: fn(booking_id, renderer=renderer), repeat)
+        tracemalloc.start()
+        fn(booking_id, renderer=renderer)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        app._voucher_cache = cached
+    return {
+        "bytes": len(pdf),
+        "pages": pdf.count(b"/Type /Page\n") + pdf.count(b"/Type /Page\r"),
+        "cold_ms": round(cold_ms, 3),
+        "cold_rss_growth_kb": (rss1 - rss0) if rss0 is not None else None,
+        "warm_build": warm,
+        "warm_peak_kb": round(peak / 1024.0, 1),
+        "cache_hit": cache_hit,
+    }
+
+
+def bench_pdf(args) -> dict:
+    """
+    Poukazy (create_voucher_pdf_bytes / _participants) pro syntetické rezervace
+    z PDF_CASES, každý renderer zvlášť: studený první poukaz v čerstvém procesu,
+    teplé sestavení, zásah cache, paměť a velikost PDF. Klíče výsledků jsou
+    stálé, aby šly porovnat JSONy dvou verzí (--baseline).
+    """
+    import reportlab
+
+    renderers = [args.renderer] if args.renderer else list(app.VOUCHER_RENDERERS)
+    with tempfile.TemporaryDirectory(prefix="hejnice_bench_cfg_") as tmp:
+        cfg_path = Path(tmp) / "config_pdf.csv"
+        cfg_path.write_text("POKOJ,CENA_Z,CENA_N,KAPACITA\n"
+                            + "".join(f"Pokoj č.{i},150,400,4\n" for i in range(1, 9)), encoding="utf-8")
+        with temp_site(str(cfg_path)) as db_path, logo_workdir() as workdir:
+            ids = _seed_pdf_cases(db_path)
+            site = dict(app.SITES[BENCH_SITE])
+            cases = {}
+            for case, bid in ids.items():
+                kinds = ["rezervace"] + (["ucastnici"] if PDF_CASES[case][1] else [])
+                for kind in kinds:
+                    for renderer in renderers:
+                        # nový proces pro každé měření -> „studený“ je opravdu první poukaz procesu
+                        with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as pool:
+                            res = pool.submit(_pdf_probe, site, workdir, bid, kind, renderer, args.repeat).result()
+                        cases.setdefault(case, {}).setdefault(kind, {})[renderer] = res
+    return {"reportlab": reportlab.Version, "cases": cases}
+
+
+def _synthetic_import(n_participants: int, group_size: int = 50) -> list:
+    """Skupiny po `group_size` účastnících, každá v jiném týdnu a pokoji (bez kolizí)."""
+    room_types = app.get_cfg()["POKOJ"].tolist()
+    bookings, k = [], 0
+    while k * group_size < n_participants:
+        a = date(2040, 1, 1) + timedelta(days=7 * (k // len(room_types)))
+        d = a + timedelta(days=5)
+        a_s, d_s = a.strftime("%d.%m.%Y"), d.strftime("%d.%m.%Y")
+        size = min(group_size, n_participants - k * group_size)
+        rt = room_types[k % len(room_types)]
+        bookings.append({
+            "header": {"id": f"RES-IMPORT-{k:05d}", "guest_name": f"Škola {k}", "global_arrival": a_s,
+                       "global_departure": d_s, "global_nights": 5, "per_room": False},
+            "rooms": [{"room_idx": 1, "room_type": rt, "employees": 2, "guests": size - 2,
+                       "arrival": a_s, "departure": d_s, "nights": 5, "price": 0.0}],
+            "participants": [{"person_idx": i, "name": f"Účastník {k}-{i}", "is_employee": i <= 2,
+                              "nights": 5, "room_type": rt, "price": 0.0} for i in range(1, size + 1)],
+        })
+        k += 1
+    return bookings
+
+
+def _legacy_insert_booking(header: dict, rooms: list) -> None:
+    """insert_booking před executemany (stejné spojení z poolu, řádky po jednom)."""
+    with app.get_conn() as con:
+        cur = con.cursor()
+        cur.execute("""
+            INSERT INTO reservations(id, guest_name, global_arrival, global_departure, global_nights, per_room)
+            VALUES(?,?,?,?,?,?)
+        """, (
+            header["id"],
+            header["guest_name"],
+            header.get("global_arrival"),
+            header.get("global_departure"),
+            header.get("global_nights", 0),
+            1 if header.get("per_room") else 0
+        ))
+        for r in rooms:
+            cur.execute("""
+                INSERT INTO reservation_rooms(id, room_idx, room_type, employees, guests, arrival, departure, nights, price)
+                VALUES(?,?,?,?,?,?,?,?,?)
+            """, (
+                header["id"],
+                r["room_idx"],
+                r.get("room_type"),
+                r.get("employees", 0),
+                r.get("guests", 0),
+                r.get("arrival"),
+                r.get("departure"),
+                r.get("nights", 0),
+                r.get("price", 0.0),
+            ))
+        con.commit()
+
+
+def _legacy_save_participants(booking_id: str, payload: list) -> None:
+    """Uložení účastníků z UI před executemany: delete_participants_by_id + insert_participants po řádcích."""
+    with app.get_conn() as con:
+        con.execute("DELETE FROM participants WHERE id = ?", (booking_id,))
+        con.commit()
+    with app.get_conn() as con:
+        cur = con.cursor()
+        for p in payload:
+            cur.execute("""
+                INSERT INTO participants(id, person_idx, name, is_employee, nights, room_type, price)
+                VALUES(?,?,?,?,?,?,?)
+            """, (
+                booking_id,
+                int(p["person_idx"]),
+                p["name"],
+                1 if p["is_employee"] else 0,
+                int(p["nights"]),
+                p.get("room_type", ""),
+                float(p.get("price", 0.0)),
+            ))
+        con.commit()
+
+
+def bench_writes(args) -> dict:
+    """
+    Zápis rezervací s účastníky: původní kód před executemany (kopie výše) vs.
+    současná cesta z UI (rezervace + uložení účastníků) vs. hromadný import.
+    Zrychlení přináší hromadný import (jedna transakce); cesta z UI po jedné
+    rezervaci je na úrovni původního kódu – navíc platí zámek BEGIN IMMEDIATE
+    a přegenerování feedů/snapshotů na pozadí, které původní kód nedělal.
+    """
+    n = args.participants
+    results = {"participants": n}
+
+    with temp_site():
+        bookings = _synthetic_import(n)
+        results["bookings"] = len(bookings)
+        t0 = time.perf_counter()
+        for b in bookings:
+            _legacy_insert_booking(b["header"], b["rooms"])
+            _legacy_save_participants(b["header"]["id"], b["participants"])
+        dt = time.perf_counter() - t0
+        results["row_by_row"] = {"s": round(dt, 3), "participants_per_s": round(n / dt)}
+
+    with temp_site():
+        t0 = time.perf_counter()
+        for b in bookings:
+            app.insert_booking(b["header"], b["rooms"])
+            app.insert_participants(b["header"]["id"], b["participants"], replace=True)
+        dt = time.perf_counter() - t0
+        results["executemany_per_booking"] = {"s": round(dt, 3), "participants_per_s": round(n / dt)}
+
+    with temp_site():
+        t0 = time.perf_counter()
+        app.insert_bookings_bulk(bookings)
+        dt = time.perf_counter() - t0
+        results["bulk_import"] = {"s": round(dt, 3), "participants_per_s": round(n / dt)}
+        with app.get_conn() as con:
+            stored = con.execute("SELECT COUNT(*) FROM participants").fetchone()[0]
+        if stored != n:
+            raise SystemExit(f"Import uložil {stored} účastníků místo {n}!")
+    return results
+
+
+def _naive_statistics(start: date, end: date) -> dict:
+    """Ukazatele po (měsíc, pokoj) smyčkou přes pobyty a noci – pro kontrolu compute_site_statistics."""
+    out = {}
+    with app.get_conn() as con:
+        rows = con.execute("SELECT room_type, employees, guests, price, arrival_iso, departure_iso "
+                           "FROM reservation_rooms").fetchall()
+    busy = set()
+    for rt, emp, gst, price, a_s, d_s in rows:
+        a, d = date.fromisoformat(a_s), date.fromisoformat(d_s)
+        night = max(a, start)
+        while night < min(d, end):
+            agg = out.setdefault((f"{night.year}-{night.month:02d}", rt), [0, 0, 0.0])
+            agg[0] += emp
+            agg[1] += gst
+            agg[2] += price / (d - a).days
+            busy.add((rt, night))
+            night += timedelta(days=1)
+    for rt, night in busy:
+        out[(f"{night.year}-{night.month:02d}", rt)].append(1)
+    return {k: (sum(v[3:]), v[0], v[1], round(v[2], 2)) for k, v in out.items()}
+
+
+def bench_stats(args) -> dict:
+    """compute_site_statistics přes celý rozsah dat: shoda se smyčkou, výpočet vs. cache."""
+    with temp_site() as db_path:
+        mid = seed_stays(db_path, args.stays)
+        start, end = date(2020, 1, 1), date(2 * mid.year - 2020 + 1, 1, 1)
+        df = app.compute_site_statistics(start, end)
+        got = {(r.Mesic, r.Pokoj): (r.ObsazeneNoci, r.NociZamestnanci, r.NociHoste, r.Trzby)
+               for r in df.itertuples() if r.ObsazeneNoci}
+        want = _naive_statistics(start, end)
+        if got.keys() != want.keys() or any(got[k][:3] != want[k][:3] or abs(got[k][3] - want[k][3]) > 0.01
+                                            for k in want):
+            raise SystemExit("compute_site_statistics se liší od smyčky přes pobyty!")
+        app.site_statistics(start, end)  # naplnit cache
+        return {
+            "stays": args.stays,
+            "years": end.year - start.year,
+            "rows": len(df),
+            "compute": timed(lambda: app.compute_site_statistics(start, end), args.repeat),
+            "naive": timed(lambda: _naive_statistics(start, end), 1),
+            "cached": timed(lambda: app.site_statistics(start, end), args.repeat),
+        }
+
+
+SCENARIOS = {
+    "availability": bench_availability,
+    "cache": bench_cache,
+    "windows": bench_windows,
+    "allocate": bench_allocate,
+    "stress": bench_stress,
+    "render": bench_render,
+    "writes": bench_writes,
+    "stats": bench_stats,
+    "grid": bench_grid,
+    "ics": bench_ics,
+    "snapshots": bench_snapshots,
+    "names": bench_names,
+    "vouchers": bench_vouchers,
+    "batch": bench_batch,
+    "pdfwarm": bench_pdfwarm,
+    "template": bench_template,
+    "pdf": bench_pdf,
+}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+                             capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def _numeric_leaves(obj, prefix: str = "") -> dict:
+    """{"a.b.c": číslo} ze vnořených výsledků (bool a None se přeskočí)."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            out.update(_numeric_leaves(v, f"{prefix}{k}."))
+        return out
+    if isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        return {prefix[:-1]: obj}
+    return {}
+
+
+def compare_with_baseline(result: dict, baseline: dict) -> dict:
+    """Poměr nová/stará hodnota pro každé číslo, které mají oba běhy (< 1 = méně ms / bajtů)."""
+    new, old = _numeric_leaves(result["results"]), _numeric_leaves(baseline.get("results", {}))
+    ratios = {k: round(new[k] / old[k], 3) for k in sorted(new.keys() & old.keys())
+              if old[k] and not k.endswith(".repeat")}
+    return {"baseline_git": baseline.get("git"), "ratios": ratios}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmarky rezervační aplikace (headless).")
+    ap.add_argument("scenario", choices=sorted(SCENARIOS))
+    ap.add_argument("--stays", type=int, default=20000, help="počet syntetických pobytů (řádků reservation_rooms)")
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--threads", type=int, default=16, help="stress: počet souběžných „adminů“")
+    ap.add_argument("--attempts", type=int, default=50, help="stress: pokusů o uložení na vlákno")
+    ap.add_argument("--p99-ms", type=float, default=2000.0, help="stress: limit p99 latence uložení")
+    ap.add_argument("--participants", type=int, default=10000, help="writes: počet účastníků k zápisu")
+    ap.add_argument("--nights", type=int, default=7, help="windows: délka hledaného pobytu")
+    ap.add_argument("--rooms", type=int, default=14, help="allocate: počet pokojů v syntetickém configu")
+    ap.add_argument("--vouchers", type=int, default=50, help="vouchers/batch: počet poukazů (rezervací)")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="batch: počet procesů")
+    ap.add_argument("--renderer", choices=app.VOUCHER_RENDERERS,
+                    help="batch/pdf: renderer poukazů (batch: výchozí VOUCHER_RENDERER, pdf: všechny)")
+    ap.add_argument("--json", help="výsledky navíc zapiš do JSON souboru")
+    ap.add_argument("--baseline", help="JSON dřívějšího běhu (jiná verze) – přidá poměry nová/stará hodnota")
+    args = ap.parse_args(argv)
+
+    result = {"scenario": args.scenario, "python": sys.version.split()[0], "git": _git_revision(),
+              "results": SCENARIOS[args.scenario](args)}
+    if args.baseline:
+        result["vs_baseline"] = compare_with_baseline(
+            result, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Vstupní bod procesů hromadných poukazů (build_voucher_batch v app.py).
+
+Workery startují čistě (forkserver/spawn), nikdy forkem vícevláknového
+serveru Streamlitu. Rodič importuje jen tenhle malý modul; app.py se
+načte až ve workeru (jako modul, bez `main()`), u forkserveru jednou předem.
+"""
+
+_app = None
+
+
+def init(settings: dict) -> None:
+    """Initializer workeru: načte app, převezme nastavení PDF z rodiče (cesty k fontům, logo) a zahřeje registr."""
+    global _app
+    import app
+
+    for name, value in settings.items():
+        setattr(app, name, value)
+    app.pdf_resources()
+    _app = app
+
+
+def render(kind: str, hdr: tuple, rows, renderer: str) -> bytes:
+    """Jeden poukaz z předaných dat, bez DB a Streamlitu."""
+    return _app._render_voucher_job(kind, hdr, rows, renderer)